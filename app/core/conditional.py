@@ -0,0 +1,114 @@
+"""
+Conditional requests answered from version stamps
+
+Views name a cheap version for the resource a request is about. If-None-Match
+gets a 304, and a failed If-Match a 412, straight after authentication and
+before any queryset or serializer work.
+
+The versions are microsecond timestamps, which HTTP dates would cut to whole
+seconds, so only a strong ETag is sent. Without Last-Modified, If-Modified-Since
+and If-Unmodified-Since are ignored, and a write made in the same second as the
+client's copy can't pass for it.
+
+A write carrying If-Match runs in one transaction and reads its version under
+a row lock, so a second write made against the same version waits for the
+first to commit and then fails its precondition instead of overwriting it.
+"""
+import hashlib
+
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+# methods whose response or precondition depends on the current version
+CONDITIONAL_METHODS = ("GET", "HEAD", "PUT", "PATCH", "DELETE")
+WRITE_METHODS = ("PUT", "PATCH", "DELETE")
+
+
+class EarlyResponse(Exception):
+    """Carries a finished response, like a 304, out of initial()"""
+
+    def __init__(self, response):
+        super().__init__(response.status_code)
+        self.response = response
+
+
+class EarlyResponseMixin:
+    """Lets initial() answer a request by raising EarlyResponse"""
+
+    def handle_exception(self, exc):
+        if isinstance(exc, EarlyResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+
+class ConditionalMixin(EarlyResponseMixin):
+    """Adds ETag validators to an API view"""
+
+    def get_version(self):
+        """Return a key for the version of the resource, or None to skip.
+
+        The key must change whenever the representation does. It is hashed with
+        the negotiated media type into a strong ETag. When self.lock_version is
+        set the row must be read with select_for_update().
+        """
+        return None
+
+    def dispatch(self, request, *args, **kwargs):
+        self.lock_version = request.method in WRITE_METHODS and "HTTP_IF_MATCH" in request.META
+        if not self.lock_version:
+            return super().dispatch(request, *args, **kwargs)
+        with transaction.atomic():  # the lock taken by get_version() is held until the write commits
+            return super().dispatch(request, *args, **kwargs)
+
+    def get_etag(self):
+        key = self.get_version()
+        if key is None:
+            return None
+        tag = hashlib.md5(f"{key}:{self.request.accepted_media_type}".encode()).hexdigest()
+        return quote_etag(tag)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = None
+        if request.method not in CONDITIONAL_METHODS:
+            return
+        self.etag = self.get_etag()
+        if self.etag is None:
+            return
+        response = get_conditional_response(request, self.etag)
+        if response is not None:
+            raise EarlyResponse(self._set_validators(response))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, "etag", None) is None:
+            return response
+        if not 200 <= response.status_code < 300 or request.method == "DELETE":
+            return response
+        if request.method not in ("GET", "HEAD"):
+            # hand back the version the write produced, ready for the next If-Match.
+            self.etag = self.get_etag()
+        return self._set_validators(response)
+
+    def _set_validators(self, response):
+        if self.etag:
+            response["ETag"] = self.etag
+        return response
+
+
+def stamp_version(queryset, field, lock=False, **lookups):
+    """Return a version from a timestamp column of the row matching lookups, or None.
+
+    This is one indexed lookup, meant to run before any real work on the request.
+    With lock the row stays locked until the transaction ends.
+    """
+    if lock:
+        queryset = queryset.select_for_update()
+    try:
+        stamp = queryset.filter(**lookups).values_list(field, flat=True).first()
+    except (ValueError, TypeError):  # a malformed pk, left for the view to report as usual
+        return None
+    if stamp is None:
+        return None
+    return f"{queryset.model._meta.label}:{field}:{stamp.isoformat()}"
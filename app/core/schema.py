@@ -0,0 +1,126 @@
+"""
+OpenAPI schema generated once per code version
+
+Generating the schema walks every view and serializer, so it is done by the
+build_schema command when the app starts (see scripts/run.sh) and written to
+API_SCHEMA_ROOT under the code version. Each process reads the files once and
+serves them from memory with an ETag. A process that finds no file, like the
+development server, generates the schema on its first request instead.
+
+The code version is APP_VERSION when set, otherwise a fingerprint of the
+source files' names, sizes and modification times.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+RENDERERS = {"yaml": OpenApiYamlRenderer, "json": OpenApiJsonRenderer}
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """Return a short string that changes whenever the deployed code does."""
+    if settings.APP_VERSION:
+        return settings.APP_VERSION
+    digest = hashlib.md5()
+    for root, dirs, files in os.walk(settings.BASE_DIR):
+        dirs[:] = sorted(d for d in dirs if d not in ("vol", "__pycache__"))
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                digest.update(f"{os.path.relpath(path, settings.BASE_DIR)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:12]
+
+
+def schema_path(fmt):
+    return os.path.join(settings.API_SCHEMA_ROOT, f"schema-{code_version()}.{fmt}")
+
+
+def render_schema():
+    """Generate the schema and return it rendered as {format: bytes}."""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+    return {fmt: renderer().render(schema, renderer_context={}) for fmt, renderer in RENDERERS.items()}
+
+
+def write_schema():
+    """Write the schema files of this code version and remove those of older ones."""
+    os.makedirs(settings.API_SCHEMA_ROOT, exist_ok=True)
+    current = set()
+    for fmt, content in render_schema().items():
+        path = schema_path(fmt)
+        fd, tmp = tempfile.mkstemp(dir=settings.API_SCHEMA_ROOT, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+        current.add(os.path.basename(path))
+    for name in os.listdir(settings.API_SCHEMA_ROOT):
+        if name.startswith("schema-") and name not in current:
+            os.remove(os.path.join(settings.API_SCHEMA_ROOT, name))
+    return sorted(current)
+
+
+class SchemaStore:
+    """The rendered schema of this code version in memory, with its ETags"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._schemas = None
+
+    def get(self, fmt):
+        """Return (content, etag) of the schema in a format."""
+        with self._lock:
+            if self._schemas is None:
+                self._schemas = {
+                    fmt: (content, quote_etag(hashlib.md5(content).hexdigest()))
+                    for fmt, content in self._load().items()
+                }
+            return self._schemas[fmt]
+
+    def clear(self):
+        with self._lock:
+            self._schemas = None
+
+    def _load(self):
+        try:
+            contents = {}
+            for fmt in RENDERERS:
+                with open(schema_path(fmt), "rb") as f:
+                    contents[fmt] = f.read()
+            return contents
+        except FileNotFoundError:
+            return render_schema()
+
+
+schema_store = SchemaStore()
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    # SpectacularAPIView answering from the precomputed schema. The docstring is
+    # the endpoint's description in the schema, so it is kept.
+    __doc__ = SpectacularAPIView.__doc__
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        if request.GET.get("lang"):  # translated schemas are rare, they are generated as before
+            return super().get(request, *args, **kwargs)
+
+        content, etag = schema_store.get(request.accepted_renderer.format)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type=request.accepted_media_type)
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"  # always revalidated, which costs a 304
+        return response
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     #installed apps
     'db_connection',
@@ -138,7 +139,7 @@ STATIC_URL = '/static/static/'
 MEDIA_URL = '/static/media/'
 
 STATIC_ROOT = "vol/web/static"
-MEDIAD_ROOT = "vol/web/media"
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", "vol/web/media")
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
@@ -151,6 +152,75 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS':'drf_spectacular.openapi.AutoSchema',
 }
 
+# Set to a memcached server's host:port, the cache is shared by every worker
+# process. Without it each process has its own, and the features below that
+# tell other processes about writes through the cache refuse to start.
+CACHE_LOCATION = os.environ.get("CACHE_LOCATION", "")
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+        "LOCATION": CACHE_LOCATION,
+    } if CACHE_LOCATION else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+}
+
+# In-process bitmap index answering tag and ingredient filters on the recipe list.
+# Needs CACHE_LOCATION, see recipe.checks.
+RECIPE_FILTER_INDEX = bool(int(os.environ.get("RECIPE_FILTER_INDEX", 0)))
+RECIPE_FILTER_INDEX_MAX_BYTES = int(
+    os.environ.get("RECIPE_FILTER_INDEX_MAX_BYTES", 64 * 1024 * 1024)
+)
+
+# Per-user cache of rendered recipe, tag and ingredient responses, see recipe.cache.
+# Like the filter index it needs CACHE_LOCATION.
+RECIPE_RESPONSE_CACHE = bool(int(os.environ.get("RECIPE_RESPONSE_CACHE", 0)))
+RECIPE_RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RECIPE_RESPONSE_CACHE_TIMEOUT", 300))
+
+# Authenticated tokens are remembered in each process for this many seconds,
+# see user.authentication.
+AUTH_TOKEN_CACHE_TTL = int(os.environ.get("AUTH_TOKEN_CACHE_TTL", 60))
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", 10000))
+
+# Lifetimes in seconds of the signed tokens handed out at login, see user.tokens.
+SIGNED_ACCESS_TOKEN_TTL = int(os.environ.get("SIGNED_ACCESS_TOKEN_TTL", 300))
+SIGNED_REFRESH_TOKEN_TTL = int(os.environ.get("SIGNED_REFRESH_TOKEN_TTL", 14 * 24 * 3600))
+
+# Uploaded recipe images are resized by this many worker threads per process,
+# 0 processes them inline. Larger uploads, in bytes or pixels, are refused.
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2))
+IMAGE_UPLOAD_MAX_BYTES = int(os.environ.get("IMAGE_UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", 40_000_000))
+
+# Stored images no recipe has named for this many seconds are deleted by the
+# prune_images command, see db_connection.storage.
+IMAGE_PRUNE_GRACE_SECONDS = int(os.environ.get("IMAGE_PRUNE_GRACE_SECONDS", 3600))
+
+# Media files a user is allowed are remembered this many seconds. With the prefix
+# set, the files are sent by nginx from that internal location, see recipe.media.
+MEDIA_ACCESS_CACHE_TIMEOUT = int(os.environ.get("MEDIA_ACCESS_CACHE_TIMEOUT", 300))
+MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "")
+
+# Recipe images resized on request, see recipe.resize. Only these widths are made,
+# and the cache directory is kept under the byte limit. With the prefix set,
+# files are sent by nginx from that internal location.
+IMAGE_RESIZE_WIDTHS = tuple(
+    int(width) for width in os.environ.get("IMAGE_RESIZE_WIDTHS", "160,320,480,640,960,1280,1920").split(",")
+)
+IMAGE_RESIZE_CACHE_ROOT = os.environ.get("IMAGE_RESIZE_CACHE_ROOT", "vol/web/resized")
+IMAGE_RESIZE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_RESIZE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+IMAGE_RESIZE_ACCEL_PREFIX = os.environ.get("IMAGE_RESIZE_ACCEL_PREFIX", "")
+
+# Deleted recipes, tags and ingredients are reported by the change feed for this
+# long. Clients whose cursor is older must sync from scratch.
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get("SYNC_TOMBSTONE_RETENTION_DAYS", 30))
+
+# The OpenAPI schema is generated at startup into this directory, once per code
+# version, see core.schema. APP_VERSION names the version, a fingerprint of the
+# source files is used without it.
+API_SCHEMA_ROOT = os.environ.get("API_SCHEMA_ROOT", "vol/web/schema")
+APP_VERSION = os.environ.get("APP_VERSION", "")
+
 SPECTACULAR_SETTINGS = {
     "COMPONENT_SPLIT_REQUEST": True,
 } # this is to ensure that when we are uploading files, it would be treated differently from other data types
@@ -1,15 +1,14 @@
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
+from drf_spectacular.views import SpectacularSwaggerView
 from django.contrib import admin
 from django.urls import path,include
-from django.conf.urls.static import static
 from django.conf import settings
 
+from core.schema import CachedSpectacularAPIView
+from recipe.views import MediaView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/schema/',SpectacularAPIView.as_view(), name='api-schema'), #this generates our api schama
+    path('api/schema/',CachedSpectacularAPIView.as_view(), name='api-schema'), #this serves our api schema, generated at startup
     path(
         'api/docs/',
         SpectacularSwaggerView.as_view(url_name='api-schema'),#this generates our api view
@@ -17,10 +16,6 @@ urlpatterns = [
     ),
     path('api/user/', include("user.urls")),
     path("api/recipe/", include("recipe.urls")),
+    # media is private to its owner, so it goes through the app in every environment.
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:name>", MediaView.as_view(), name="media"),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        donument_root = settings.MEDIA_ROOT, 
-    )
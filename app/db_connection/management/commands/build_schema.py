@@ -0,0 +1,27 @@
+"""
+Django command to generate the OpenAPI schema served by /api/schema/.
+"""
+import os
+
+from django.core.management.base import BaseCommand
+
+from core.schema import RENDERERS, code_version, schema_path, write_schema
+
+
+class Command(BaseCommand):
+    """Django command to precompute the API schema"""
+
+    help = "Write the OpenAPI schema of this code version to API_SCHEMA_ROOT, unless it is there."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Regenerate an existing schema.")
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        if not options["force"] and all(os.path.exists(schema_path(fmt)) for fmt in RENDERERS):
+            self.stdout.write(f"Schema for code version {code_version()} is up to date.")
+            return
+        names = write_schema()
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {', '.join(names)} for code version {code_version()}."
+        ))
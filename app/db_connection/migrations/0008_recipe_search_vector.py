@@ -0,0 +1,111 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:13
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Recipe.search_vector is rebuilt by a BEFORE trigger on every insert and update of
+# a recipe. Changes to the through tables and tag or ingredient renames touch the
+# affected recipes so that trigger runs again.
+CREATE_TRIGGERS = """
+CREATE FUNCTION recipe_search_vector_refresh() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(i.name, ' ') FROM db_connection_ingredient i
+            JOIN db_connection_recipe_ingredients ri ON ri.ingredient_id = i.id
+            WHERE ri.recipe_id = NEW.id
+        ), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(t.name, ' ') FROM db_connection_tag t
+            JOIN db_connection_recipe_tags rt ON rt.tag_id = t.id
+            WHERE rt.recipe_id = NEW.id
+        ), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_search_vector
+    BEFORE INSERT OR UPDATE ON db_connection_recipe
+    FOR EACH ROW EXECUTE FUNCTION recipe_search_vector_refresh();
+
+CREATE FUNCTION recipe_search_vector_touch_linked() RETURNS trigger AS $$
+BEGIN
+    UPDATE db_connection_recipe SET search_vector = NULL
+    WHERE id IN (SELECT recipe_id FROM changed_rows);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_tags_search_vector_insert
+    AFTER INSERT ON db_connection_recipe_tags REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_search_vector_touch_linked();
+CREATE TRIGGER recipe_tags_search_vector_delete
+    AFTER DELETE ON db_connection_recipe_tags REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_search_vector_touch_linked();
+CREATE TRIGGER recipe_ingredients_search_vector_insert
+    AFTER INSERT ON db_connection_recipe_ingredients REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_search_vector_touch_linked();
+CREATE TRIGGER recipe_ingredients_search_vector_delete
+    AFTER DELETE ON db_connection_recipe_ingredients REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION recipe_search_vector_touch_linked();
+
+-- arguments: through table, column holding the renamed row's id
+CREATE FUNCTION recipe_search_vector_touch_renamed() RETURNS trigger AS $$
+BEGIN
+    EXECUTE format(
+        'UPDATE db_connection_recipe SET search_vector = NULL '
+        'WHERE id IN (SELECT recipe_id FROM %I WHERE %I = $1)',
+        TG_ARGV[0], TG_ARGV[1]
+    ) USING NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tag_search_vector
+    AFTER UPDATE OF name ON db_connection_tag
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION recipe_search_vector_touch_renamed('db_connection_recipe_tags', 'tag_id');
+CREATE TRIGGER ingredient_search_vector
+    AFTER UPDATE OF name ON db_connection_ingredient
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION recipe_search_vector_touch_renamed('db_connection_recipe_ingredients', 'ingredient_id');
+
+-- backfill existing recipes through the trigger.
+UPDATE db_connection_recipe SET search_vector = NULL;
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER ingredient_search_vector ON db_connection_ingredient;
+DROP TRIGGER tag_search_vector ON db_connection_tag;
+DROP FUNCTION recipe_search_vector_touch_renamed();
+DROP TRIGGER recipe_ingredients_search_vector_delete ON db_connection_recipe_ingredients;
+DROP TRIGGER recipe_ingredients_search_vector_insert ON db_connection_recipe_ingredients;
+DROP TRIGGER recipe_tags_search_vector_delete ON db_connection_recipe_tags;
+DROP TRIGGER recipe_tags_search_vector_insert ON db_connection_recipe_tags;
+DROP FUNCTION recipe_search_vector_touch_linked();
+DROP TRIGGER recipe_search_vector ON db_connection_recipe;
+DROP FUNCTION recipe_search_vector_refresh();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db_connection', '0007_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_vector_gin'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
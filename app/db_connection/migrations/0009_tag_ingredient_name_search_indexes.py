@@ -0,0 +1,33 @@
+from django.contrib.postgres.operations import BtreeGinExtension, TrigramExtension
+from django.db import migrations
+
+# Indexes behind the tag and ingredient autocomplete. lower(name) with
+# text_pattern_ops serves case insensitive prefix LIKE in any collation, the
+# trigram GIN index serves the typo tolerant fallback. btree_gin lets user_id
+# sit in the same GIN index so the search stays scoped to one user.
+CREATE_INDEXES = """
+CREATE INDEX tag_user_name_prefix ON db_connection_tag (user_id, lower(name) text_pattern_ops);
+CREATE INDEX tag_user_name_trgm ON db_connection_tag USING gin (user_id, name gin_trgm_ops);
+CREATE INDEX ingredient_user_name_prefix ON db_connection_ingredient (user_id, lower(name) text_pattern_ops);
+CREATE INDEX ingredient_user_name_trgm ON db_connection_ingredient USING gin (user_id, name gin_trgm_ops);
+"""
+
+DROP_INDEXES = """
+DROP INDEX ingredient_user_name_trgm;
+DROP INDEX ingredient_user_name_prefix;
+DROP INDEX tag_user_name_trgm;
+DROP INDEX tag_user_name_prefix;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db_connection', '0008_recipe_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        BtreeGinExtension(),
+        migrations.RunSQL(CREATE_INDEXES, DROP_INDEXES),
+    ]
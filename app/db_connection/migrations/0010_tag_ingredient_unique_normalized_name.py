@@ -0,0 +1,39 @@
+from django.db import migrations
+
+from db_connection.names import NORMALIZED_NAME_SQL, merge_duplicate_names
+
+# the merge leaves deferred foreign key checks queued in this transaction, and an
+# index can't be built on a table with pending trigger events, so they run first.
+CREATE_INDEXES = f"""
+SET CONSTRAINTS ALL IMMEDIATE;
+CREATE UNIQUE INDEX tag_user_normalized_name
+    ON db_connection_tag (user_id, ({NORMALIZED_NAME_SQL.format("name")}));
+CREATE UNIQUE INDEX ingredient_user_normalized_name
+    ON db_connection_ingredient (user_id, ({NORMALIZED_NAME_SQL.format("name")}));
+"""
+
+DROP_INDEXES = """
+DROP INDEX ingredient_user_normalized_name;
+DROP INDEX tag_user_normalized_name;
+"""
+
+
+def merge_duplicates(apps, schema_editor):
+    """Existing duplicates have to go before the unique indexes can be built"""
+    with schema_editor.connection.cursor() as cursor:
+        merge_duplicate_names(cursor, "db_connection_tag", "db_connection_recipe_tags", "tag_id")
+        merge_duplicate_names(
+            cursor, "db_connection_ingredient", "db_connection_recipe_ingredients", "ingredient_id",
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db_connection', '0009_tag_ingredient_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.RunSQL(CREATE_INDEXES, DROP_INDEXES),
+    ]
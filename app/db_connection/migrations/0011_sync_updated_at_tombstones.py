@@ -0,0 +1,127 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# updated_at is stamped by the database so writes that bypass the ORM, bulk
+# updates and raw upserts included, still reach the change feed. Link changes
+# and tag or ingredient renames already touch the affected recipes through the
+# triggers of migration 0008, which bumps their updated_at here too. Deletes
+# leave a tombstone, written once per statement from the transition table.
+CREATE_TRIGGERS = """
+CREATE FUNCTION sync_touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_updated_at
+    BEFORE INSERT OR UPDATE ON db_connection_recipe
+    FOR EACH ROW EXECUTE FUNCTION sync_touch_updated_at();
+CREATE TRIGGER tag_updated_at_insert
+    BEFORE INSERT ON db_connection_tag
+    FOR EACH ROW EXECUTE FUNCTION sync_touch_updated_at();
+-- the upsert of NamedByUserManager rewrites unchanged names, those are not changes.
+CREATE TRIGGER tag_updated_at_update
+    BEFORE UPDATE ON db_connection_tag
+    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+    EXECUTE FUNCTION sync_touch_updated_at();
+CREATE TRIGGER ingredient_updated_at_insert
+    BEFORE INSERT ON db_connection_ingredient
+    FOR EACH ROW EXECUTE FUNCTION sync_touch_updated_at();
+CREATE TRIGGER ingredient_updated_at_update
+    BEFORE UPDATE ON db_connection_ingredient
+    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*)
+    EXECUTE FUNCTION sync_touch_updated_at();
+
+-- argument: the kind recorded on the tombstone
+CREATE FUNCTION sync_write_tombstones() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO db_connection_tombstone (user_id, kind, object_id, deleted_at)
+    SELECT user_id, TG_ARGV[0], id, clock_timestamp() FROM deleted_rows;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_tombstone
+    AFTER DELETE ON db_connection_recipe REFERENCING OLD TABLE AS deleted_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_write_tombstones('recipe');
+CREATE TRIGGER tag_tombstone
+    AFTER DELETE ON db_connection_tag REFERENCING OLD TABLE AS deleted_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_write_tombstones('tag');
+CREATE TRIGGER ingredient_tombstone
+    AFTER DELETE ON db_connection_ingredient REFERENCING OLD TABLE AS deleted_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_write_tombstones('ingredient');
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER ingredient_tombstone ON db_connection_ingredient;
+DROP TRIGGER tag_tombstone ON db_connection_tag;
+DROP TRIGGER recipe_tombstone ON db_connection_recipe;
+DROP FUNCTION sync_write_tombstones();
+DROP TRIGGER ingredient_updated_at_update ON db_connection_ingredient;
+DROP TRIGGER ingredient_updated_at_insert ON db_connection_ingredient;
+DROP TRIGGER tag_updated_at_update ON db_connection_tag;
+DROP TRIGGER tag_updated_at_insert ON db_connection_tag;
+DROP TRIGGER recipe_updated_at ON db_connection_recipe;
+DROP FUNCTION sync_touch_updated_at();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db_connection', '0010_tag_ingredient_unique_normalized_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='ingredient_user_updated_at'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='recipe_user_updated_at'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='tag_user_updated_at'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user', 'deleted_at', 'id'], name='tombstone_user_deleted_at'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
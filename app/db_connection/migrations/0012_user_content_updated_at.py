@@ -0,0 +1,67 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:36
+
+from django.db import migrations, models
+import django.utils.timezone
+
+# User.content_updated_at moves whenever a statement writes one of the user's
+# recipes, tags or ingredients. Link changes and renames touch recipes through
+# the triggers of migration 0008, so they count too. Updates that leave a row
+# as it was, like the name upsert of NamedByUserManager, do not. The UPDATE
+# locks the user row until commit, so the stamp grows in commit order.
+TABLES = ("recipe", "tag", "ingredient")
+
+CREATE_TRIGGERS = """
+CREATE FUNCTION user_content_touch() RETURNS trigger AS $$
+BEGIN
+    UPDATE db_connection_user SET content_updated_at = clock_timestamp()
+    WHERE id IN (SELECT user_id FROM changed_rows);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION user_content_touch_updated() RETURNS trigger AS $$
+BEGIN
+    UPDATE db_connection_user SET content_updated_at = clock_timestamp()
+    WHERE id IN (
+        SELECT n.user_id FROM changed_rows n JOIN old_rows o USING (id)
+        WHERE ROW(n.*) IS DISTINCT FROM ROW(o.*)
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+""" + "".join(f"""
+CREATE TRIGGER {name}_user_content_insert
+    AFTER INSERT ON db_connection_{name} REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_content_touch();
+CREATE TRIGGER {name}_user_content_update
+    AFTER UPDATE ON db_connection_{name} REFERENCING OLD TABLE AS old_rows NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_content_touch_updated();
+CREATE TRIGGER {name}_user_content_delete
+    AFTER DELETE ON db_connection_{name} REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_content_touch();
+""" for name in TABLES)
+
+DROP_TRIGGERS = "".join(f"""
+DROP TRIGGER {name}_user_content_delete ON db_connection_{name};
+DROP TRIGGER {name}_user_content_update ON db_connection_{name};
+DROP TRIGGER {name}_user_content_insert ON db_connection_{name};
+""" for name in TABLES) + """
+DROP FUNCTION user_content_touch_updated();
+DROP FUNCTION user_content_touch();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db_connection', '0011_sync_updated_at_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='content_updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
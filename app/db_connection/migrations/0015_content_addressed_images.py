@@ -0,0 +1,81 @@
+# Generated by Django 3.2.25 on 2026-10-18 02:53
+
+import db_connection.models
+import db_connection.storage
+from django.db import migrations, models
+import django.utils.timezone
+
+# ImageBlob.refs counts the recipes naming a file, as their image or as one of
+# their image_variants. Statements that leave every name as it was, like most
+# recipe updates, change no counts. Existing images are counted once here.
+NEW_NAMES = "SELECT recipe_image_names(image, image_variants) AS name, 1 AS delta FROM new_rows"
+OLD_NAMES = "SELECT recipe_image_names(image, image_variants) AS name, -1 AS delta FROM old_rows"
+OPERATIONS = {
+    "insert": ("INSERT", "NEW TABLE AS new_rows", NEW_NAMES),
+    "update": ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows", f"{NEW_NAMES} UNION ALL {OLD_NAMES}"),
+    "delete": ("DELETE", "OLD TABLE AS old_rows", OLD_NAMES),
+}
+
+CREATE_TRIGGERS = """
+CREATE FUNCTION recipe_image_names(image text, variants jsonb) RETURNS SETOF text AS $$
+    SELECT image WHERE image IS NOT NULL AND image <> ''
+    UNION ALL
+    SELECT f.value FROM jsonb_each(coalesce(variants, '{}')) s, jsonb_each_text(s.value) f
+$$ LANGUAGE sql IMMUTABLE;
+""" + "".join(f"""
+CREATE FUNCTION image_blob_count_{op}() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO db_connection_imageblob (name, refs, updated_at)
+    SELECT name, sum(delta), clock_timestamp() FROM ({changes}) c
+    GROUP BY name HAVING sum(delta) <> 0
+    ON CONFLICT (name) DO UPDATE
+        SET refs = db_connection_imageblob.refs + EXCLUDED.refs, updated_at = EXCLUDED.updated_at;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipe_image_blob_{op}
+    AFTER {event} ON db_connection_recipe REFERENCING {tables}
+    FOR EACH STATEMENT EXECUTE FUNCTION image_blob_count_{op}();
+""" for op, (event, tables, changes) in OPERATIONS.items()) + """
+INSERT INTO db_connection_imageblob (name, refs, updated_at)
+SELECT name, count(*), now()
+FROM db_connection_recipe, recipe_image_names(image, image_variants) AS name
+GROUP BY name;
+"""
+
+DROP_TRIGGERS = "".join(f"""
+DROP TRIGGER recipe_image_blob_{op} ON db_connection_recipe;
+DROP FUNCTION image_blob_count_{op}();
+""" for op in OPERATIONS) + """
+DROP FUNCTION recipe_image_names(text, jsonb);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db_connection', '0014_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refs', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=db_connection.storage.ContentAddressedStorage(), upload_to=db_connection.models.recipe_image_file_path),
+        ),
+        migrations.AddIndex(
+            model_name='imageblob',
+            index=models.Index(condition=models.Q(('refs__lte', 0)), fields=['updated_at'], name='imageblob_unreferenced'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
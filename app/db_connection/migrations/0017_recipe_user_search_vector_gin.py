@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:10
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db_connection', '0016_recipe_image_placeholder'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_search_vector_gin',
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['user', 'search_vector'], name='recipe_user_search_vector_gin'),
+        ),
+    ]
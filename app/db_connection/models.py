@@ -1,19 +1,24 @@
 """Database models"""
 import os 
-import uuid
 from django.conf import settings 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     PermissionsMixin,
     BaseUserManager
 )
 
+from db_connection.names import NamedByUserManager
+from db_connection.storage import content_addressed_storage
+
 def recipe_image_file_path(instance, filename):
     """Generate file path for new recipe image"""
     ext = os.path.splitext(filename)[1] # this gives us the file extension
-    # we use the uuid to generate a unique
-    filename = f"{uuid.uuid4()}{ext}"
+    # the storage swaps the name for the hash of the content, only the extension is kept.
+    filename = f"image{ext}"
 
     return os.path.join("uploads","recipe", filename) # the reason why we are using the join and splittext functions 
 # from the os module is to ensure that our code works on all operating systems
@@ -47,6 +52,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     name  = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=True)
+    # bumped by database triggers whenever one of the user's recipes, tags or
+    # ingredients changes, see migration 0012. Versions the list endpoints.
+    content_updated_at = models.DateTimeField(default=timezone.now, editable=False)
+    # moved on to revoke every signed token of the user, see user.tokens.
+    token_version = models.PositiveIntegerField(default=0, editable=False)
 
     objects = UserManager() # this simply instantiate our custom user manager
     USERNAME_FIELD = "email" # this is us specifying that we want our username
@@ -65,7 +75,42 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path) 
+    image = models.ImageField(
+        null=True, upload_to=recipe_image_file_path, storage=content_addressed_storage,
+    )
+
+    class ImageStatus(models.TextChoices):
+        NONE = "none"
+        PENDING = "pending"
+        PROCESSING = "processing"
+        READY = "ready"
+        FAILED = "failed"
+
+    # resized copies of the image are made off the request thread, see recipe.images.
+    # image_variants maps each size to {format: storage name}.
+    image_status = models.CharField(
+        max_length=10, choices=ImageStatus.choices, default=ImageStatus.NONE, editable=False,
+    )
+    image_variants = models.JSONField(default=dict, editable=False)
+    # the image's size the right way up, read from its header at upload, and a tiny
+    # inline WebP to paint until it loads, made along with the variants.
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_placeholder = models.TextField(blank=True, default="", editable=False)
+    # weighted title, tag, ingredient and description words, kept up to date by
+    # the database triggers created in migration 0008.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # set by a database trigger on every write, including changes to the
+    # recipe's tags and ingredients, see migration 0011.
+    updated_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            # user_id goes in through btree_gin, see migration 0009, so a search reads
+            # only the postings of the user's own recipes.
+            GinIndex(fields=["user", "search_vector"], name="recipe_user_search_vector_gin"),
+            models.Index(fields=["user", "updated_at", "id"], name="recipe_user_updated_at"),
+        ]
 
     def __str__(self):
         return self.title 
@@ -78,6 +123,16 @@ class Tag(models.Model):
         on_delete=models.CASCADE,
     )
 
+    updated_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    # names are unique per user ignoring case and spacing, see migration 0010.
+    objects = NamedByUserManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "updated_at", "id"], name="tag_user_updated_at"),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -86,6 +141,56 @@ class Ingredient(models.Model):
     name = models.CharField(max_length=225)
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE, )
+    updated_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = NamedByUserManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "updated_at", "id"], name="ingredient_user_updated_at"),
+        ]
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class Tombstone(models.Model):
+    """A deleted recipe, tag or ingredient, kept for the sync change feed.
+
+    Rows are written by database triggers, see migration 0011, and there is no
+    foreign key constraint so deleting a user can leave them behind until pruned.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    kind = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "deleted_at", "id"], name="tombstone_user_deleted_at"),
+        ]
+
+
+class ImageBlob(models.Model):
+    """A stored image file and the number of recipe images and variants naming it.
+
+    refs is kept by database triggers, see migration 0015. Rows at 0 are left
+    for the prune_images command, which deletes them with their files.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    refs = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["updated_at"], condition=models.Q(refs__lte=0), name="imageblob_unreferenced",
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
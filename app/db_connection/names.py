@@ -0,0 +1,98 @@
+"""
+Per-user tag and ingredient names, unique ignoring case and spacing
+"""
+from django.db import connections, models
+
+# must match the expression of the unique indexes created in migration 0010.
+NORMALIZED_NAME_SQL = "lower(regexp_replace(btrim({}), '\\s+', ' ', 'g'))"
+
+
+def normalize_name(name):
+    """Python twin of NORMALIZED_NAME_SQL"""
+    return " ".join(name.split()).lower()
+
+
+class NormalizedName(models.Func):
+    """A name column folded the same way as the unique index"""
+    template = NORMALIZED_NAME_SQL.format("%(expressions)s")
+    output_field = models.CharField()
+
+
+class NamedByUserManager(models.Manager):
+    """Manager for models whose name is unique per user"""
+
+    def get_or_create_by_name(self, user, names):
+        """Return one object per distinct name, in order, creating the missing ones.
+
+        Existing names are read with a plain SELECT. Missing ones go through a
+        single INSERT ... ON CONFLICT DO UPDATE, which also picks up rows that a
+        concurrent request created in the meantime, so no retry is needed.
+        """
+        distinct = {}
+        for name in names:
+            distinct.setdefault(normalize_name(name), name)
+        if not distinct:
+            return []
+
+        found = {
+            normalize_name(obj.name): obj
+            for obj in self.annotate(normalized_name=NormalizedName("name")).filter(
+                user=user, normalized_name__in=list(distinct),
+            )
+        }
+        missing = [name for key, name in distinct.items() if key not in found]
+        if missing:
+            for name, obj in zip(missing, self._upsert(user, missing)):
+                found[normalize_name(name)] = obj
+        return [found[key] for key in distinct]
+
+    def _upsert(self, user, names):
+        """Insert names for a user, returning the stored object for each name in order"""
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        normalized = NORMALIZED_NAME_SQL.format("name")
+        sql = f"""
+            WITH input AS (
+                SELECT name, ord, {normalized} AS key
+                FROM unnest(%s::text[]) WITH ORDINALITY AS t(name, ord)
+            ), upserted AS (
+                INSERT INTO {table} (user_id, name)
+                SELECT DISTINCT ON (key) %s, name FROM input ORDER BY key, ord
+                ON CONFLICT (user_id, ({normalized})) DO UPDATE SET name = {table}.name
+                RETURNING id, name, {normalized} AS key
+            )
+            SELECT upserted.id, upserted.name
+            FROM input JOIN upserted USING (key)
+            ORDER BY input.ord
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [list(names), user.pk])
+            rows = cursor.fetchall()
+        return [self.model(id=id_, name=name, user=user) for id_, name in rows]
+
+
+def merge_duplicate_names(cursor, table, through_table, column):
+    """Fold rows whose names only differ in case or spacing into the oldest one.
+
+    Recipe links are moved onto the surviving row and the duplicates deleted,
+    all in one statement. Returns the number of rows removed per user id.
+    """
+    key = NORMALIZED_NAME_SQL.format("name")
+    cursor.execute(f"""
+        WITH ranked AS (
+            SELECT id, min(id) OVER (PARTITION BY user_id, {key}) AS keep_id FROM {table}
+        ), duplicates AS (
+            SELECT id, keep_id FROM ranked WHERE id <> keep_id
+        ), relinked AS (
+            INSERT INTO {through_table} (recipe_id, {column})
+            SELECT link.recipe_id, d.keep_id
+            FROM {through_table} link JOIN duplicates d ON link.{column} = d.id
+            ON CONFLICT DO NOTHING
+        ), unlinked AS (
+            DELETE FROM {through_table} link USING duplicates d WHERE link.{column} = d.id
+        ), removed AS (
+            DELETE FROM {table} t USING duplicates d WHERE t.id = d.id RETURNING t.user_id
+        )
+        SELECT user_id, count(*) FROM removed GROUP BY user_id
+    """)
+    return dict(cursor.fetchall())
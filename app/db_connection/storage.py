@@ -0,0 +1,62 @@
+"""
+Content addressed file storage
+
+Files are named after the SHA-256 of their bytes, hashed in chunks as they
+stream in, so the same photo is stored once however many recipes or users
+upload it, and a name always stands for the same bytes. That lets proxies and
+browsers cache media forever: new content gets a new URL.
+
+Files are never deleted here. Every stored name gets an ImageBlob row, whose
+reference count the triggers of migration 0015 keep, and the prune_images
+command deletes the files nothing has pointed at for a while.
+"""
+import hashlib
+import os
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage naming files after their content, under the directory asked for"""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest[:2], digest + ext).replace("\\", "/")
+
+        # recorded before the existence check, so a prune running now either waits
+        # for this row or has already deleted the file we are about to write.
+        record_blob(name)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+def record_blob(name):
+    """Make sure a stored name has an ImageBlob row and restart its grace period."""
+    table = apps.get_model("db_connection", "ImageBlob")._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (name, refs, updated_at) VALUES (%s, 0, clock_timestamp())
+            ON CONFLICT (name) DO UPDATE SET updated_at = EXCLUDED.updated_at
+            """,
+            [name],
+        )
+
+
+content_addressed_storage = ContentAddressedStorage()
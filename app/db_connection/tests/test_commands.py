@@ -2,6 +2,11 @@
 Test custom Django management commands.
 """
 
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
 from unittest.mock import patch  # this is the decorator that would
 # enable us mock.
 
@@ -11,7 +16,12 @@ from psycopg2 import OperationalError as psycopg2Error
 # various connection errors when trying to connect to DB
 from django.core.management import call_command
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from core.schema import code_version, schema_store
+
+SCHEMA_ROOT = os.path.join(tempfile.gettempdir(), "recipe-api-test-schema")
 
 
 @patch('db_connection.management.commands.wait_for_db.Command.check')
@@ -37,4 +47,57 @@ class CommandTest(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
- 
\ No newline at end of file
+ 
+
+@override_settings(API_SCHEMA_ROOT=SCHEMA_ROOT, APP_VERSION="test")
+class BuildSchemaTests(SimpleTestCase):
+    """Test the schema is generated once and served from memory"""
+
+    def setUp(self):
+        shutil.rmtree(SCHEMA_ROOT, ignore_errors=True)
+        code_version.cache_clear()
+        schema_store.clear()
+        self.addCleanup(code_version.cache_clear)
+        self.addCleanup(schema_store.clear)
+        self.addCleanup(shutil.rmtree, SCHEMA_ROOT, True)
+
+    def test_build_once_per_version(self):
+        """Test the files are written for the code version and kept until it changes"""
+        os.makedirs(SCHEMA_ROOT)
+        open(os.path.join(SCHEMA_ROOT, "schema-old.yaml"), "w").close()
+
+        out = StringIO()
+        call_command("build_schema", stdout=out)
+        self.assertEqual(sorted(os.listdir(SCHEMA_ROOT)), ["schema-test.json", "schema-test.yaml"])
+        self.assertIn("Wrote", out.getvalue())
+
+        out = StringIO()
+        call_command("build_schema", stdout=out)
+        self.assertIn("up to date", out.getvalue())
+
+    def test_served_from_file_with_etag(self):
+        """Test the view sends the built file and answers revalidation with 304"""
+        call_command("build_schema", stdout=StringIO())
+        with open(os.path.join(SCHEMA_ROOT, "schema-test.json"), "rb") as f:
+            built = f.read()
+
+        with patch("core.schema.render_schema") as render:
+            res = self.client.get(reverse("api-schema"), HTTP_ACCEPT="application/vnd.oai.openapi+json")
+            render.assert_not_called()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content, built)
+        self.assertEqual(json.loads(res.content)["openapi"], "3.0.3")
+
+        res = self.client.get(
+            reverse("api-schema"), HTTP_ACCEPT="application/vnd.oai.openapi+json",
+            HTTP_IF_NONE_MATCH=res["ETag"],
+        )
+        self.assertEqual(res.status_code, 304)
+
+    def test_generated_without_file(self):
+        """Test a missing file is generated on the first request and kept in memory"""
+        res = self.client.get(reverse("api-schema"))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b"openapi: 3.0.3", res.content)
+        self.assertEqual(res["Content-Type"], "application/vnd.oai.openapi")
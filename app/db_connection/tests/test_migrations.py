@@ -0,0 +1,47 @@
+"""
+Tests for migrations that rewrite existing data.
+"""
+from decimal import Decimal
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+BEFORE_UNIQUE_NAMES = [("db_connection", "0009_tag_ingredient_name_search_indexes")]
+UNIQUE_NAMES = [("db_connection", "0010_tag_ingredient_unique_normalized_name")]
+
+
+class UniqueNameMigrationTests(TransactionTestCase):
+    """Test the unique name migration on a database that already holds duplicates"""
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def test_duplicates_merged_before_indexes(self):
+        """Test duplicate tags are merged, their links kept, and the index built"""
+        apps = self._migrate(BEFORE_UNIQUE_NAMES)
+        user = apps.get_model("db_connection", "User").objects.create(email="old@example.com")
+        Tag = apps.get_model("db_connection", "Tag")
+        dinner = Tag.objects.create(user=user, name="Dinner")
+        duplicate = Tag.objects.create(user=user, name=" dinner ")
+        recipe = apps.get_model("db_connection", "Recipe").objects.create(
+            user=user, title="Soup", time_minutes=5, price=Decimal("1.00"),
+        )
+        recipe.tags.add(duplicate)
+
+        apps = self._migrate(UNIQUE_NAMES)
+
+        Tag = apps.get_model("db_connection", "Tag")
+        self.assertEqual(list(Tag.objects.values_list("id", flat=True)), [dinner.id])
+        recipe = apps.get_model("db_connection", "Recipe").objects.get(pk=recipe.pk)
+        self.assertEqual(list(recipe.tags.values_list("id", flat=True)), [dinner.id])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'tag_user_normalized_name'")
+            self.assertIsNotNone(cursor.fetchone())
@@ -2,9 +2,9 @@
 Tests for models.
 """
 
-from unittest.mock import patch
 from decimal import Decimal 
 
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
@@ -85,11 +85,41 @@ class ModelTests(TestCase):
         )
 
         self.assertEqual(str(ingredient), ingredient.name)   
-    @patch("db_connection.models.uuid.uuid4")  # freeze randomness so test is reproducible.
-    def test_recipe_file_name_uuid(self, mock_uuid):
-        """Test generating unique image file path"""
-        uuid = "test-uuid"
-        mock_uuid.return_value = uuid
+    def test_recipe_file_name_keeps_extension(self):
+        """Test the image path only carries the extension, the storage names the file by content"""
         file_path = models.recipe_image_file_path(None, "example.jpg")
 
-        self.assertEqual(file_path, f"uploads/recipe/{uuid}.jpg")
\ No newline at end of file
+        self.assertEqual(file_path, "uploads/recipe/image.jpg")
+    def test_get_or_create_by_name_folds_case_and_spacing(self):
+        """Test names differing only in case or spacing resolve to one tag"""
+        user = create_user()
+        existing = models.Tag.objects.create(user=user, name="Comfort food")
+
+        tags = models.Tag.objects.get_or_create_by_name(
+            user, ["comfort  FOOD", "Vegan", "vegan ", "Comfort food"],
+        )
+
+        self.assertEqual([tag.id for tag in tags][0], existing.id)
+        self.assertEqual([tag.name for tag in tags], ["Comfort food", "Vegan"])
+        self.assertEqual(models.Tag.objects.filter(user=user).count(), 2)
+
+    def test_get_or_create_by_name_picks_up_conflicting_rows(self):
+        """Test the upsert returns rows it did not see in its first lookup"""
+        user = create_user()
+        existing = models.Ingredient.objects.create(user=user, name="Salt")
+
+        ingredients = models.Ingredient.objects._upsert(user, ["salt", "Pepper"])
+
+        self.assertEqual(ingredients[0].id, existing.id)
+        self.assertEqual(ingredients[0].name, "Salt")
+        self.assertEqual(ingredients[1].name, "Pepper")
+
+    def test_tag_names_unique_per_user(self):
+        """Test the database rejects a second tag with the same folded name"""
+        user = create_user()
+        other_user = create_user(email="other@example.com")
+        models.Tag.objects.create(user=user, name="Vegan")
+        models.Tag.objects.create(user=other_user, name="Vegan")
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name=" VEGAN")
@@ -0,0 +1,44 @@
+"""
+Autocomplete for tag and ingredient names
+
+Prefix matches come first, read in name order from the (user_id, lower(name)
+text_pattern_ops) index. If that does not fill the list, typo tolerant matches
+are added from the (user_id, name gin_trgm_ops) trigram index. Both indexes are
+created in migration 0009, so each lookup is two short index scans at most.
+"""
+from django.db.models import BooleanField, F, FloatField, Func, Value
+from django.db.models.functions import Lower
+
+# trigram matching is too noisy below three characters.
+MIN_FUZZY_LENGTH = 3
+
+
+class WordSimilar(Func):
+    """`query <% name`, true when the query is close to some part of the name"""
+    arg_joiner = " <%% "
+    template = "%(expressions)s"
+    output_field = BooleanField()
+
+
+class WordSimilarity(Func):
+    function = "word_similarity"
+    output_field = FloatField()
+
+
+def autocomplete(queryset, query, limit):
+    """Return up to limit objects whose name starts with, or resembles, the query."""
+    prefix = query.lower()
+    matches = list(
+        queryset.annotate(lower_name=Lower("name"))
+        .filter(lower_name__startswith=prefix)
+        .order_by("lower_name", "id")[:limit]
+    )
+
+    if len(matches) < limit and len(query) >= MIN_FUZZY_LENGTH:
+        matches += list(
+            queryset.filter(WordSimilar(Value(query), F("name")))
+            .exclude(id__in=[match.id for match in matches])
+            .annotate(similarity=WordSimilarity(Value(query), F("name")))
+            .order_by("-similarity", "name", "id")[:limit - len(matches)]
+        )
+    return matches
@@ -0,0 +1,184 @@
+"""
+Bulk create, update and delete of recipes
+
+Operations arrive one per NDJSON line:
+
+    {"op": "create", "data": {"title": "Soup", "time_minutes": 5, "price": "2.00"}}
+    {"op": "update", "id": 12, "data": {"tags": [{"name": "Dinner"}]}}
+    {"op": "delete", "id": 13}
+
+An optional "ref" is echoed back so clients can match results to lines.
+Lines are validated as they are read and applied CHUNK_SIZE at a time, each
+chunk in its own transaction with bulk_create, bulk_update and bulk writes
+to the through tables. Within a chunk creates run first, then updates, then
+deletes. One result is yielded per line, so memory stays bounded by the
+chunk size whatever the length of the stream.
+"""
+import logging
+
+from django.db import DatabaseError, transaction
+
+from db_connection.models import Recipe, Tag, Ingredient
+from db_connection.names import normalize_name
+from recipe.serializers import RecipeSerializer
+from recipe.signals import bulk_recipes_changed
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+OPERATIONS = ("create", "update", "delete")
+RELATIONS = (("tags", Tag), ("ingredients", Ingredient))
+
+
+def bulk_apply(lines, request, chunk_size=None):
+    """Validate and apply a stream of operations, yielding one result per line."""
+    chunk_size = chunk_size or CHUNK_SIZE
+    chunk = []
+    for index, line in enumerate(lines):
+        chunk.append(_validate(index, line, request))
+        if len(chunk) >= chunk_size:
+            yield from _apply(chunk, request.user)
+            chunk = []
+    if chunk:
+        yield from _apply(chunk, request.user)
+
+
+def _error(result, status, errors):
+    result.update(status=status, errors=errors)
+    return result, None
+
+
+def _validate(index, line, request):
+    """Return the result for a line and its validated data, or None when it failed"""
+    result = {"index": index}
+    if isinstance(line, Exception):
+        return _error(result, 400, {"non_field_errors": [str(line)]})
+    if not isinstance(line, dict) or line.get("op") not in OPERATIONS:
+        return _error(result, 400, {"op": [f"Expected one of {', '.join(OPERATIONS)}."]})
+
+    result["op"] = line["op"]
+    if "ref" in line:
+        result["ref"] = line["ref"]
+    if line["op"] != "create":
+        if not isinstance(line.get("id"), int) or isinstance(line["id"], bool):
+            return _error(result, 400, {"id": ["A valid integer is required."]})
+        result["id"] = line["id"]
+    if line["op"] == "delete":
+        return result, {}
+
+    serializer = RecipeSerializer(
+        data=line.get("data", {}),
+        partial=line["op"] == "update",
+        context={"request": request},
+    )
+    if not serializer.is_valid():
+        return _error(result, 400, serializer.errors)
+    return result, serializer.validated_data
+
+
+def _apply(chunk, user):
+    """Apply the valid operations of a chunk in one transaction"""
+    pending = {op: [(r, d) for r, d in chunk if d is not None and r["op"] == op] for op in OPERATIONS}
+    try:
+        with transaction.atomic():
+            _create(pending["create"], user)
+            _update(pending["update"], user)
+            _delete(pending["delete"], user)
+            # bulk writes skip the model signals, tell the caches and indexes instead.
+            transaction.on_commit(lambda: bulk_recipes_changed.send(sender=Recipe, user_id=user.id))
+    except DatabaseError:
+        logger.exception("Bulk recipe chunk failed")
+        for result, data in chunk:
+            if data is not None:
+                if result["op"] == "create":
+                    result.pop("id", None)
+                result.update(status=500, errors={"non_field_errors": ["The chunk could not be saved."]})
+
+    for result, data in chunk:
+        yield result
+
+
+def _fields(data):
+    return {key: value for key, value in data.items() if key not in ("tags", "ingredients")}
+
+
+def _create(operations, user):
+    recipes = Recipe.objects.bulk_create(
+        [Recipe(user=user, **_fields(data)) for result, data in operations]
+    )
+    for (result, data), recipe in zip(operations, recipes):
+        result.update(id=recipe.id, status=201)
+    _link(user, [(recipe, data) for (result, data), recipe in zip(operations, recipes)], replace=False)
+
+
+def _update(operations, user):
+    recipes = Recipe.objects.in_bulk(
+        [result["id"] for result, data in operations if "id" in result]
+    )
+    found = {}  # recipe id -> (recipe, data of its lines merged)
+    changed_fields = set()
+    for result, data in operations:
+        recipe = recipes.get(result["id"])
+        if recipe is None or recipe.user_id != user.id:
+            result.update(status=404, errors={"id": ["Not found."]})
+            continue
+        for attr, value in _fields(data).items():
+            setattr(recipe, attr, value)
+            changed_fields.add(attr)
+        # later lines for the same recipe win key by key, as if the lines were applied one by one.
+        found.setdefault(recipe.id, (recipe, {}))[1].update(data)
+        result["status"] = 200
+
+    if changed_fields:
+        Recipe.objects.bulk_update([recipe for recipe, data in found.values()], changed_fields)
+    _link(user, list(found.values()), replace=True)
+
+
+def _delete(operations, user):
+    ids = {result["id"] for result, data in operations}
+    existing = set(Recipe.objects.filter(user=user, id__in=ids).values_list("id", flat=True))
+    Recipe.objects.filter(id__in=existing).delete()
+    for result, data in operations:
+        if result["id"] in existing:
+            result["status"] = 204
+        else:
+            result.update(status=404, errors={"id": ["Not found."]})
+
+
+def _link(user, recipes, replace):
+    """Point recipes at the tags and ingredients named in their data.
+
+    Names are resolved for the whole chunk with one upsert per model, stale
+    links are removed with one DELETE and new ones added with one INSERT.
+    """
+    for name, model in RELATIONS:
+        wanted = [(recipe, data[name]) for recipe, data in recipes if name in data]
+        if not wanted:
+            continue
+        names = [item["name"] for recipe, items in wanted for item in items]
+        resolved = {
+            normalize_name(obj.name): obj.id
+            for obj in model.objects.get_or_create_by_name(user, names)
+        }
+
+        field = getattr(Recipe, name).field
+        through = field.remote_field.through
+        column = f"{field.m2m_reverse_field_name()}_id"
+        target = {
+            (recipe.id, resolved[normalize_name(item["name"])])
+            for recipe, items in wanted for item in items
+        }
+
+        if replace:
+            current = through.objects.filter(
+                recipe_id__in={recipe.id for recipe, items in wanted}
+            ).values_list("id", "recipe_id", column)
+            stale = [link_id for link_id, recipe_id, related_id in current if (recipe_id, related_id) not in target]
+            target -= {(recipe_id, related_id) for link_id, recipe_id, related_id in current}
+            if stale:
+                through.objects.filter(id__in=stale).delete()
+
+        through.objects.bulk_create(
+            [through(recipe_id=recipe_id, **{column: related_id}) for recipe_id, related_id in target],
+            ignore_conflicts=True,
+        )
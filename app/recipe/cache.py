@@ -0,0 +1,126 @@
+"""
+Per-user response cache for the recipe, tag and ingredient endpoints
+
+When RECIPE_RESPONSE_CACHE is enabled, rendered list and detail responses are
+kept in the Django cache under a key made of the user, a per-user generation
+number, the URL with its query parameters sorted, and the negotiated media
+type. The handlers in recipe.signals bump the generation once a write to the
+user's recipes, tags or ingredients commits, which orphans every entry of that
+user in one step. Orphans are left to expire with RECIPE_RESPONSE_CACHE_TIMEOUT.
+
+The bump runs before the writing request returns, so writers always read their
+own writes. All processes must share the cache backend for the generation to
+reach them, so the cache refuses to start without one, see recipe.checks.
+
+Hits and misses are counted in the shared cache too, so the counts cover
+every process. Superusers read them from the cache-stats endpoint.
+"""
+import hashlib
+import random
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from core.conditional import EarlyResponse, EarlyResponseMixin
+
+GENERATION_KEY = "recipe-cache:generation:{}"
+RESPONSE_KEY = "recipe-cache:{}:{}:{}"
+HITS_KEY = "recipe-cache:hits"
+MISSES_KEY = "recipe-cache:misses"
+
+
+class ResponseCache:
+    """Stores rendered responses per user generation and counts hits and misses"""
+
+    def generation(self, user_id):
+        key = GENERATION_KEY.format(user_id)
+        generation = cache.get(key)
+        if generation is None:
+            # start from a random number so a generation evicted from the cache is never reused.
+            cache.add(key, random.getrandbits(48), None)
+            generation = cache.get(key)
+        return generation
+
+    def bump(self, user_id):
+        """Orphan every cached response of a user."""
+        try:
+            cache.incr(GENERATION_KEY.format(user_id))
+        except ValueError:
+            pass  # no generation yet, the next read starts a fresh one
+
+    def key(self, request):
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        digest = hashlib.md5(
+            f"{request.build_absolute_uri(request.path)}?{query}:{request.accepted_media_type}".encode()
+        ).hexdigest()
+        return RESPONSE_KEY.format(request.user.id, self.generation(request.user.id), digest)
+
+    def get(self, key):
+        cached = cache.get(key)
+        self._count(MISSES_KEY if cached is None else HITS_KEY)
+        return cached
+
+    def _count(self, key):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # another process may add the counter first, then ours is an increment too.
+            if not cache.add(key, 1, None):
+                cache.incr(key)
+
+    def set(self, key, response):
+        response.render()
+        cache.set(
+            key,
+            (response.status_code, response["Content-Type"], response.content),
+            settings.RECIPE_RESPONSE_CACHE_TIMEOUT,
+        )
+
+    def stats(self):
+        """Return the hits and misses of every process since the counts were reset."""
+        counts = cache.get_many([HITS_KEY, MISSES_KEY])
+        hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+    def reset_stats(self):
+        cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+response_cache = ResponseCache()
+
+
+class CachedResponseMixin(EarlyResponseMixin):
+    """Serves GET list and retrieve from the response cache, X-Cache tells which"""
+    cached_actions = ("list", "retrieve")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.response_cache_key = None
+        if not settings.RECIPE_RESPONSE_CACHE or request.method != "GET":
+            return
+        if self.action not in self.cached_actions:
+            return
+
+        self.response_cache_key = response_cache.key(request)
+        cached = response_cache.get(self.response_cache_key)
+        if cached is not None:
+            status, content_type, content = cached
+            response = HttpResponse(content, status=status, content_type=content_type)
+            response["X-Cache"] = "HIT"
+            raise EarlyResponse(response)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if not getattr(self, "response_cache_key", None) or "X-Cache" in response:
+            return response
+        if response.status_code == 200:
+            response["X-Cache"] = "MISS"
+            response_cache.set(self.response_cache_key, response)
+        return response
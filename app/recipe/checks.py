@@ -0,0 +1,33 @@
+"""
+System checks for the recipe app's optional caches
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# backends whose entries each process keeps to itself
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+# settings of features that tell the other worker processes about writes through the cache
+SHARED_CACHE_SETTINGS = ("RECIPE_FILTER_INDEX", "RECIPE_RESPONSE_CACHE")
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Refuse features that need a shared cache while the default cache is per process."""
+    if settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Error(
+            f"{name} needs a cache backend shared by all worker processes.",
+            hint=(
+                "Set CACHE_LOCATION to a memcached server, or silence recipe.E001 "
+                "if only a single process serves the API."
+            ),
+            obj=name,
+            id="recipe.E001",
+        )
+        for name in SHARED_CACHE_SETTINGS
+        if getattr(settings, name)
+    ]
@@ -0,0 +1,178 @@
+"""
+Compiled read-only serializers for the list endpoints
+
+A ModelSerializer runs every field's get_attribute and to_representation and
+builds an OrderedDict per row, which is most of the time a list spends in
+Python. The fields of the recipe, tag and ingredient serializers are plain
+columns, so they are compiled once into the columns to read with values(), a
+converter for the few that need one and a JSON template per row. Nested
+many-to-many serializers are read with one values() query per relation, like
+the prefetch they replace.
+
+The rows are ordinary dicts, so tests, the browsable API and other renderers
+see the same data as before. CompiledJSONRenderer writes them out through the
+templates and its output is byte for byte what JSONRenderer gives for the
+ModelSerializer's data. Serializers with fields that can't be compiled, like
+method fields, are listed the usual way.
+"""
+from functools import lru_cache
+from json.encoder import encode_basestring
+
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# field types whose to_representation of a column value returns it unchanged
+PLAIN_FIELDS = (
+    serializers.BooleanField, serializers.CharField, serializers.ChoiceField, serializers.IntegerField,
+)
+
+
+def _string(value):
+    return "null" if value is None else encode_basestring(value)
+
+
+def _number(value):
+    return "null" if value is None else int.__repr__(value)
+
+
+def _boolean(value):
+    return "null" if value is None else ("true" if value else "false")
+
+
+def _decimal(field):
+    if not getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING) or field.localize:
+        return None
+    # the column has the field's decimal places already, so quantizing changes nothing.
+    return lambda value: None if value is None else "{:f}".format(value)
+
+
+class CompiledRows(list):
+    """Rows made by a compiled serializer, which the renderer writes through its templates"""
+
+    def __init__(self, rows, compiled):
+        super().__init__(rows)
+        self.compiled = compiled
+
+
+class CompiledSerializer:
+    """Read-only form of a serializer's fields, working from values() rows"""
+
+    def __init__(self, serializer):
+        model = serializer.Meta.model
+        columns = {field.name: field for field in model._meta.concrete_fields}
+        self.pk = model._meta.pk.attname
+        self.fields = []  # (name, column or None for a relation, converter or None)
+        self.relations = []  # (name, model field, compiled child serializer)
+        encoders = []
+        for name, field in serializer.fields.items():
+            if isinstance(field, serializers.ListSerializer):
+                relation = model._meta.get_field(field.source)
+                if not relation.many_to_many:
+                    raise TypeError(f"{name} is not a many to many relation")
+                child = CompiledSerializer(field.child)
+                self.relations.append((name, relation, child))
+                self.fields.append((name, None, None))  # filled in by rows()
+                encoders.append((name, child.json))
+                continue
+            if field.source not in columns:
+                raise TypeError(f"{name} is not read from a column")
+            if isinstance(field, serializers.DecimalField):
+                converter, encoder = _decimal(field), _string
+                if converter is None:
+                    raise TypeError(f"{name} is not rendered as a plain string")
+            elif isinstance(field, PLAIN_FIELDS):
+                converter = None
+                if isinstance(field, serializers.BooleanField):
+                    encoder = _boolean
+                elif isinstance(field, serializers.IntegerField):
+                    encoder = _number
+                else:
+                    encoder = _string
+            else:
+                raise TypeError(f"{name} is a {type(field).__name__}")
+            self.fields.append((name, columns[field.source].attname, converter))
+            encoders.append((name, encoder))
+
+        self.columns = list(dict.fromkeys(
+            [self.pk] + [column for _, column, _ in self.fields if column is not None]
+        ))
+        self.encoders = [encoder for _, encoder in encoders]
+        self.template = "{%s}" % ",".join(
+            encode_basestring(name).replace("%", "%%") + ":%s" for name, _ in encoders
+        )
+
+    def values(self, queryset):
+        """Return the queryset as values() rows with the columns the fields need."""
+        # annotations like a search rank stay, the paginator orders by them.
+        return queryset.prefetch_related(None).values(*self.columns, *queryset.query.annotations)
+
+    def rows(self, values):
+        """Return the serialized rows of values() rows."""
+        rows = [self.row(values_row) for values_row in values]
+        for name, relation, child in self.relations:
+            related = child.related_to(relation, [row[self.pk] for row in values]) if rows else {}
+            for row, values_row in zip(rows, values):
+                row[name] = related.get(values_row[self.pk], [])
+        return CompiledRows(rows, self)
+
+    def row(self, values):
+        row = {}
+        # every field is set in order, so the values line up with the JSON template.
+        for name, column, converter in self.fields:
+            if column is None:
+                row[name] = None
+            elif converter is None:
+                row[name] = values[column]
+            else:
+                row[name] = converter(values[column])
+        return row
+
+    def related_to(self, relation, ids):
+        """Return {id: [serialized rows]} of the objects linked to those ids through a relation."""
+        lookup = relation.related_query_name()
+        values = list(relation.related_model._default_manager.filter(
+            **{f"{lookup}__in": ids}
+        ).values(lookup, *self.columns))
+        related = {}
+        for values_row, row in zip(values, self.rows(values)):
+            related.setdefault(values_row[lookup], []).append(row)
+        return related
+
+    def json(self, rows):
+        """Return the rows as a JSON array."""
+        template, encoders = self.template, self.encoders
+        return "[%s]" % ",".join([
+            template % tuple([encode(value) for encode, value in zip(encoders, row.values())])
+            for row in rows
+        ])
+
+
+@lru_cache(maxsize=128)
+def _compile(serializer_class, selection):
+    try:
+        return CompiledSerializer(serializer_class(context={"fields": selection}))
+    except TypeError:
+        return None
+
+
+def compile_serializer(serializer_class, selection=None):
+    """Return the compiled form of a serializer with the selected fields, or None if it can't be compiled."""
+    return _compile(serializer_class, frozenset(selection) if selection is not None else None)
+
+
+class CompiledListMixin:
+    """Lists through the compiled form of the serializer when there is one"""
+
+    def list(self, request, *args, **kwargs):
+        compiled = compile_serializer(
+            self.get_serializer_class(), self.get_serializer_context().get("fields"),
+        )
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+
+        values = compiled.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(values)
+        if page is not None:
+            return self.get_paginated_response(compiled.rows(page))
+        return Response(compiled.rows(list(values)))
@@ -0,0 +1,93 @@
+"""
+Streaming export of a user's recipes
+
+Recipes are read through a server-side cursor with values() so no model
+instances are built, and tags and ingredients are fetched with one query
+each per chunk of rows. Lines are rendered as they are produced, so memory
+use depends on the chunk size and not on the size of the library.
+"""
+import csv
+import json
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+from db_connection.models import Recipe
+
+CHUNK_SIZE = 2000
+FIELDS = [
+    "id", "title", "time_minutes", "price", "link", "image_width", "image_height",
+    "image_placeholder", "description", "image", "image_status", "image_variants",
+]
+# a cell holds one value, so the nested variant URLs are left out of CSV.
+CSV_FIELDS = [field for field in FIELDS if field != "image_variants"]
+RELATIONS = ("tags", "ingredients")
+# separates tag and ingredient names inside a CSV cell.
+CSV_NAME_SEPARATOR = "|"
+
+
+def export_rows(queryset, request, chunk_size=None):
+    """Yield one dict per recipe, shaped like RecipeDetailSerializer output."""
+    chunk_size = chunk_size or CHUNK_SIZE
+    # prefetching is not applied to iterator(), the relations are loaded per chunk below.
+    rows = queryset.prefetch_related(None).values(*FIELDS).iterator(chunk_size=chunk_size)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _with_relations(chunk, request)
+            chunk = []
+    if chunk:
+        yield from _with_relations(chunk, request)
+
+
+def _with_relations(chunk, request):
+    related = {}
+    ids = [row["id"] for row in chunk]
+    for name in RELATIONS:
+        field = getattr(Recipe, name).field
+        target = field.m2m_reverse_field_name()
+        links = field.remote_field.through.objects.filter(recipe_id__in=ids).order_by(
+            f"{target}__name",
+        ).values_list("recipe_id", f"{target}_id", f"{target}__name")
+        related[name] = {}
+        for recipe_id, related_id, related_name in links:
+            related[name].setdefault(recipe_id, []).append({"id": related_id, "name": related_name})
+
+    for row in chunk:
+        if row["image"]:
+            row["image"] = request.build_absolute_uri(default_storage.url(row["image"]))
+        else:
+            row["image"] = None
+        row["image_variants"] = {
+            size: {
+                fmt: request.build_absolute_uri(default_storage.url(name))
+                for fmt, name in formats.items()
+            }
+            for size, formats in row["image_variants"].items()
+        }
+        for name in RELATIONS:
+            row[name] = related[name].get(row["id"], [])
+        yield row
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+class Echo:
+    """File-like object that hands back what is written, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_FIELDS + list(RELATIONS))
+    for row in rows:
+        yield writer.writerow(
+            [row[field] for field in CSV_FIELDS]
+            + [CSV_NAME_SEPARATOR.join(item["name"] for item in row[name]) for name in RELATIONS]
+        )
@@ -0,0 +1,89 @@
+"""
+Sparse fieldsets for the recipe endpoints
+
+?fields=id,title,price limits list and detail responses to the named fields,
+and ?expand=tags adds nested relations to them. The same selection decides
+which columns the queryset loads with only() and which relations are
+prefetched, so a thin list skips the description, the search vector and the
+tag and ingredient queries. Without ?fields= every field of the serializer is
+sent, and still only the columns it renders are loaded.
+"""
+from django.utils.translation import gettext as _
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+def _names(value):
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+class SparseFieldsSerializerMixin:
+    """Drops the fields not named by the view's selection, passed as context["fields"]"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.context.get("fields")
+        if selected is not None:
+            for name in set(self.fields) - selected:
+                self.fields.pop(name)
+
+
+class SparseFieldsMixin:
+    """Reads ?fields= and ?expand= and prunes the queryset and serializer to them"""
+    sparse_actions = ("list", "retrieve")
+    # relations that are only prefetched when rendered
+    sparse_relations = ("tags", "ingredients")
+
+    def get_sparse_fields(self):
+        """Return the names of the fields to render, or None for all of them."""
+        if self.action not in self.sparse_actions:
+            return None
+        if not hasattr(self, "_sparse_fields"):
+            self._sparse_fields = self._read_sparse_fields()
+        return self._sparse_fields
+
+    def _read_sparse_fields(self):
+        params = self.request.query_params
+        if not params.get(FIELDS_PARAM):
+            return None
+        available = self.get_serializer_class()().fields
+        expandable = {
+            name for name, field in available.items() if isinstance(field, serializers.BaseSerializer)
+        }
+        fields, expand = _names(params[FIELDS_PARAM]), _names(params.get(EXPAND_PARAM, ""))
+        errors = {}
+        if fields - set(available):
+            errors[FIELDS_PARAM] = [_("Unknown fields: %(names)s.") % {
+                "names": ", ".join(sorted(fields - set(available))),
+            }]
+        if expand - expandable:
+            errors[EXPAND_PARAM] = [_("Expected any of %(names)s.") % {
+                "names": ", ".join(sorted(expandable)),
+            }]
+        if errors:
+            raise ValidationError(errors)
+        return fields | expand
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["fields"] = self.get_sparse_fields()
+        return context
+
+    def prune_queryset(self, queryset):
+        """Load only the columns and relations the response renders."""
+        if self.action not in self.sparse_actions:
+            return queryset.prefetch_related(*self.sparse_relations)
+
+        serializer = self.get_serializer()  # already pruned to the selection
+        columns = {field.name for field in queryset.model._meta.concrete_fields}
+        only = set()
+        for name, field in serializer.fields.items():
+            # method fields are read through "*", they use the column of their own name here.
+            source = name if field.source == "*" else field.source
+            if source in columns:
+                only.add(source)
+        relations = [name for name in self.sparse_relations if name in serializer.fields]
+        return queryset.only(*only).prefetch_related(*relations)
@@ -0,0 +1,209 @@
+"""
+Resized variants of uploaded recipe images
+
+upload_image only stores the original and marks the recipe pending. Once that
+commits, a pool of IMAGE_WORKERS threads per process decodes the original,
+applies its EXIF orientation and writes thumb, medium and large copies as WebP
+and JPEG without any metadata. An original carrying EXIF, XMP or comments,
+like the GPS position a phone stamps on its photos, is first rewritten the
+right way up without them and stored in place of the upload, so the media
+endpoint never sends it back. Pillow releases the GIL while decoding and
+resizing, so threads are enough to keep this off the request path.
+
+Images over IMAGE_MAX_PIXELS are refused at upload from their header alone and
+again here, so a small file that decodes to a huge bitmap can't tie up a
+worker. JPEGs are decoded straight at a reduced scale when the large variant
+allows it.
+
+A process that dies leaves its recipes pending, the process_images command
+picks them up again. Variants are stored by content like the originals, and
+replaced ones are left for the prune_images command.
+"""
+import base64
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+from PIL import Image, ImageOps
+
+from db_connection.models import Recipe
+from recipe.cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+# longest side in pixels, largest first so each size is resized from the one before.
+VARIANTS = (("large", 1280), ("medium", 640), ("thumb", 160))
+FORMATS = (
+    ("webp", "WEBP", {"quality": 80, "method": 4}),
+    ("jpeg", "JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+)
+VARIANT_PATH = "uploads/recipe/variants/{}-{}.{}"
+# longest side of the placeholder, which clients stretch and blur.
+PLACEHOLDER_SIZE = 16
+# EXIF orientations that turn the image on its side
+SIDEWAYS = (5, 6, 7, 8)
+# Image.info keys holding metadata; the ICC profile is kept, it is needed to show the colours.
+METADATA = ("exif", "xmp", "XML:com.adobe.xmp", "comment", "photoshop")
+
+# Pillow refuses to open anything over twice this, the upload check refuses over once.
+Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def check_pixels(image):
+    """Raise ValueError if an opened image is over IMAGE_MAX_PIXELS, before it is decoded."""
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValueError(f"{width}x{height} is over {settings.IMAGE_MAX_PIXELS} pixels")
+
+
+def upright_size(image):
+    """Return the (width, height) an opened image shows at once its EXIF orientation is applied."""
+    width, height = image.size
+    if image.getexif().get(0x0112) in SIDEWAYS:
+        return height, width
+    return width, height
+
+
+def placeholder(image):
+    """Return a data URI of a few hundred bytes standing in for an image while it loads."""
+    small = image.copy()
+    small.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BILINEAR)
+    buffer = io.BytesIO()
+    small.save(buffer, "WEBP", quality=40)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def render_variants(field_file):
+    """Write the variants of a stored image.
+
+    Returns them as {size: {format: name}} along with a placeholder.
+    """
+    stem = os.path.splitext(os.path.basename(field_file.name))[0]
+    storage = field_file.storage
+    variants = {}
+    image = open_upright(field_file, VARIANTS[0][1])
+    for size_name, size in VARIANTS:
+        image.thumbnail((size, size), Image.LANCZOS)
+        variants[size_name] = {}
+        for ext, fmt, options in FORMATS:
+            buffer = io.BytesIO()
+            # no exif or other info is passed on, so the copies carry no metadata.
+            image.save(buffer, fmt, **options)
+            name = storage.save(
+                VARIANT_PATH.format(stem, size_name, ext), ContentFile(buffer.getvalue()),
+            )
+            variants[size_name][ext] = name
+    return variants, placeholder(image)
+
+
+def strip_metadata(field_file):
+    """Return a stored image rewritten upright without metadata, or None if it has none."""
+    with field_file.storage.open(field_file.name, "rb") as f, Image.open(f) as original:
+        check_pixels(original)
+        exif = original.getexif()
+        if getattr(original, "is_animated", False) or not (
+            exif or any(key in original.info for key in METADATA)
+        ):
+            return None
+        rotated = exif.get(0x0112, 1) != 1
+        image = ImageOps.exif_transpose(original) if rotated else original
+        options = {}
+        if original.format == "JPEG":
+            # an upright JPEG keeps its quantization tables, so it isn't degraded again.
+            options["quality"] = 95 if rotated else "keep"
+        elif original.format == "WEBP":
+            options["quality"] = 95
+        if "icc_profile" in original.info:
+            options["icc_profile"] = original.info["icc_profile"]
+        image.info = {key: value for key, value in image.info.items() if key not in METADATA}
+        buffer = io.BytesIO()
+        image.save(buffer, original.format, **options)
+        return buffer.getvalue()
+
+
+def open_upright(field_file, longest):
+    """Decode a stored image as RGB the right way up, at no less than longest pixels a side."""
+    with field_file.storage.open(field_file.name, "rb") as f, Image.open(f) as original:
+        check_pixels(original)
+        # for JPEGs this makes the decoder skip detail the result doesn't need.
+        original.draft("RGB", (longest, longest))
+        return _flatten(ImageOps.exif_transpose(original))
+
+
+def _flatten(image):
+    """Return an RGB copy of an image, putting transparent pixels on white."""
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def process_image(recipe_id):
+    """Make the variants of a pending recipe image."""
+    recipe = Recipe.objects.filter(pk=recipe_id).only("id", "user_id", "image").first()
+    if recipe is None or not recipe.image:
+        return
+    name = recipe.image.name
+    # claiming the row by status and image stops two workers, or a newer upload, from racing.
+    claimed = Recipe.objects.filter(
+        pk=recipe_id, image=name, image_status=Recipe.ImageStatus.PENDING,
+    ).update(image_status=Recipe.ImageStatus.PROCESSING)
+    if not claimed:
+        return
+
+    try:
+        stripped = strip_metadata(recipe.image)
+        if stripped is not None:
+            stored = recipe.image.storage.save(
+                recipe.image.field.generate_filename(recipe, os.path.basename(name)), ContentFile(stripped),
+            )
+            # the upload's blob loses its last reference here and is left for prune_images.
+            if not Recipe.objects.filter(
+                pk=recipe_id, image=name, image_status=Recipe.ImageStatus.PROCESSING,
+            ).update(image=stored):
+                return
+            recipe.image.name = name = stored
+        variants, lqip = render_variants(recipe.image)
+    except Exception:
+        logger.exception("Processing the image of recipe %s failed", recipe_id)
+        variants, lqip, state = {}, "", Recipe.ImageStatus.FAILED
+    else:
+        state = Recipe.ImageStatus.READY
+
+    # if the image was replaced meanwhile, these variants are never referenced and get pruned.
+    finished = Recipe.objects.filter(
+        pk=recipe_id, image=name, image_status=Recipe.ImageStatus.PROCESSING,
+    ).update(image_status=state, image_variants=variants, image_placeholder=lqip)
+    if finished and settings.RECIPE_RESPONSE_CACHE:
+        response_cache.bump(recipe.user_id)  # update() sends no post_save
+
+
+def enqueue_image(recipe_id):
+    """Process a recipe image on the worker pool, or inline without workers."""
+    if not settings.IMAGE_WORKERS:
+        process_image(recipe_id)
+        return
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS, thread_name_prefix="recipe-images",
+            )
+    _pool.submit(_work, recipe_id)
+
+
+def _work(recipe_id):
+    try:
+        process_image(recipe_id)
+    finally:
+        connections.close_all()  # only this worker thread's connections
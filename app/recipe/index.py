@@ -0,0 +1,224 @@
+"""
+In-process bitmap index of recipes by tag and ingredient
+
+When RECIPE_FILTER_INDEX is enabled, tag and ingredient filters on the recipe
+list are answered from per-user bitmaps held in memory, and Postgres is only
+asked for the page of recipe ids that is actually rendered.
+
+Each user's recipes are numbered 0..n-1 and every tag or ingredient maps to a
+Python int whose set bits are the positions of its recipes, so all-of, any-of
+and none-of terms become &, | and & ~ on ints.
+
+Indexes are built lazily on first use, updated by the handlers in
+recipe.signals once the writing transaction commits, and evicted least
+recently used first when they grow past RECIPE_FILTER_INDEX_MAX_BYTES. A
+per-user version number in the Django cache tells the other worker processes
+to rebuild, so the index refuses to start without a shared cache backend, see
+recipe.checks.
+"""
+import random
+import sys
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from db_connection.models import Recipe
+from recipe.filters import parse_relation_filter
+
+VERSION_KEY = "recipe-index:version:{}"
+
+# rough cost of a dict entry on top of the objects it points at.
+ENTRY_BYTES = 100
+
+
+class UserRecipeIndex:
+    """Bitmaps of one user's recipes by tag and by ingredient"""
+
+    def __init__(self, user_id, version):
+        self.user_id = user_id
+        self.version = version
+        self.positions = {}  # recipe id -> bit position
+        self.recipe_ids = []  # bit position -> recipe id
+        self.universe = 0
+        self.relations = {"tags": {}, "ingredients": {}}
+        self.nbytes = 0
+
+    @classmethod
+    def build(cls, user_id, version):
+        """Load a user's recipes and through table rows into a new index."""
+        index = cls(user_id, version)
+        recipe_ids = Recipe.objects.filter(user_id=user_id).order_by("id").values_list("id", flat=True)
+        for recipe_id in recipe_ids.iterator():
+            index.add_recipe(recipe_id)
+
+        for name in index.relations:
+            field = getattr(Recipe, name).field
+            source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+            rows = field.remote_field.through.objects.filter(
+                **{f"{source}__user_id": user_id}
+            ).values_list(f"{source}_id", f"{target}_id")
+            for recipe_id, related_id in rows.iterator():
+                index.link(name, recipe_id, [related_id])
+
+        index.measure()
+        return index
+
+    def add_recipe(self, recipe_id):
+        if recipe_id not in self.positions:
+            self.positions[recipe_id] = len(self.recipe_ids)
+            self.recipe_ids.append(recipe_id)
+        self.universe |= 1 << self.positions[recipe_id]
+
+    def remove_recipe(self, recipe_id):
+        # the bit stays set in tag and ingredient bitmaps, matches are masked with the universe.
+        position = self.positions.get(recipe_id)
+        if position is not None:
+            self.universe &= ~(1 << position)
+
+    def link(self, name, recipe_id, related_ids):
+        self.add_recipe(recipe_id)
+        bit = 1 << self.positions[recipe_id]
+        bitmaps = self.relations[name]
+        for related_id in related_ids:
+            bitmaps[related_id] = bitmaps.get(related_id, 0) | bit
+
+    def unlink(self, name, recipe_id, related_ids=None):
+        """Remove a recipe from some, or with no ids all, of a relation's bitmaps."""
+        position = self.positions.get(recipe_id)
+        if position is None:
+            return
+        mask = ~(1 << position)
+        bitmaps = self.relations[name]
+        for related_id in (bitmaps.keys() if related_ids is None else related_ids):
+            if related_id in bitmaps:
+                bitmaps[related_id] &= mask
+
+    def drop_related(self, name, related_id):
+        self.relations[name].pop(related_id, None)
+
+    def match(self, name, value, param):
+        """Return the bitmap of recipes matching a filter value."""
+        groups, excluded = parse_relation_filter(value, param)
+        bitmaps = self.relations[name]
+
+        result = 0 if groups else self.universe
+        for group in groups:
+            term = self.universe
+            for related_id in group:
+                term &= bitmaps.get(related_id, 0)
+            result |= term
+        for related_id in excluded:
+            result &= ~bitmaps.get(related_id, 0)
+        return result & self.universe
+
+    def ids(self, bitmap):
+        """Return the recipe ids set in a bitmap, newest first."""
+        bits = bin(bitmap)[:1:-1]  # least significant bit first
+        return sorted(
+            (self.recipe_ids[position] for position, bit in enumerate(bits) if bit == "1"),
+            reverse=True,
+        )
+
+    def measure(self):
+        self.nbytes = (
+            sys.getsizeof(self.positions)
+            + sys.getsizeof(self.recipe_ids)
+            + len(self.recipe_ids) * ENTRY_BYTES
+        )
+        for bitmaps in self.relations.values():
+            self.nbytes += sum(sys.getsizeof(bitmap) + ENTRY_BYTES for bitmap in bitmaps.values())
+        return self.nbytes
+
+
+class RecipeIndex:
+    """LRU collection of per-user indexes bounded by RECIPE_FILTER_INDEX_MAX_BYTES"""
+
+    def __init__(self):
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+
+    def _shared_version(self, user_id):
+        key = VERSION_KEY.format(user_id)
+        version = cache.get(key)
+        if version is None:
+            # start from a random number so a version evicted from the cache is never reused.
+            cache.add(key, random.getrandbits(48), None)
+            version = cache.get(key)
+        return version
+
+    def get(self, user_id):
+        """Return an up to date index for a user, building it if needed."""
+        version = self._shared_version(user_id)
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None and index.version == version:
+                self._users.move_to_end(user_id)
+                return index
+
+        index = UserRecipeIndex.build(user_id, version)
+        with self._lock:
+            self._store(index)
+        return index
+
+    def update(self, user_id, change):
+        """Apply change(index) to a user's cached index after a committed write.
+
+        The shared version is bumped first. If it moved by more than our own
+        bump another process wrote in between, so the index is dropped instead.
+        """
+        try:
+            version = cache.incr(VERSION_KEY.format(user_id))
+        except ValueError:
+            version = None
+
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is None:
+                return
+            if version is None or index.version is None or version != index.version + 1:
+                self._discard(user_id)
+                return
+            change(index)
+            index.version = version
+            self.nbytes -= index.nbytes
+            self.nbytes += index.measure()
+            self._evict()
+
+    def invalidate(self, user_id):
+        """Drop a user's index in every process, for writes too broad to apply in place."""
+        try:
+            cache.incr(VERSION_KEY.format(user_id))
+        except ValueError:
+            pass
+        with self._lock:
+            self._discard(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self.nbytes = 0
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+    def _store(self, index):
+        self._discard(index.user_id)
+        self._users[index.user_id] = index
+        self.nbytes += index.nbytes
+        self._evict()
+
+    def _discard(self, user_id):
+        index = self._users.pop(user_id, None)
+        if index is not None:
+            self.nbytes -= index.nbytes
+
+    def _evict(self):
+        while self._users and self.nbytes > settings.RECIPE_FILTER_INDEX_MAX_BYTES:
+            user_id, index = self._users.popitem(last=False)
+            self.nbytes -= index.nbytes
+
+
+recipe_index = RecipeIndex()
@@ -0,0 +1,65 @@
+"""
+Django command to give images uploaded before placeholders their dimensions and placeholder.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from PIL import Image
+
+from db_connection.models import Recipe
+from recipe.cache import response_cache
+from recipe.images import check_pixels, open_upright, placeholder, upright_size, PLACEHOLDER_SIZE
+
+
+def backfill(recipe_id):
+    """Fill in one recipe, return whether it was updated"""
+    recipe = Recipe.objects.filter(pk=recipe_id).only("id", "user_id", "image").first()
+    if recipe is None or not recipe.image:
+        return False
+    try:
+        with recipe.image.storage.open(recipe.image.name, "rb") as f, Image.open(f) as header:
+            check_pixels(header)
+            width, height = upright_size(header)
+        # the placeholder is tiny, so JPEGs are decoded at an eighth of their size.
+        lqip = placeholder(open_upright(recipe.image, PLACEHOLDER_SIZE))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return False
+    # only if the image is still the one measured.
+    updated = Recipe.objects.filter(pk=recipe_id, image=recipe.image.name).update(
+        image_width=width, image_height=height, image_placeholder=lqip,
+    )
+    if updated and settings.RECIPE_RESPONSE_CACHE:
+        response_cache.bump(recipe.user_id)  # update() sends no post_save
+    return bool(updated)
+
+
+def _backfill_in_worker(recipe_id):
+    try:
+        return backfill(recipe_id)
+    finally:
+        connections.close_all()  # only this worker thread's connections
+
+
+class Command(BaseCommand):
+    """Django command to backfill image dimensions and placeholders"""
+
+    help = "Compute dimensions and placeholders of recipe images that have none, in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="0 works in this thread.")
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        ids = list(
+            Recipe.objects.exclude(image="").exclude(image__isnull=True)
+            .filter(image_placeholder="").values_list("id", flat=True)
+        )
+        if options["workers"] > 0:
+            # Pillow decodes and resizes without the GIL, so threads run in parallel.
+            with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                done = sum(pool.map(_backfill_in_worker, ids))
+        else:
+            done = sum(map(backfill, ids))
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {done} of {len(ids)} images."))
@@ -0,0 +1,42 @@
+"""
+Django command to merge tags and ingredients whose names only differ in case or spacing.
+"""
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from db_connection.models import Recipe
+from db_connection.names import merge_duplicate_names
+from recipe.cache import GENERATION_KEY
+from recipe.index import VERSION_KEY
+
+
+class Command(BaseCommand):
+    """Django command to merge duplicate tag and ingredient names"""
+
+    help = "Merge each user's tags and ingredients whose names only differ in case or spacing."
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        affected = set()
+        for name in ("tags", "ingredients"):
+            field = getattr(Recipe, name).field
+            through = field.remote_field.through._meta
+            with transaction.atomic(), connection.cursor() as cursor:
+                removed = merge_duplicate_names(
+                    cursor,
+                    connection.ops.quote_name(field.related_model._meta.db_table),
+                    connection.ops.quote_name(through.db_table),
+                    connection.ops.quote_name(through.get_field(field.m2m_reverse_field_name()).column),
+                )
+            affected.update(removed)
+            self.stdout.write(
+                f"Merged {sum(removed.values())} duplicate {name} for {len(removed)} users."
+            )
+
+        # raw SQL skips the signals, so make every process rebuild the affected filter
+        # indexes and drop the cached responses of those users.
+        cache.delete_many(
+            [key.format(user_id) for user_id in affected for key in (VERSION_KEY, GENERATION_KEY)]
+        )
+        self.stdout.write(self.style.SUCCESS("Duplicate names merged!"))
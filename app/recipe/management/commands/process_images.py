@@ -0,0 +1,42 @@
+"""
+Django command to make the resized variants of recipe images.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from db_connection.models import Recipe
+from recipe.cache import response_cache
+from recipe.images import process_image
+
+
+class Command(BaseCommand):
+    """Django command to process recipe images left without variants"""
+
+    help = (
+        "Make the variants of recipe images that were never processed or were left "
+        "pending by a worker that stopped. --retry-failed also retries failed ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--retry-failed", action="store_true")
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        statuses = [Recipe.ImageStatus.NONE, Recipe.ImageStatus.PENDING, Recipe.ImageStatus.PROCESSING]
+        if options["retry_failed"]:
+            statuses.append(Recipe.ImageStatus.FAILED)
+        queryset = Recipe.objects.exclude(image="").exclude(image__isnull=True).filter(
+            image_status__in=statuses,
+        )
+        rows = list(queryset.values_list("id", "user_id"))
+        ids = [recipe_id for recipe_id, _ in rows]
+        queryset.update(image_status=Recipe.ImageStatus.PENDING)
+        if settings.RECIPE_RESPONSE_CACHE:
+            # update() sends no post_save, and processing only bumps the images it finishes.
+            for user_id in {user_id for _, user_id in rows}:
+                response_cache.bump(user_id)
+
+        for recipe_id in ids:
+            process_image(recipe_id)
+        ready = Recipe.objects.filter(id__in=ids, image_status=Recipe.ImageStatus.READY).count()
+        self.stdout.write(self.style.SUCCESS(f"Processed {ready} of {len(ids)} images."))
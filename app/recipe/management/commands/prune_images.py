@@ -0,0 +1,33 @@
+"""
+Django command to delete stored images no recipe points at any more.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from db_connection.models import ImageBlob, Recipe
+
+
+class Command(BaseCommand):
+    """Django command to prune unreferenced image files"""
+
+    help = "Delete image files with no references for IMAGE_PRUNE_GRACE_SECONDS."
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        storage = Recipe._meta.get_field("image").storage
+        cutoff = timezone.now() - timedelta(seconds=settings.IMAGE_PRUNE_GRACE_SECONDS)
+        with transaction.atomic():
+            # the row locks make a concurrent upload of the same content wait for the files to go.
+            blobs = list(
+                ImageBlob.objects.select_for_update(skip_locked=True).filter(
+                    refs__lte=0, updated_at__lt=cutoff,
+                )
+            )
+            for blob in blobs:
+                storage.delete(blob.name)
+            ImageBlob.objects.filter(id__in=[blob.id for blob in blobs]).delete()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {len(blobs)} images."))
@@ -0,0 +1,42 @@
+"""
+Authorization for recipe media
+
+Media URLs are served by MediaView, which checks the file is the image or an
+image variant of one of the user's recipes and then, in production, hands the
+path to nginx with X-Accel-Redirect so the bytes, ranges and conditional
+requests never touch a uwsgi worker. Granted checks are cached for
+MEDIA_ACCESS_CACHE_TIMEOUT seconds. Files are named by content and never
+change, so a grant can only go stale by the user removing the image.
+"""
+import hashlib
+import posixpath
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+from db_connection.models import Recipe
+
+ACCESS_KEY = "media-access:{}:{}"
+
+
+def is_safe_name(name):
+    """Return whether a requested media name is a plain relative path."""
+    return bool(name) and posixpath.normpath(name) == name and not name.startswith(("/", "../"))
+
+
+def media_allowed(user, name):
+    """Return whether a user's recipes name this media file."""
+    key = ACCESS_KEY.format(user.pk, hashlib.md5(name.encode()).hexdigest())
+    if cache.get(key):
+        return True
+    # recipe_image_names() lists the image and variants of a row, see migration 0015.
+    allowed = Recipe.objects.filter(user=user).annotate(
+        names_file=RawSQL(
+            "%s IN (SELECT recipe_image_names(image, image_variants))", [name], output_field=BooleanField(),
+        ),
+    ).filter(names_file=True).exists()
+    if allowed:  # refusals are not cached, the file may be named by a write in flight
+        cache.set(key, True, settings.MEDIA_ACCESS_CACHE_TIMEOUT)
+    return allowed
@@ -0,0 +1,111 @@
+"""
+Pagination for the recipe API
+"""
+import json
+
+from django.db import connections
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+def estimate_count(queryset, exact_threshold):
+    """Return the planner's row estimate for a queryset and whether it is an estimate.
+
+    Small results are cheap to count exactly, so below the threshold we fall
+    back to a real COUNT(*).
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):  # older drivers hand the plan back as text
+        plan = json.loads(plan)
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+
+    if estimate < exact_threshold:
+        return queryset.count(), False
+    return estimate, True
+
+
+class EstimatedTotalCursorPagination(CursorPagination):
+    """Keyset pagination that can report an estimated total when asked for one"""
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    total_query_param = "include_total"
+    exact_total_threshold = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        self.count_is_estimate = False
+        if request.query_params.get(self.total_query_param) in ("1", "true"):
+            # views that already know the exact total, e.g. from the filter index, hand it over.
+            self.count = getattr(view, "filtered_count", None)
+            if self.count is None:
+                self.count, self.count_is_estimate = estimate_count(
+                    queryset, self.exact_total_threshold,
+                )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        payload = {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+        }
+        if self.count is not None:
+            payload["count"] = self.count
+            payload["count_is_estimate"] = self.count_is_estimate
+        payload["results"] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"].update({
+            "count": {"type": "integer", "description": f"only sent when {self.total_query_param}=1"},
+            "count_is_estimate": {"type": "boolean"},
+        })
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            "name": self.total_query_param,
+            "required": False,
+            "in": "query",
+            "description": "Set to 1 to include an estimated total count.",
+            "schema": {"type": "integer", "enum": [0, 1]},
+        })
+        return parameters
+
+
+class RecipePagination(EstimatedTotalCursorPagination):
+    """Newest recipes first"""
+    ordering = "-id"
+
+    def get_ordering(self, request, queryset, view):
+        """Page search results by relevance, everything else by id"""
+        if "rank" in queryset.query.annotations:
+            return ("-rank", "-id")
+        return super().get_ordering(request, queryset, view)
+
+    def id_window(self, ids, request):
+        """Trim recipe ids, newest first, to the ones the requested page can contain."""
+        cursor = self.decode_cursor(request)
+        offset, reverse, position = cursor if cursor else (0, False, None)
+        if position is not None:
+            try:
+                position = int(position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            ids = [id_ for id_ in ids if (id_ > position if reverse else id_ < position)]
+        if reverse:
+            ids = ids[::-1]
+        # one extra id tells the paginator whether a following page exists.
+        return ids[:offset + self.get_page_size(request) + 1]
+
+
+class RecipeAttrPagination(EstimatedTotalCursorPagination):
+    """Tags and ingredients by name, with the id as a tie breaker"""
+    ordering = ("-name", "id")
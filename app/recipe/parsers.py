@@ -0,0 +1,68 @@
+"""
+Parsers for the recipe API
+"""
+import json
+
+import cbor2
+import msgpack
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Newline delimited JSON, parsed lazily one line at a time.
+
+    request.data becomes a generator so a large body is never held in memory.
+    A line that cannot be parsed is yielded as a ParseError for the caller to
+    report against that line, the lines after it are still read.
+    """
+    media_type = "application/x-ndjson"
+    max_line_bytes = 64 * 1024
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return self._lines(stream)
+
+    def _lines(self, stream):
+        while True:
+            line = stream.readline(self.max_line_bytes + 1)
+            if not line:
+                return
+            if len(line) > self.max_line_bytes:
+                while line and not line.endswith(b"\n"):  # skip the rest of the line
+                    line = stream.readline(self.max_line_bytes)
+                yield ParseError(_("Line is longer than %(max)d bytes.") % {"max": self.max_line_bytes})
+                continue
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                yield ParseError(_("JSON parse error - %(detail)s") % {"detail": exc})
+
+
+class MessagePackParser(BaseParser):
+    """MessagePack request bodies, decoded to the same data as their JSON form"""
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            # timestamps and other extension types are left as they are, the serializers reject them.
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(_("MessagePack parse error - %(detail)s") % {"detail": exc})
+
+
+class CBORParser(BaseParser):
+    """CBOR request bodies.
+
+    Decimal fractions (tag 4) decode to Decimal, which the price field takes
+    as it takes a decimal string.
+    """
+    media_type = "application/cbor"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return cbor2.loads(stream.read())
+        except (ValueError, cbor2.CBORDecodeError) as exc:
+            raise ParseError(_("CBOR parse error - %(detail)s") % {"detail": exc})
@@ -0,0 +1,93 @@
+"""
+Renderers for the recipe API
+
+Besides JSON, responses can be MessagePack or CBOR for clients that ask for
+them with the Accept header. The binary formats carry the same data as the
+JSON: prices are the same decimal strings, so no precision is lost and the
+schema holds for every format, and image URLs are the same absolute URLs as
+text strings.
+
+Values the serializers haven't already turned into strings are written the
+way JSONRenderer writes them, except that MessagePack has no decimal type and
+gets decimals as strings, and CBOR uses its own tags for decimals (tag 4) and
+dates (tag 0).
+"""
+import decimal
+import json
+from json.encoder import encode_basestring
+
+import cbor2
+import msgpack
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from recipe.compiled import CompiledRows
+
+
+class CompiledJSONRenderer(JSONRenderer):
+    """JSONRenderer that writes compiled rows through their templates.
+
+    A list or page of CompiledRows is written without walking the rows with
+    the JSON encoder, anything else, and indented output, is left to
+    JSONRenderer. Both give the same bytes.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        rows_only = isinstance(data, CompiledRows)
+        page = isinstance(data, dict) and any(isinstance(value, CompiledRows) for value in data.values())
+        if (
+            not (rows_only or page)
+            or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if rows_only:
+            ret = data.compiled.json(data)
+        else:
+            ret = "{%s}" % ",".join(
+                f"{encode_basestring(key)}:{self._value(value)}" for key, value in data.items()
+            )
+        # JSONRenderer escapes these so the output is also valid javascript
+        ret = ret.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029")
+        return ret.encode()
+
+    def _value(self, value):
+        if isinstance(value, CompiledRows):
+            return value.compiled.json(value)
+        return json.dumps(
+            value, cls=self.encoder_class, ensure_ascii=False, allow_nan=not self.strict, separators=(",", ":"),
+        )
+
+
+def _plain(value):
+    """Return what JSONRenderer would write for a value the binary encoders don't know."""
+    if isinstance(value, decimal.Decimal):
+        return "{:f}".format(value)  # like the serializers' decimal fields
+    return JSONEncoder().default(value)  # dates, UUIDs, lazy strings and the like
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack responses"""
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=_plain, use_bin_type=True)
+
+
+class CBORRenderer(BaseRenderer):
+    """CBOR responses"""
+    media_type = "application/cbor"
+    format = "cbor"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return cbor2.dumps(data, default=lambda encoder, value: encoder.encode(_plain(value)))
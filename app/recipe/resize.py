@@ -0,0 +1,150 @@
+"""
+Recipe images resized on request for srcset
+
+Widths come from the IMAGE_RESIZE_WIDTHS allow-list so the cache can't be
+filled with arbitrary sizes. A resized file is made with Pillow the first time
+it is asked for and kept under IMAGE_RESIZE_CACHE_ROOT, named after the
+original, which is never overwritten. Hits only touch the file's mtime, and
+once the directory is over IMAGE_RESIZE_CACHE_MAX_BYTES the files with the
+oldest mtimes are deleted, so the cache is least recently used across every
+process sharing the directory.
+
+With IMAGE_RESIZE_ACCEL_PREFIX set, the bytes are sent by nginx from an
+internal location instead of by Django, see proxy/default.conf.tpl.
+"""
+import io
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from PIL import Image
+
+from recipe.images import open_upright
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+# hits within this many seconds of the last touch don't touch the file again.
+TOUCH_INTERVAL = 60
+# eviction frees space down to this share of the limit, so it doesn't run on every write.
+EVICT_TO = 0.9
+
+
+class DiskCache:
+    """Files in a directory, the least recently used deleted past a byte limit"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sizes = {}  # root -> bytes this process believes the directory holds
+
+    @property
+    def root(self):
+        return os.path.abspath(settings.IMAGE_RESIZE_CACHE_ROOT)
+
+    def relative_path(self, key):
+        return os.path.join(key[:2], key)
+
+    def get(self, key):
+        """Return the path of a cached file and mark it used, or None."""
+        path = os.path.join(self.root, self.relative_path(key))
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        if time.time() - mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path)
+            except FileNotFoundError:  # evicted by another process just now
+                return None
+        return path
+
+    def put(self, key, content):
+        """Store content under key and return its path."""
+        path = os.path.join(self.root, self.relative_path(key))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # readers never see a half written file, and racing writers just replace each other.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+        self._added(len(content))
+        return path
+
+    def _added(self, size):
+        root = self.root
+        with self._lock:
+            if root not in self._sizes:
+                self._sizes[root] = sum(size for path, size, mtime in self._scan(root))
+            else:
+                self._sizes[root] += size
+            if self._sizes[root] > settings.IMAGE_RESIZE_CACHE_MAX_BYTES:
+                self._sizes[root] = self._evict(root)
+
+    def _evict(self, root):
+        """Delete the least recently used files until under the limit, return what is left."""
+        files = sorted(self._scan(root), key=lambda entry: entry[2])
+        total = sum(size for path, size, mtime in files)
+        target = settings.IMAGE_RESIZE_CACHE_MAX_BYTES * EVICT_TO
+        for path, size, mtime in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return total
+
+    def _scan(self, root):
+        """Yield (path, bytes, mtime) of every cached file, a full rescan so other processes count."""
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.startswith(".tmp-"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+
+disk_cache = DiskCache()
+
+
+def cache_key(image_name, width, fmt):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f"{stem}-w{width}.{fmt}"
+
+
+def resized(field_file, width, fmt):
+    """Return (path, hit) of a stored image resized to width in fmt, making it if needed."""
+    key = cache_key(field_file.name, width, fmt)
+    path = disk_cache.get(key)
+    if path is not None:
+        return path, True
+
+    return disk_cache.put(key, render(field_file, width, fmt)), False
+
+
+def render(field_file, width, fmt):
+    """Return the bytes of a stored image resized to width in fmt."""
+    pil_format, content_type, options = FORMATS[fmt]
+    image = open_upright(field_file, width)
+    image.thumbnail((width, width * 4), Image.LANCZOS)  # width bound, tall images stay sharp
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def open_resized(field_file, width, fmt):
+    """Return (file, hit) like resized(), with the file open for reading."""
+    path, hit = resized(field_file, width, fmt)
+    try:
+        return open(path, "rb"), hit
+    except FileNotFoundError:
+        # evicted between finding or making it and opening it, this request is served from memory.
+        return io.BytesIO(render(field_file, width, fmt)), False
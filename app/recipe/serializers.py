@@ -1,18 +1,41 @@
 """
 Serializers for the recipe API
 """
+from django.conf import settings
+from django.db import transaction
+from django.utils.translation import gettext as _
+from drf_spectacular.utils import extend_schema_field, extend_schema_serializer
 from rest_framework import serializers
 
 from db_connection.models import Recipe, Tag ,Ingredient
+from db_connection.names import NormalizedName, normalize_name
+from recipe.fieldsets import SparseFieldsSerializerMixin
+from recipe.images import check_pixels, upright_size
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class UniqueNameMixin:
+    """Reject renaming a tag or ingredient to a name the user already has"""
+
+    def validate_name(self, value):
+        # nested inside a recipe, names that already exist are reused instead.
+        if self.parent is None and "request" in self.context:
+            others = self.Meta.model.objects.annotate(
+                normalized_name=NormalizedName("name"),
+            ).filter(user=self.context["request"].user, normalized_name=normalize_name(value))
+            if self.instance is not None:
+                others = others.exclude(pk=self.instance.pk)
+            if others.exists():
+                raise serializers.ValidationError(_("You already have one with this name."))
+        return value
+
+
+class IngredientSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """Serializer for the ingredient model"""
     class Meta:
         model = Ingredient
         fields = ["id", "name"]
         read_only_fields = ["id"]
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """Serializer for the tag model"""
 
     class Meta:
@@ -20,37 +43,43 @@ class TagSerializer(serializers.ModelSerializer):
         fields= ["id", "name"]
         read_only_fields = ["id"]
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """Serializer for recipes"""
     tags = TagSerializer(many=True, required=False) # this is simply making the field for 
     # tags when creating a recipe optional and also making it possible to have more than one tag
     ingredients = IngredientSerializer(many=True, required=False)
     class Meta:
         model = Recipe
-        fields = ["id", "title", "time_minutes", "price", "link", "tags", "ingredients"]
+        fields = [
+            "id", "title", "time_minutes", "price", "link", "tags", "ingredients",
+            "image_width", "image_height", "image_placeholder",
+        ]
         read_only_fields = ["id"]
     
+    def _get_or_create(self, model, items):
+        """Return the user's objects named in items, creating the missing ones in one upsert"""
+        auth_user = self.context["request"].user
+        return model.objects.get_or_create_by_name(auth_user, [item["name"] for item in items])
+
     def _get_or_create_tags(self, tags, recipe):  # this is just a helper method to avoid duplicted code fragments
         """Handle the getting or creating of tags as needed"""
-        auth_user = self.context["request"].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag, # this makes it future proof incase you need to add more fields in the future
-            )
-            recipe.tags.add(tag_obj)
-    
+        recipe.tags.add(*self._get_or_create(Tag, tags))
+
     def _get_or_create_ingredients(self, ingredients, recipe):
         """helper function to handle the getting or creating of tag as needed. """
-        auth_user = self.context["request"].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ingredient_obj)
+        recipe.ingredients.add(*self._get_or_create(Ingredient, ingredients))
+
 
+    def _set_related(self, manager, objs):
+        """Link exactly objs to the recipe, only deleting and inserting the through rows that change"""
+        current = {obj.pk for obj in manager.all()}  # served from the view's prefetch when there is one
+        wanted = {obj.pk for obj in objs}
+        if current - wanted:
+            manager.remove(*(current - wanted))
+        if wanted - current:
+            manager.add(*(obj for obj in objs if obj.pk not in current))
 
+    @transaction.atomic
     def create(self, validated_data):
         """Create a recipe""" 
         tags = validated_data.pop("tags", []) 
@@ -60,17 +89,16 @@ class RecipeSerializer(serializers.ModelSerializer):
         self._get_or_create_ingredients(ingredients, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data): #the instance there is simply the instance in the model we are trying to update
         """Update recipe"""
         tags = validated_data.pop("tags", None)
         ingredients = validated_data.pop("ingredients", None)
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            self._set_related(instance.tags, self._get_or_create(Tag, tags))
 
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            self._set_related(instance.ingredients, self._get_or_create(Ingredient, ingredients))
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
@@ -79,16 +107,59 @@ class RecipeSerializer(serializers.ModelSerializer):
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detial view"""
 
+    image_variants = serializers.SerializerMethodField()
+
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ["description", "image"] 
+        fields = RecipeSerializer.Meta.fields + [
+            "description", "image", "image_status", "image_variants",
+        ]
+
+    # {size: {format: url}} for the thumb, medium and large sizes and the webp and jpeg formats.
+    @extend_schema_field(serializers.DictField(child=serializers.DictField(child=serializers.URLField())))
+    def get_image_variants(self, recipe):
+        storage = Recipe._meta.get_field("image").storage
+        request = self.context.get("request")
+        urls = {}
+        for size, formats in recipe.image_variants.items():
+            urls[size] = {}
+            for fmt, name in formats.items():
+                url = storage.url(name)
+                urls[size][fmt] = request.build_absolute_uri(url) if request else url
+        return urls
+
+@extend_schema_serializer(many=False)  # the list route answers with one page object
+class ChangeFeedSerializer(serializers.Serializer):
+    """Serializer for a page of the sync change feed"""
+    recipes = RecipeDetailSerializer(many=True)
+    tags = TagSerializer(many=True)
+    ingredients = IngredientSerializer(many=True)
+    deleted = serializers.DictField(child=serializers.ListField(child=serializers.IntegerField()))
+    cursor = serializers.CharField()
+    has_more = serializers.BooleanField()
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploadding images to recipes."""
 
     class Meta:
         model = Recipe
-        fields = ["id", "image"]
+        fields = ["id", "image", "image_status", "image_width", "image_height"]
         extra_kwargs = {"image":{"required":"True"}}
 
+    def validate_image(self, value):
+        """Refuse uploads too large to process, judging pixels by the header alone"""
+        if value.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+            raise serializers.ValidationError(_("Image file is too large."))
+        try:
+            check_pixels(value.image)  # opened, not decoded, by the field's own validation
+        except ValueError:
+            raise serializers.ValidationError(_("Image dimensions are too large."))
+        return value
+
+    def validate(self, attrs):
+        """Record the image's dimensions so clients can lay it out before it loads"""
+        attrs["image_width"], attrs["image_height"] = upright_size(attrs["image"].image)
+        attrs["image_placeholder"] = ""  # the worker makes one for the new image
+        return attrs
+
         # the reason for creating a seperate serializer for the image field is due to the fact that
         # we only like to upload one particlar type of data to a particular endpoint.
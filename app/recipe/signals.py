@@ -0,0 +1,136 @@
+"""
+Signal handlers for the recipe app
+"""
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from db_connection.models import Recipe, Tag, Ingredient
+from recipe.cache import response_cache
+from recipe.index import recipe_index
+
+# sent with a user_id after bulk writes that bypass the model signals.
+bulk_recipes_changed = Signal()
+
+
+def _update_index(user_id, change):
+    """Update the filter index once the current transaction commits."""
+    if settings.RECIPE_FILTER_INDEX:
+        transaction.on_commit(lambda: recipe_index.update(user_id, change))
+
+
+def _bump_generation(user_id):
+    """Orphan the user's cached responses once the current transaction commits."""
+    if settings.RECIPE_RESPONSE_CACHE:
+        transaction.on_commit(lambda: response_cache.bump(user_id))
+
+
+def _relation_changed(name, instance, action, reverse, pk_set):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    # capture ids now, the callback runs after commit.
+    instance_id, pk_set = instance.pk, set(pk_set or ())
+
+    def change(index):
+        if not reverse:  # recipe.tags.add(...), instance is the recipe
+            if action == "post_add":
+                index.link(name, instance_id, pk_set)
+            else:
+                index.unlink(name, instance_id, pk_set if action == "post_remove" else None)
+        elif action == "post_clear":  # tag.recipe_set.clear(), instance is the tag or ingredient
+            index.drop_related(name, instance_id)
+        else:
+            for recipe_id in pk_set:
+                if action == "post_add":
+                    index.link(name, recipe_id, [instance_id])
+                else:
+                    index.unlink(name, recipe_id, [instance_id])
+
+    _update_index(instance.user_id, change)
+
+
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep the filter index in step with recipe tags"""
+    _relation_changed("tags", instance, action, reverse, pk_set)
+
+
+def recipe_ingredients_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep the filter index in step with recipe ingredients"""
+    _relation_changed("ingredients", instance, action, reverse, pk_set)
+
+
+def recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        recipe_id = instance.pk
+        _update_index(instance.user_id, lambda index: index.add_recipe(recipe_id))
+
+
+def recipe_deleted(sender, instance, **kwargs):
+    recipe_id = instance.pk
+    _update_index(instance.user_id, lambda index: index.remove_recipe(recipe_id))
+
+
+def tag_deleted(sender, instance, **kwargs):
+    tag_id = instance.pk
+    _update_index(instance.user_id, lambda index: index.drop_related("tags", tag_id))
+
+
+def ingredient_deleted(sender, instance, **kwargs):
+    ingredient_id = instance.pk
+    _update_index(instance.user_id, lambda index: index.drop_related("ingredients", ingredient_id))
+
+
+@receiver(bulk_recipes_changed, sender=Recipe)
+def recipes_bulk_changed(sender, user_id, **kwargs):
+    if settings.RECIPE_FILTER_INDEX:
+        recipe_index.invalidate(user_id)
+    if settings.RECIPE_RESPONSE_CACHE:
+        response_cache.bump(user_id)
+
+
+def content_changed(sender, instance, **kwargs):
+    """Invalidate the response cache on any recipe, tag or ingredient write"""
+    _bump_generation(instance.user_id)
+
+
+def links_changed(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        _bump_generation(instance.user_id)
+
+
+# Receivers are only connected while their feature is on, so writes don't pay
+# for it otherwise. Any m2m_changed receiver makes every add() look up the
+# existing links first.
+RECEIVERS = {
+    "RECIPE_FILTER_INDEX": [
+        (m2m_changed, recipe_tags_changed, Recipe.tags.through),
+        (m2m_changed, recipe_ingredients_changed, Recipe.ingredients.through),
+        (post_save, recipe_saved, Recipe),
+        (post_delete, recipe_deleted, Recipe),
+        (post_delete, tag_deleted, Tag),
+        (post_delete, ingredient_deleted, Ingredient),
+    ],
+    "RECIPE_RESPONSE_CACHE": [
+        *((signal, content_changed, model) for signal in (post_save, post_delete) for model in (Recipe, Tag, Ingredient)),
+        (m2m_changed, links_changed, Recipe.tags.through),
+        (m2m_changed, links_changed, Recipe.ingredients.through),
+    ],
+}
+
+
+def connect_receivers():
+    """Connect the receivers of the features that are on and disconnect the others."""
+    for setting, receivers in RECEIVERS.items():
+        for signal, handler, sender in receivers:
+            if getattr(settings, setting):
+                signal.connect(handler, sender=sender)
+            else:
+                signal.disconnect(handler, sender=sender)
+
+
+@receiver(setting_changed)
+def feature_setting_changed(setting, **kwargs):
+    if setting in RECEIVERS:
+        connect_receivers()
@@ -0,0 +1,122 @@
+"""
+Change feed for offline clients
+
+Recipes, tags and ingredients are read in (updated_at, id) order from the
+(user, updated_at, id) indexes of migration 0011, starting after the position
+each kind has in the cursor. Deletes are read the same way from tombstones.
+
+A write only becomes visible when it commits, which can be after rows with
+later timestamps were already handed out. The cursor therefore never moves
+past SETTLE_TIME ago: changes newer than that are sent again on the next sync
+instead of risking a skipped row, so clients must apply changes idempotently.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from db_connection.models import Recipe, Tag, Ingredient, Tombstone
+
+PAGE_SIZE = 500
+SETTLE_TIME = timedelta(seconds=30)
+# feed name, model and the kind its tombstones are written with
+KINDS = (
+    ("recipes", Recipe, "recipe"),
+    ("tags", Tag, "tag"),
+    ("ingredients", Ingredient, "ingredient"),
+)
+DELETED = "deleted"
+START = (datetime(1970, 1, 1, tzinfo=timezone.utc), 0)
+
+
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = _("The cursor is older than the deletes we keep, sync from scratch.")
+    default_code = "cursor_expired"
+
+
+def encode_cursor(positions):
+    data = {name: [moment.isoformat(), id_] for name, (moment, id_) in positions.items()}
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(value):
+    """Return the per kind (timestamp, id) positions held in a cursor."""
+    positions = {}
+    try:
+        data = json.loads(base64.urlsafe_b64decode(value.encode()))
+        for name in [name for name, model, kind in KINDS] + [DELETED]:
+            moment, id_ = data[name]
+            moment = parse_datetime(moment)
+            if moment is None or timezone.is_naive(moment) or not isinstance(id_, int):
+                raise ValueError(value)
+            positions[name] = (moment, id_)
+    except (ValueError, TypeError, KeyError):  # binascii.Error is a ValueError
+        raise ValidationError({"since": [_("Invalid cursor.")]})
+    return positions
+
+
+def changes(user, since=None, page_size=None):
+    """Return the rows a user changed or deleted after a cursor, and the next cursor.
+
+    Without a cursor every row is returned, page by page, as a first sync.
+    """
+    page_size = page_size or PAGE_SIZE
+    now = timezone.now()
+    horizon = now - SETTLE_TIME
+    if since:
+        positions = decode_cursor(since)
+        if positions[DELETED][0] < now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS):
+            raise CursorExpired()
+    else:
+        positions = {name: START for name, model, kind in KINDS}
+        # a first sync has nothing to delete.
+        positions[DELETED] = (horizon, 0)
+
+    page = {"has_more": False}
+    for name, model, kind in KINDS:
+        queryset = model.objects.filter(user=user)
+        if model is Recipe:
+            queryset = queryset.prefetch_related("tags", "ingredients")
+        rows = list(_after(queryset, "updated_at", positions[name])[:page_size + 1])
+        page[name] = rows[:page_size]
+        positions[name], more = _advance(positions[name], rows, page_size, "updated_at", horizon)
+        page["has_more"] |= more
+
+    names = {kind: name for name, model, kind in KINDS}
+    page[DELETED] = {name: [] for name in names.values()}
+    tombstones = list(
+        _after(Tombstone.objects.filter(user=user), "deleted_at", positions[DELETED])[:page_size + 1]
+    )
+    for tombstone in tombstones[:page_size]:
+        page[DELETED][names[tombstone.kind]].append(tombstone.object_id)
+    positions[DELETED], more = _advance(positions[DELETED], tombstones, page_size, "deleted_at", horizon)
+    page["has_more"] |= more
+
+    page["cursor"] = encode_cursor(positions)
+    return page
+
+
+def _after(queryset, field, position):
+    moment, id_ = position
+    return queryset.filter(
+        Q(**{f"{field}__gt": moment}) | Q(**{field: moment, "id__gt": id_})
+    ).order_by(field, "id")
+
+
+def _advance(position, rows, page_size, field, horizon):
+    """Return the next position for a kind and whether more rows are waiting."""
+    if len(rows) <= page_size:
+        # everything up to now was read, only the settle window has to be read again.
+        return max(position, (horizon, 0)), False
+    last = rows[page_size - 1]
+    if getattr(last, field) > horizon:
+        return max(position, (horizon, 0)), False
+    return max(position, (getattr(last, field), last.id)), True
@@ -0,0 +1,92 @@
+"""
+Tests for the MessagePack and CBOR formats.
+"""
+import json
+from decimal import Decimal
+
+import cbor2
+import msgpack
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from db_connection.models import Recipe, Tag
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+FORMATS = {
+    "application/msgpack": (msgpack.packb, lambda content: msgpack.unpackb(content, raw=False)),
+    "application/cbor": (cbor2.dumps, cbor2.loads),
+}
+
+
+def detail_url(recipe_id):
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+class BinaryFormatTests(TestCase):
+    """Test responses and request bodies in the binary formats carry the same data as JSON"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("binary@example.com", "pass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price=Decimal("6.25"),
+        )
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name="Dinner"))
+
+    def test_responses_match_json(self):
+        """Test lists and details decode to the JSON response's data"""
+        for url in (RECIPES_URL, detail_url(self.recipe.id), TAGS_URL):
+            expected = json.loads(self.client.get(url).content)
+            for media_type, (_, loads) in FORMATS.items():
+                with self.subTest(url=url, media_type=media_type):
+                    res = self.client.get(url, HTTP_ACCEPT=media_type)
+
+                    self.assertEqual(res.status_code, status.HTTP_200_OK)
+                    self.assertEqual(res["Content-Type"], media_type)
+                    self.assertEqual(loads(res.content), expected)
+
+    def test_price_sent_as_decimal_string(self):
+        """Test prices keep their decimal places as strings"""
+        for media_type, (_, loads) in FORMATS.items():
+            res = self.client.get(detail_url(self.recipe.id), HTTP_ACCEPT=media_type)
+
+            self.assertEqual(loads(res.content)["price"], "6.25")
+
+    def test_create(self):
+        """Test recipes are created from binary bodies, with prices as strings or decimals"""
+        prices = {"application/msgpack": "4.50", "application/cbor": Decimal("4.50")}
+        for media_type, (dumps, loads) in FORMATS.items():
+            payload = {
+                "title": media_type, "time_minutes": 3, "price": prices[media_type], "tags": [{"name": "Quick"}],
+            }
+            res = self.client.post(
+                RECIPES_URL, dumps(payload), content_type=media_type, HTTP_ACCEPT=media_type,
+            )
+
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(loads(res.content)["price"], "4.50")
+            recipe = Recipe.objects.get(title=media_type)
+            self.assertEqual(recipe.price, Decimal("4.50"))
+            self.assertEqual(list(recipe.tags.values_list("name", flat=True)), ["Quick"])
+
+    def test_malformed_body_bad_request(self):
+        """Test bodies that can't be decoded are a 400"""
+        for media_type in FORMATS:
+            res = self.client.post(RECIPES_URL, b"\xc1\xff", content_type=media_type)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_etag_per_format(self):
+        """Test each format has its own ETag"""
+        etags = {
+            self.client.get(RECIPES_URL, HTTP_ACCEPT=media_type)["ETag"]
+            for media_type in ["application/json", *FORMATS]
+        }
+
+        self.assertEqual(len(etags), 3)
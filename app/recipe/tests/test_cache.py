@@ -0,0 +1,146 @@
+"""
+Tests for the per-user response cache.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from db_connection.models import Recipe, Tag
+
+from recipe.cache import response_cache
+from recipe.checks import check_shared_cache
+
+RECIPES_URL = reverse("recipe:recipe-list")
+STATS_URL = reverse("recipe:cache-stats")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        "title": "Sample recipe",
+        "time_minutes": 10,
+        "price": Decimal("5.00"),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+@override_settings(RECIPE_RESPONSE_CACHE=True)
+class ResponseCacheTests(TestCase):
+    """Test cached recipe, tag and ingredient responses"""
+
+    def setUp(self):
+        cache.clear()
+        response_cache.reset_stats()
+        self.user = get_user_model().objects.create_user("user@example.com", "pass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user, title="Soup")
+
+    def test_list_served_from_cache(self):
+        """Test a repeated list is answered without running the list queries"""
+        first = self.client.get(RECIPES_URL)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(RECIPES_URL)
+
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(len(queries), 1)  # the ETag version lookup only
+        self.assertEqual(response_cache.stats(), {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+    def test_query_parameters_keyed_in_any_order(self):
+        """Test query parameters are part of the key, whatever their order"""
+        self.client.get(RECIPES_URL, {"page_size": 1, "include_total": 1})
+
+        same = self.client.get(f"{RECIPES_URL}?include_total=1&page_size=1")
+        other = self.client.get(RECIPES_URL, {"page_size": 2})
+
+        self.assertEqual(same["X-Cache"], "HIT")
+        self.assertEqual(other["X-Cache"], "MISS")
+
+    def test_writer_reads_own_writes(self):
+        """Test writes through the API invalidate the writer's cached responses"""
+        self.client.get(RECIPES_URL)
+        self.client.get(reverse("recipe:recipe-detail", args=[self.recipe.id]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse("recipe:recipe-detail", args=[self.recipe.id]),
+                {"title": "Stew"},
+                format="json",
+            )
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["results"][0]["title"], "Stew")
+        res = self.client.get(reverse("recipe:recipe-detail", args=[self.recipe.id]))
+        self.assertEqual(res.data["title"], "Stew")
+
+    def test_link_changes_invalidate(self):
+        """Test m2m changes outside the API bump the generation after commit"""
+        self.client.get(TAGS_URL, {"assigned_only": 1})
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.tags.add(tag)
+
+        res = self.client.get(TAGS_URL, {"assigned_only": 1})
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual([t["name"] for t in res.data["results"]], ["Vegan"])
+
+    def test_users_cached_separately(self):
+        """Test one user's cached list is never served to another"""
+        self.client.get(RECIPES_URL)
+        other = get_user_model().objects.create_user("other@example.com", "pass123")
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["results"], [])
+
+    def test_errors_not_cached(self):
+        """Test only successful responses are stored"""
+        self.client.get(RECIPES_URL, {"tags": "x"})
+
+        res = self.client.get(RECIPES_URL, {"tags": "x"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn("X-Cache", res)
+
+    def test_stats_for_superusers(self):
+        """Test superusers read the hit and miss counts, other users are refused"""
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+        admin = get_user_model().objects.create_superuser("admin@example.com", "pass123")
+
+        refused = self.client.get(STATS_URL)
+        self.client.force_authenticate(admin)
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(refused.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(res.data, {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+    def test_refused_with_process_local_cache(self):
+        """Test the check fails for the response cache with the locmem cache"""
+        errors = check_shared_cache(None)
+
+        self.assertEqual([(error.id, error.obj) for error in errors], [("recipe.E001", "RECIPE_RESPONSE_CACHE")])
+
+    @override_settings(RECIPE_RESPONSE_CACHE=False)
+    def test_disabled_by_default(self):
+        """Test nothing is cached when the setting is off"""
+        self.client.get(RECIPES_URL)
+
+        self.assertNotIn("X-Cache", self.client.get(RECIPES_URL))
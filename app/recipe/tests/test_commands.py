@@ -0,0 +1,65 @@
+"""
+Test the recipe app management commands.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from db_connection.models import Recipe, Tag, Ingredient, Tombstone
+
+
+class MergeDuplicateNamesTests(TestCase):
+    """Test merging duplicate tag and ingredient names"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@example.com", "pass123")
+        # duplicates can only exist in data from before the unique indexes.
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX tag_user_normalized_name")
+            cursor.execute("DROP INDEX ingredient_user_normalized_name")
+
+    def test_merge_duplicate_names(self):
+        """Test duplicates are folded into the oldest row and recipes re-pointed"""
+        keep = Tag.objects.create(user=self.user, name="Vegan")
+        duplicate = Tag.objects.create(user=self.user, name="vegan ")
+        other = Tag.objects.create(user=self.user, name="Quick")
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        Ingredient.objects.create(user=self.user, name="SALT")
+        recipe1 = Recipe.objects.create(
+            user=self.user, title="Salad", time_minutes=5, price=Decimal("2.00"),
+        )
+        recipe1.tags.add(keep, duplicate)
+        recipe2 = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price=Decimal("2.00"),
+        )
+        recipe2.tags.add(duplicate, other)
+
+        call_command("merge_duplicate_names", stdout=StringIO())
+
+        self.assertFalse(Tag.objects.filter(id=duplicate.id).exists())
+        self.assertEqual(list(recipe1.tags.all()), [keep])
+        self.assertEqual(set(recipe2.tags.all()), {keep, other})
+        self.assertEqual(list(Ingredient.objects.filter(user=self.user)), [salt])
+
+
+class PruneTombstonesTests(TestCase):
+    """Test pruning old tombstones"""
+
+    def test_prune_tombstones(self):
+        """Test only tombstones past the retention period are deleted"""
+        user = get_user_model().objects.create_user("user@example.com", "pass123")
+        Tag.objects.create(user=user, name="Vegan").delete()
+        kept = Tombstone.objects.get()
+        Tombstone.objects.create(
+            user=user, kind="tag", object_id=1, deleted_at=timezone.now() - timedelta(days=365),
+        )
+
+        call_command("prune_tombstones", stdout=StringIO())
+
+        self.assertEqual(list(Tombstone.objects.all()), [kept])
@@ -0,0 +1,80 @@
+"""
+Tests for the compiled list serializers.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from db_connection.models import Recipe, Tag, Ingredient
+from recipe.compiled import CompiledRows, compile_serializer
+from recipe.serializers import RecipeDetailSerializer, RecipeSerializer, TagSerializer
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+def page(data):
+    return JSONRenderer().render({"next": None, "previous": None, "results": data})
+
+
+class CompiledListTests(TestCase):
+    """Test lists rendered from compiled serializers match the ModelSerializer output byte for byte"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("compiled@example.com", "pass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        dinner = Tag.objects.create(user=self.user, name='Dinner "late"')
+        quick = Tag.objects.create(user=self.user, name="Quick \\ ünï 🍲")
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        soup = Recipe.objects.create(
+            user=self.user, title="Soup\u2029 with \u2028 \"quotes\"\n", time_minutes=5,
+            price=Decimal("0.50"), link="", image_width=640, image_height=480,
+        )
+        soup.tags.add(dinner, quick)
+        soup.ingredients.add(salt)
+        stew = Recipe.objects.create(user=self.user, title="Stew ½", time_minutes=90, price=Decimal("120"))
+        stew.tags.add(quick)
+        Recipe.objects.create(user=self.user, title="Toast", time_minutes=2, price=Decimal("1.25"))
+
+    def _recipes(self):
+        return Recipe.objects.filter(user=self.user).prefetch_related("tags", "ingredients").order_by("-id")
+
+    def test_recipe_list_parity(self):
+        """Test the recipe list is the ModelSerializer's rendering"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertIsInstance(res.data["results"], CompiledRows)
+        self.assertEqual(res.content, page(RecipeSerializer(self._recipes(), many=True).data))
+
+    def test_sparse_list_parity(self):
+        """Test selected fields render the same as the pruned ModelSerializer"""
+        res = self.client.get(RECIPES_URL, {"fields": "title,price", "expand": "tags"})
+
+        expected = RecipeSerializer(
+            self._recipes(), many=True, context={"fields": {"title", "price", "tags"}},
+        ).data
+        self.assertEqual(res.content, page(expected))
+
+    def test_tag_list_parity(self):
+        """Test the tag list is the ModelSerializer's rendering"""
+        res = self.client.get(TAGS_URL)
+
+        tags = Tag.objects.filter(user=self.user).order_by("-name", "id")
+        self.assertEqual(res.content, page(TagSerializer(tags, many=True).data))
+
+    def test_search_list(self):
+        """Test search results, paged by rank, are listed through the compiled path"""
+        res = self.client.get(RECIPES_URL, {"search": "stew"})
+
+        self.assertEqual([r["title"] for r in res.data["results"]], ["Stew ½"])
+        self.assertNotIn("rank", res.data["results"][0])
+
+    def test_method_fields_not_compiled(self):
+        """Test serializers with fields that aren't columns are left to DRF"""
+        self.assertIsNone(compile_serializer(RecipeDetailSerializer))
+        self.assertIsNotNone(compile_serializer(RecipeSerializer))
@@ -0,0 +1,183 @@
+"""
+Tests for conditional requests on the recipe API.
+"""
+import threading
+import time
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from db_connection.models import Recipe, Tag
+from recipe.serializers import RecipeSerializer
+
+RECIPES_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+def detail_url(recipe_id):
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        "title": "Sample recipe",
+        "time_minutes": 10,
+        "price": Decimal("5.00"),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ConditionalRequestTests(TestCase):
+    """Test ETag handling"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@example.com", "pass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+
+    def test_detail_not_modified_without_serializing(self):
+        """Test a matching If-None-Match is answered from the version lookup alone"""
+        etag = self.client.get(detail_url(self.recipe.id))["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+        self.assertEqual(len(queries), 1)
+
+    def test_detail_etag_follows_changes(self):
+        """Test edits to the recipe and its links change the ETag"""
+        etag = self.client.get(detail_url(self.recipe.id))["ETag"]
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_list_not_modified_until_content_changes(self):
+        """Test list ETags come from the user's content stamp"""
+        etag = self.client.get(RECIPES_URL)["ETag"]
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.recipe.delete()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_dates_not_used_as_validators(self):
+        """Test no second-precision date can stand for a version changed within the second"""
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertNotIn("Last-Modified", res)
+        later = http_date(time.time() + 60)
+
+        self.client.patch(detail_url(self.recipe.id), {"title": "Changed"})
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_MODIFIED_SINCE=later)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["title"], "Changed")
+
+    def test_tag_list_follows_links(self):
+        """Test assigning a tag changes the tag list ETag, which assigned_only depends on"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        etag = self.client.get(TAGS_URL, {"assigned_only": 1})["ETag"]
+
+        self.recipe.tags.add(tag)
+        res = self.client.get(TAGS_URL, {"assigned_only": 1}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([t["name"] for t in res.data["results"]], ["Vegan"])
+
+    def test_name_upsert_keeps_list_etag(self):
+        """Test reusing an existing name is not a change"""
+        Tag.objects.create(user=self.user, name="Vegan")
+        etag = self.client.get(TAGS_URL)["ETag"]
+
+        Tag.objects._upsert(self.user, ["vegan"])
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_if_match_guards_updates(self):
+        """Test an update based on an old version is refused"""
+        etag = self.client.get(detail_url(self.recipe.id))["ETag"]
+
+        res = self.client.patch(detail_url(self.recipe.id), {"title": "First"}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+        res = self.client.patch(detail_url(self.recipe.id), {"title": "Second"}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, "First")
+
+    def test_other_users_recipe_not_found(self):
+        """Test another user's recipe gets no validators and stays a 404"""
+        other = get_user_model().objects.create_user("other@example.com", "pass123")
+        recipe = create_recipe(other)
+
+        res = self.client.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH="*")
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn("ETag", res)
+
+
+class ConcurrentWriteTests(TransactionTestCase):
+    """Test two writes made against the same version can't both land"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@example.com", "pass123")
+        self.recipe = create_recipe(self.user)
+
+    def _patch(self, title, etag, results):
+        try:
+            client = APIClient()
+            client.force_authenticate(self.user)
+            res = client.patch(detail_url(self.recipe.id), {"title": title}, HTTP_IF_MATCH=etag)
+            results[title] = res.status_code
+        finally:
+            connections.close_all()  # only this thread's connection
+
+    def test_interleaved_if_match_writes(self):
+        """Test the second write waits for the first and then fails its precondition"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        etag = client.get(detail_url(self.recipe.id))["ETag"]
+        checked, release = threading.Event(), threading.Event()
+        update = RecipeSerializer.update
+
+        def paused_update(serializer, instance, validated_data):
+            if validated_data["title"] == "First":  # the first write stops after its precondition passed
+                checked.set()
+                release.wait(5)
+            return update(serializer, instance, validated_data)
+
+        results = {}
+        with patch.object(RecipeSerializer, "update", paused_update):
+            first = threading.Thread(target=self._patch, args=("First", etag, results))
+            first.start()
+            self.assertTrue(checked.wait(5))
+            second = threading.Thread(target=self._patch, args=("Second", etag, results))
+            second.start()
+            second.join(0.5)  # blocked on the row lock until the first write commits
+            release.set()
+            first.join(5)
+            second.join(5)
+
+        self.assertEqual(results, {"First": status.HTTP_200_OK, "Second": status.HTTP_412_PRECONDITION_FAILED})
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, "First")
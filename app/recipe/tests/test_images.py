@@ -0,0 +1,355 @@
+"""
+Tests for processing uploaded recipe images.
+"""
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from db_connection.models import ImageBlob, Recipe
+from recipe.resize import disk_cache
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+def image_upload_url(recipe_id):
+    return reverse("recipe:recipe-upload-image", args=[recipe_id])
+
+
+def detail_url(recipe_id):
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def jpeg_file(size=(2000, 1000), orientation=None):
+    """Return an uploadable JPEG, with an EXIF orientation if given"""
+    buffer = BytesIO()
+    exif = Image.Exif()
+    exif[0x010F] = "Phone maker"
+    if orientation:
+        exif[0x0112] = orientation
+    Image.new("RGB", size, (200, 30, 30)).save(buffer, "JPEG", exif=exif.tobytes())
+    return SimpleUploadedFile("photo.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_WORKERS=0)
+class ImageProcessingTests(TestCase):
+    """Test image variants are made after the upload commits"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@example.com", "pass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price=Decimal("2.00"),
+        )
+
+    def _upload(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(image_upload_url(self.recipe.id), {"image": image}, format="multipart")
+
+    def test_upload_makes_variants(self):
+        """Test the upload is accepted pending and variants follow in both formats"""
+        res = self._upload(jpeg_file())
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data["image_status"], "pending")
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.READY)
+        sizes = {}
+        for size, formats in self.recipe.image_variants.items():
+            self.assertEqual(set(formats), {"webp", "jpeg"})
+            with Image.open(os.path.join(MEDIA_ROOT, formats["webp"])) as image:
+                self.assertEqual(image.format, "WEBP")
+                sizes[size] = image.size
+        self.assertEqual(sizes, {"large": (1280, 640), "medium": (640, 320), "thumb": (160, 80)})
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.data["image_status"], "ready")
+        self.assertTrue(res.data["image_variants"]["thumb"]["jpeg"].startswith("http://testserver/"))
+
+    def test_variants_rotated_and_stripped(self):
+        """Test the EXIF orientation is applied and no metadata is kept"""
+        self._upload(jpeg_file(size=(400, 200), orientation=6))
+
+        self.recipe.refresh_from_db()
+        name = self.recipe.image_variants["large"]["jpeg"]
+        with Image.open(os.path.join(MEDIA_ROOT, name)) as image:
+            self.assertEqual(image.size, (200, 400))
+            self.assertNotIn("exif", image.info)
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_original_stripped(self):
+        """Test the stored original is rewritten upright without its EXIF"""
+        uploaded = self._upload(jpeg_file(size=(400, 200), orientation=6)).data["image"]
+
+        self.recipe.refresh_from_db()
+        stored = os.path.basename(self.recipe.image.name)
+        self.assertNotEqual(os.path.basename(uploaded), stored)
+        with self.recipe.image.open("rb") as f, Image.open(f) as original:
+            self.assertEqual(original.format, "JPEG")
+            self.assertEqual(original.size, (200, 400))
+            self.assertEqual(len(original.getexif()), 0)
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(os.path.basename(res.data["image"]), stored)
+
+    def test_dimensions_and_placeholder_in_list(self):
+        """Test the upright size and a tiny placeholder are listed with the recipe"""
+        res = self._upload(jpeg_file(size=(400, 200), orientation=6))
+        self.assertEqual((res.data["image_width"], res.data["image_height"]), (200, 400))
+
+        res = self.client.get(reverse("recipe:recipe-list"))
+
+        listed = res.data["results"][0]
+        self.assertEqual((listed["image_width"], listed["image_height"]), (200, 400))
+        prefix = "data:image/webp;base64,"
+        self.assertTrue(listed["image_placeholder"].startswith(prefix))
+        content = base64.b64decode(listed["image_placeholder"][len(prefix):])
+        self.assertLess(len(content), 400)
+        with Image.open(BytesIO(content)) as image:
+            self.assertEqual(image.size, (8, 16))
+
+    def test_backfill_placeholders_command(self):
+        """Test images stored before placeholders get dimensions and a placeholder"""
+        self.recipe.image = jpeg_file(size=(300, 100))
+        self.recipe.save()
+
+        out = StringIO()
+        call_command("backfill_placeholders", workers=0, stdout=out)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.image_width, self.recipe.image_height), (300, 100))
+        self.assertTrue(self.recipe.image_placeholder)
+        self.assertIn("Backfilled 1 of 1", out.getvalue())
+
+    @override_settings(RECIPE_RESPONSE_CACHE=True)
+    def test_backfill_placeholders_invalidates_cache(self):
+        """Test cached lists show the backfilled placeholder"""
+        cache.clear()
+        self.recipe.image = jpeg_file(size=(300, 100))
+        self.recipe.save()
+        self.client.get(reverse("recipe:recipe-list"))
+
+        call_command("backfill_placeholders", workers=0, stdout=StringIO())
+
+        res = self.client.get(reverse("recipe:recipe-list"))
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertTrue(res.data["results"][0]["image_placeholder"])
+
+    @override_settings(IMAGE_PRUNE_GRACE_SECONDS=0)
+    def test_reupload_prunes_old_variants(self):
+        """Test variants of a replaced image are pruned once unreferenced"""
+        self._upload(jpeg_file())
+        self.recipe.refresh_from_db()
+        old = self.recipe.image_variants["thumb"]["webp"]
+
+        self._upload(jpeg_file(size=(300, 300)))
+        call_command("prune_images", stdout=StringIO())
+
+        self.assertFalse(os.path.exists(os.path.join(MEDIA_ROOT, old)))
+        self.recipe.refresh_from_db()
+        self.assertNotEqual(self.recipe.image_variants["thumb"]["webp"], old)
+
+    @override_settings(IMAGE_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels_refused(self):
+        """Test an image whose header is over the pixel limit is refused"""
+        res = self._upload(jpeg_file(size=(200, 100)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=100)
+    def test_too_many_bytes_refused(self):
+        """Test an upload over the size limit is refused"""
+        res = self._upload(jpeg_file())
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_process_images_command(self):
+        """Test images stored before processing existed get their variants"""
+        self.recipe.image = jpeg_file()
+        self.recipe.save()
+
+        out = StringIO()
+        call_command("process_images", stdout=out)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.READY)
+        self.assertIn("Processed 1 of 1", out.getvalue())
+
+    @override_settings(RECIPE_RESPONSE_CACHE=True)
+    def test_process_images_invalidates_cache(self):
+        """Test cached details show the status the command resets"""
+        cache.clear()
+        self.recipe.image = jpeg_file()
+        self.recipe.image_status = Recipe.ImageStatus.FAILED
+        self.recipe.save()
+        self.client.get(detail_url(self.recipe.id))
+
+        # a worker that stops leaves the image pending, without a bump of its own.
+        with patch("recipe.management.commands.process_images.process_image"):
+            call_command("process_images", retry_failed=True, stdout=StringIO())
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["image_status"], "pending")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    """Test images are stored once by content and pruned when unused"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@example.com", "pass123")
+        self.other = get_user_model().objects.create_user("other@example.com", "pass123")
+
+    def _recipe(self, user, image):
+        return Recipe.objects.create(
+            user=user, title="Soup", time_minutes=5, price=Decimal("2.00"), image=image,
+        )
+
+    def test_same_content_stored_once(self):
+        """Test the same bytes uploaded twice share one file named by their hash"""
+        image = jpeg_file()
+        content = image.read()
+        first = self._recipe(self.user, image)
+        second = self._recipe(self.other, SimpleUploadedFile("copy.JPG", content))
+
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(first.image.name, f"uploads/recipe/{digest[:2]}/{digest}.jpg")
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(ImageBlob.objects.get(name=first.image.name).refs, 2)
+
+    @override_settings(IMAGE_PRUNE_GRACE_SECONDS=0)
+    def test_prune_keeps_referenced_files(self):
+        """Test a shared file survives until the last recipe using it is gone"""
+        first = self._recipe(self.user, jpeg_file())
+        second = self._recipe(self.other, jpeg_file())
+        path = first.image.path
+
+        first.delete()
+        call_command("prune_images", stdout=StringIO())
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(ImageBlob.objects.get(name=second.image.name).refs, 1)
+
+        second.delete()
+        out = StringIO()
+        call_command("prune_images", stdout=out)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ImageBlob.objects.filter(name=second.image.name).exists())
+        self.assertIn("Pruned 1 images", out.getvalue())
+
+    def test_prune_waits_for_grace_period(self):
+        """Test recently unreferenced files are kept for uploads still in flight"""
+        recipe = self._recipe(self.user, jpeg_file())
+        path = recipe.image.path
+        recipe.delete()
+
+        call_command("prune_images", stdout=StringIO())
+
+        self.assertTrue(os.path.exists(path))
+
+
+def resized_url(recipe_id, **params):
+    return reverse("recipe:recipe-resized-image", args=[recipe_id]) + "?" + urlencode(params)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_RESIZE_CACHE_ROOT=os.path.join(MEDIA_ROOT, "resized"))
+class ResizedImageTests(TestCase):
+    """Test the on-demand resize endpoint and its disk cache"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@example.com", "pass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price=Decimal("2.00"),
+            image=jpeg_file(size=(1000, 500), orientation=6),
+        )
+        shutil.rmtree(os.path.join(MEDIA_ROOT, "resized"), ignore_errors=True)
+        disk_cache._sizes.clear()
+
+    def test_resize_then_hit(self):
+        """Test the first request makes the file and the next one reuses it"""
+        res = self.client.get(resized_url(self.recipe.id, w=320, fmt="webp"))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "image/webp")
+        self.assertEqual(res["X-Cache"], "MISS")
+        with Image.open(BytesIO(b"".join(res.streaming_content))) as image:
+            self.assertEqual(image.size, (320, 640))  # rotated upright before resizing
+
+        res = self.client.get(resized_url(self.recipe.id, w=320, fmt="webp"))
+        self.assertEqual(res["X-Cache"], "HIT")
+        self.assertTrue(b"".join(res.streaming_content))
+
+    def test_evicted_before_opening(self):
+        """Test a file evicted between the lookup and the open is made again instead of failing"""
+        missing = os.path.join(disk_cache.root, "gone.webp")
+        with patch("recipe.resize.resized", return_value=(missing, True)):
+            res = self.client.get(resized_url(self.recipe.id, w=320, fmt="webp"))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["X-Cache"], "MISS")
+        with Image.open(BytesIO(b"".join(res.streaming_content))) as image:
+            self.assertEqual(image.size, (320, 640))
+
+    def test_width_not_allowed(self):
+        """Test widths outside the allow-list are refused"""
+        for params in ({"w": 321}, {"w": "big"}, {}, {"w": 320, "fmt": "gif"}):
+            res = self.client.get(resized_url(self.recipe.id, **params))
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_image_not_found(self):
+        """Test another user's recipe image can't be fetched"""
+        other = get_user_model().objects.create_user("other@example.com", "pass123")
+        self.client.force_authenticate(other)
+
+        res = self.client.get(resized_url(self.recipe.id, w=320))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(IMAGE_RESIZE_ACCEL_PREFIX="/internal/resized/")
+    def test_accel_redirect(self):
+        """Test nginx is told which cached file to send"""
+        res = self.client.get(resized_url(self.recipe.id, w=160, fmt="jpeg"))
+
+        self.assertEqual(res.content, b"")
+        relative = res["X-Accel-Redirect"][len("/internal/resized/"):]
+        self.assertTrue(res["X-Accel-Redirect"].startswith("/internal/resized/"))
+        self.assertTrue(os.path.exists(os.path.join(disk_cache.root, relative)))
+
+    def test_least_recently_used_evicted(self):
+        """Test the oldest used file goes first when the cache is over its limit"""
+        first = disk_cache.put("aa-first", b"x" * 100)
+        second = disk_cache.put("bb-second", b"x" * 100)
+        os.utime(first, (1, 1))
+        os.utime(second, (2, 2))
+        disk_cache.get("aa-first")  # a hit, first is now the most recent
+
+        with override_settings(IMAGE_RESIZE_CACHE_MAX_BYTES=250):
+            third = disk_cache.put("cc-third", b"x" * 100)
+
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+        self.assertTrue(os.path.exists(third))
@@ -0,0 +1,186 @@
+"""
+Tests for the in-process recipe filter index.
+"""
+from decimal import Decimal
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from db_connection.models import Recipe, Tag, Ingredient
+
+from recipe.checks import check_shared_cache
+from recipe.index import recipe_index, VERSION_KEY
+
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        "title": "Sample recipe",
+        "time_minutes": 10,
+        "price": Decimal("5.00"),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+@override_settings(RECIPE_FILTER_INDEX=True)
+class RecipeIndexApiTests(TestCase):
+    """Test recipe filtering answered from the index."""
+
+    def setUp(self):
+        recipe_index.clear()
+        cache.clear()
+        self.user = get_user_model().objects.create_user("user@example.com", "pass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.vegan = Tag.objects.create(user=self.user, name="Vegan")
+        self.quick = Tag.objects.create(user=self.user, name="Quick")
+        self.rice = Ingredient.objects.create(user=self.user, name="Rice")
+        self.salad = create_recipe(self.user, title="Salad")
+        self.salad.tags.add(self.vegan, self.quick)
+        self.curry = create_recipe(self.user, title="Curry")
+        self.curry.tags.add(self.vegan)
+        self.curry.ingredients.add(self.rice)
+        self.steak = create_recipe(self.user, title="Steak")
+        self.steak.tags.add(self.quick)
+
+    def _ids(self, params):
+        res = self.client.get(RECIPES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [r["id"] for r in res.data["results"]]
+
+    def test_index_matches_sql_filters(self):
+        """Test every filter form returns the same recipes as the SQL path"""
+        cases = [
+            {"tags": f"{self.vegan.id},{self.quick.id}"},
+            {"tags": f"{self.vegan.id}+{self.quick.id}"},
+            {"tags": f"-{self.quick.id}"},
+            {"tags": f"{self.vegan.id}", "ingredients": f"-{self.rice.id}"},
+        ]
+        for params in cases:
+            indexed = self._ids(params)
+            with override_settings(RECIPE_FILTER_INDEX=False):
+                self.assertEqual(indexed, self._ids(params))
+
+        self.assertIn(self.user.id, recipe_index)
+
+    def test_index_only_fetches_requested_page(self):
+        """Test pages are walked through the index with the next cursor"""
+        res = self.client.get(RECIPES_URL, {"tags": f"{self.vegan.id},{self.quick.id}", "page_size": 2, "include_total": 1})
+
+        self.assertEqual([r["id"] for r in res.data["results"]], [self.steak.id, self.curry.id])
+        self.assertEqual(res.data["count"], 3)
+        res = self.client.get(res.data["next"])
+        self.assertEqual([r["id"] for r in res.data["results"]], [self.salad.id])
+        res = self.client.get(res.data["previous"])
+        self.assertEqual([r["id"] for r in res.data["results"]], [self.steak.id, self.curry.id])
+
+    def test_index_follows_committed_writes(self):
+        """Test the index is updated by signals instead of being rebuilt"""
+        params = {"tags": f"{self.vegan.id}"}
+        self._ids(params)
+        index = recipe_index.get(self.user.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.steak.tags.add(self.vegan)
+            self.curry.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.salad.tags.remove(self.vegan)
+
+        self.assertEqual(self._ids(params), [self.steak.id])
+        self.assertIs(recipe_index.get(self.user.id), index)
+
+    def test_index_dropped_after_bulk_writes(self):
+        """Test bulk writes, which skip the model signals, still refresh the index"""
+        params = {"tags": f"{self.vegan.id}"}
+        self._ids(params)
+        line = {"op": "update", "id": self.steak.id, "data": {"tags": [{"name": "Vegan"}]}}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                reverse("recipe:recipe-bulk"), json.dumps(line), content_type="application/x-ndjson",
+            )
+            b"".join(res.streaming_content)
+
+        self.assertNotIn(self.user.id, recipe_index)
+        self.assertEqual(self._ids(params), [self.steak.id, self.curry.id, self.salad.id])
+
+    def test_index_rebuilt_when_version_moves(self):
+        """Test a write from another process makes the index rebuild"""
+        self._ids({"tags": f"{self.vegan.id}"})
+        index = recipe_index.get(self.user.id)
+
+        self.steak.tags.add(self.vegan)  # not committed through on_commit, as in another process
+        cache.incr(VERSION_KEY.format(self.user.id))
+
+        self.assertEqual(
+            self._ids({"tags": f"{self.vegan.id}"}),
+            [self.steak.id, self.curry.id, self.salad.id],
+        )
+        self.assertIsNot(recipe_index.get(self.user.id), index)
+
+    def test_cold_users_evicted(self):
+        """Test the least recently used index is dropped past the memory cap"""
+        other = get_user_model().objects.create_user("other@example.com", "pass123")
+        create_recipe(other)
+        first = recipe_index.get(self.user.id)
+
+        with override_settings(RECIPE_FILTER_INDEX_MAX_BYTES=first.nbytes + 1):
+            recipe_index.get(other.id)
+
+        self.assertNotIn(self.user.id, recipe_index)
+        self.assertIn(other.id, recipe_index)
+
+    def test_index_malformed_filter_bad_request(self):
+        """Test malformed filters are rejected by the index path too"""
+        res = self.client.get(RECIPES_URL, {"tags": "1,x"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class IndexReceiverTests(TestCase):
+    """Test the index is only maintained while it is turned on"""
+
+    def test_receivers_follow_setting(self):
+        """Test the link receivers are connected with the setting and gone without it"""
+        self.assertFalse(m2m_changed.has_listeners(Recipe.tags.through))
+
+        with override_settings(RECIPE_FILTER_INDEX=True):
+            self.assertTrue(m2m_changed.has_listeners(Recipe.tags.through))
+
+        self.assertFalse(m2m_changed.has_listeners(Recipe.tags.through))
+
+
+class SharedCacheCheckTests(TestCase):
+    """Test the index needs a cache shared between processes"""
+
+    @override_settings(RECIPE_FILTER_INDEX=True)
+    def test_refused_with_process_local_cache(self):
+        """Test the check fails for the index with the locmem cache"""
+        errors = check_shared_cache(None)
+
+        self.assertEqual([(error.id, error.obj) for error in errors], [("recipe.E001", "RECIPE_FILTER_INDEX")])
+
+    @override_settings(
+        RECIPE_FILTER_INDEX=True,
+        CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache", "LOCATION": "cache:11211",
+        }},
+    )
+    def test_allowed_with_shared_cache(self):
+        """Test the check passes with memcached"""
+        self.assertEqual(check_shared_cache(None), [])
+
+    def test_nothing_to_check_when_off(self):
+        """Test the locmem cache is fine with the index off"""
+        self.assertEqual(check_shared_cache(None), [])
@@ -13,6 +13,7 @@ from db_connection.models import (Ingredient, Recipe)
 from recipe.serializers import IngredientSerializer
 
 INGREDIENTS_URL = reverse("recipe:ingredient-list")
+AUTOCOMPLETE_URL = reverse("recipe:ingredient-autocomplete")
 
 def create_user(email="user@email.com", password="pass1234"):
     """Create user helper function"""
@@ -53,7 +54,7 @@ class PrivateIngredientApiTests(TestCase):
         serializer = IngredientSerializer(ingredients, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_ingredient_limited_to_user(self):
         """Test list of ingredients is limited to authenticated user"""
@@ -64,9 +65,9 @@ class PrivateIngredientApiTests(TestCase):
         res = self.client.get(INGREDIENTS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]["name"], ingredient.name)
-        self.assertEqual(res.data[0]["id"], ingredient.id)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"][0]["name"], ingredient.name)
+        self.assertEqual(res.data["results"][0]["id"], ingredient.id)
     
     def test_update_ingredient(self):
         """test updating and ingredient"""
@@ -107,8 +108,8 @@ class PrivateIngredientApiTests(TestCase):
 
         s1 = IngredientSerializer(in1)
         s2 = IngredientSerializer(in2)
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data["results"])
+        self.assertNotIn(s2.data, res.data["results"])
 
     def test_filtered_ingredients_unique(self):
         """Test filtered ingredients returns a unique list."""
@@ -132,4 +133,15 @@ class PrivateIngredientApiTests(TestCase):
 
         res = self.client.get(INGREDIENTS_URL, {"assigned_only": 1})
 
-        self.assertEqual(len(res.data), 1)
\ No newline at end of file
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_autocomplete_ingredients(self):
+        """Test ingredient autocomplete matches a misspelt name for the user only"""
+        Ingredient.objects.create(user=self.user, name="Chicken breast")
+        Ingredient.objects.create(user=self.user, name="Chickpeas")
+        Ingredient.objects.create(user=create_user(email="other@email.com"), name="Chicken")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "chickn"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([i["name"] for i in res.data], ["Chicken breast", "Chickpeas"])
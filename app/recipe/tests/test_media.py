@@ -0,0 +1,101 @@
+"""
+Tests for serving recipe media.
+"""
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from db_connection.models import Recipe
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+def media_url(name):
+    return reverse("media", args=[name])
+
+
+def jpeg_file():
+    buffer = BytesIO()
+    Image.new("RGB", (20, 20), (30, 200, 30)).save(buffer, "JPEG")
+    return SimpleUploadedFile("photo.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class MediaViewTests(TestCase):
+    """Test media is only handed to the user owning it"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user("user@example.com", "pass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price=Decimal("2.00"), image=jpeg_file(),
+        )
+
+    def test_owner_gets_file(self):
+        """Test the owner is sent the file with private immutable caching"""
+        res = self.client.get(media_url(self.recipe.image.name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "image/jpeg")
+        self.assertEqual(res["Cache-Control"], "private, max-age=31536000, immutable")
+        self.assertEqual(b"".join(res.streaming_content), self.recipe.image.read())
+
+    def test_variant_allowed(self):
+        """Test the variants of the user's recipe images are served too"""
+        name = self.recipe.image.storage.save("uploads/recipe/variants/thumb.webp", BytesIO(b"webp"))
+        self.recipe.image_variants = {"thumb": {"webp": name}}
+        self.recipe.save()
+
+        res = self.client.get(media_url(name))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(res.streaming_content), b"webp")
+
+    def test_other_user_refused(self):
+        """Test other users and anonymous requests can't fetch the file"""
+        other = get_user_model().objects.create_user("other@example.com", "pass123")
+        self.client.force_authenticate(other)
+        res = self.client.get(media_url(self.recipe.image.name))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        res = APIClient().get(media_url(self.recipe.image.name))
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unsafe_name_refused(self):
+        """Test paths leaving the media root are refused without a lookup"""
+        res = self.client.get(media_url("uploads/../../etc/passwd"))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(MEDIA_ACCEL_PREFIX="/internal/media/")
+    def test_accel_redirect_from_cached_grant(self):
+        """Test nginx is told to send the file, and a repeat check runs no queries"""
+        name = self.recipe.image.name
+        self.client.get(media_url(name))
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(media_url(name))
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(res["X-Accel-Redirect"], f"/internal/media/{name}")
+        self.assertEqual(res.content, b"")
+        self.assertEqual(res["Cache-Control"], "private, max-age=31536000, immutable")
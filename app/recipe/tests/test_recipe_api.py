@@ -1,14 +1,19 @@
 """Tests  for the recipe API"""
 
+import csv
 from decimal import Decimal
+import io
+import json
 import tempfile # for image 
 import os  # for image 
+from unittest.mock import patch
 
 from PIL import Image # for image
 
 from django.contrib.auth import get_user_model
-from django.db.models.fields import json
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status 
@@ -19,9 +24,17 @@ from db_connection.models import (Recipe,
                                   Ingredient)
 
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.pagination import RecipePagination
 
 RECIPES_URL = reverse("recipe:recipe-list")
 
+# maximum number of queries each recipe action may run, whatever the number of rows.
+# reads include the ETag version lookup, updates also read the new version back.
+LIST_QUERY_BUDGET = 4
+RETRIEVE_QUERY_BUDGET = 4
+CREATE_QUERY_BUDGET = 11
+UPDATE_QUERY_BUDGET = 14
+
 def detail_url(recipe_id):
     """Create and return a recipe detail URL."""
     return reverse("recipe:recipe-detail", args=[recipe_id])
@@ -77,7 +90,7 @@ class PrivateRecipeAPITests(TestCase):
         recipes = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
         
     def test_recipe_list_limited_to_user(self):
         """Test list of recipes is limited to authenticated user"""
@@ -94,7 +107,7 @@ class PrivateRecipeAPITests(TestCase):
 
         serializer = RecipeSerializer(recipes,many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data,serializer.data)
+        self.assertEqual(res.data["results"],serializer.data)
     
     def test_get_recipe_detail(self):
         """Test get recipe detail"""
@@ -240,6 +253,22 @@ class PrivateRecipeAPITests(TestCase):
             ).exists()
             self.assertTrue(exists)
 
+    def test_create_recipe_reuses_tag_ignoring_case(self):
+        """Test a tag name differing only in case or spacing reuses the existing tag"""
+        tag = Tag.objects.create(user=self.user, name="Indian")
+        payload = {
+            "title": "Dal",
+            "time_minutes": 30,
+            "price": Decimal("3.00"),
+            "tags": [{"name": "indian "}],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["tags"], [{"id": tag.id, "name": "Indian"}])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
     def test_create_tag_when_updating_recipe(self):
         """Test creating a tag when making a recipe update"""
         recipe = create_recipe(user=self.user)
@@ -386,9 +415,9 @@ class PrivateRecipeAPITests(TestCase):
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data["results"])
+        self.assertIn(serializer2.data, res.data["results"])
+        self.assertNotIn(serializer3.data, res.data["results"])
 
     def test_filter_by_ingredients(self):
         """Test filtering recipes by ingredients"""
@@ -407,9 +436,202 @@ class PrivateRecipeAPITests(TestCase):
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)     
 
-        self.assertIn(serializer1.data, res.data)   
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)     
+        self.assertIn(serializer1.data, res.data["results"])   
+        self.assertIn(serializer2.data, res.data["results"])
+        self.assertNotIn(serializer3.data, res.data["results"])
+
+    def test_filter_all_of_tags(self):
+        """Test + joined tags only match recipes carrying every one of them"""
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="Quick")
+        both = create_recipe(user=self.user, title="Salad")
+        both.tags.add(tag1, tag2)
+        one = create_recipe(user=self.user, title="Stew")
+        one.tags.add(tag1)
+
+        res = self.client.get(RECIPES_URL, {"tags": f"{tag1.id}+{tag2.id}"})
+
+        self.assertEqual([r["id"] for r in res.data["results"]], [both.id])
+
+    def test_filter_none_of_and_any_of(self):
+        """Test - prefixed ids exclude recipes while the other terms still match any"""
+        tag = Tag.objects.create(user=self.user, name="Dinner")
+        ingredient1 = Ingredient.objects.create(user=self.user, name="Rice")
+        ingredient2 = Ingredient.objects.create(user=self.user, name="Peanut")
+        kept = create_recipe(user=self.user, title="Fried rice")
+        kept.tags.add(tag)
+        kept.ingredients.add(ingredient1)
+        dropped = create_recipe(user=self.user, title="Satay")
+        dropped.tags.add(tag)
+        dropped.ingredients.add(ingredient1, ingredient2)
+
+        params = {"tags": f"{tag.id}", "ingredients": f"{ingredient1.id},-{ingredient2.id}"}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual([r["id"] for r in res.data["results"]], [kept.id])
+
+    def test_filter_uses_exists_without_duplicates(self):
+        """Test a recipe matching several ids is returned once and without DISTINCT"""
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="Quick")
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag1, tag2)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {"tags": f"{tag1.id},{tag2.id}"})
+
+        self.assertEqual([r["id"] for r in res.data["results"]], [recipe.id])
+        list_sql = queries[1]["sql"]  # after the ETag version lookup
+        self.assertIn("EXISTS", list_sql)
+        self.assertNotIn("DISTINCT", list_sql)
+
+    def test_filter_malformed_ids_bad_request(self):
+        """Test malformed filter values are rejected with a 400"""
+        for value in ["abc", "1,,2", "1+x", "-", "0", "99999999999999999999", "1,-9223372036854775808"]:
+            res = self.client.get(RECIPES_URL, {"tags": value})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("tags", res.data)
+
+
+class RecipePaginationTests(TestCase):
+    """Test cursor pagination of the recipe list."""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="pages@example.com", password="pass123")
+        self.client.force_authenticate(self.user)
+
+    def test_recipes_paginated_newest_first(self):
+        """Test recipes are split into pages walked with the next cursor."""
+        recipes = [create_recipe(user=self.user, title=f"Recipe {i}") for i in range(5)]
+
+        res = self.client.get(RECIPES_URL, {"page_size": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r["id"] for r in res.data["results"]],
+            [recipes[4].id, recipes[3].id],
+        )
+        self.assertNotIn("count", res.data)
+
+        res = self.client.get(res.data["next"])
+        self.assertEqual(
+            [r["id"] for r in res.data["results"]],
+            [recipes[2].id, recipes[1].id],
+        )
+
+    def test_page_size_capped(self):
+        """Test clients cannot ask for pages larger than the maximum."""
+        with patch.object(RecipePagination, "max_page_size", 3):
+            for i in range(5):
+                create_recipe(user=self.user, title=f"Recipe {i}")
+
+            res = self.client.get(RECIPES_URL, {"page_size": 100})
+
+        self.assertEqual(len(res.data["results"]), 3)
+
+    def test_include_total(self):
+        """Test the total is only counted when asked for."""
+        create_recipe(user=self.user)
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, {"include_total": 1})
+
+        self.assertEqual(res.data["count"], 2)
+        self.assertFalse(res.data["count_is_estimate"])
+
+    def test_include_total_estimated_above_threshold(self):
+        """Test large totals come from the planner estimate instead of COUNT(*)."""
+        create_recipe(user=self.user)
+
+        with patch.object(RecipePagination, "exact_total_threshold", 0):
+            res = self.client.get(RECIPES_URL, {"include_total": 1})
+
+        self.assertTrue(res.data["count_is_estimate"])
+        self.assertIsInstance(res.data["count"], int)
+
+
+class RecipeSearchTests(TestCase):
+    """Test full text search of recipes."""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="search@example.com", password="pass123")
+        self.client.force_authenticate(self.user)
+
+    def _search(self, term, **params):
+        res = self.client.get(RECIPES_URL, {"search": term, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def test_search_ranks_title_above_description(self):
+        """Test title matches are ranked above description matches"""
+        in_description = create_recipe(
+            user=self.user, title="Sunday roast", description="Serve with tomatoes",
+        )
+        in_title = create_recipe(user=self.user, title="Tomato soup", description="")
+        create_recipe(user=self.user, title="Fish and chips", description="")
+
+        res = self._search("tomato")
+
+        self.assertEqual(
+            [r["id"] for r in res.data["results"]],
+            [in_title.id, in_description.id],
+        )
+
+    def test_search_follows_ingredient_and_tag_changes(self):
+        """Test ingredient and tag names are searchable and kept up to date"""
+        recipe = create_recipe(user=self.user, title="Stew", description="")
+        ingredient = Ingredient.objects.create(user=self.user, name="Paprika")
+        tag = Tag.objects.create(user=self.user, name="Hungarian")
+        recipe.ingredients.add(ingredient)
+        recipe.tags.add(tag)
+
+        self.assertEqual(len(self._search("paprika").data["results"]), 1)
+        self.assertEqual(len(self._search("hungarian").data["results"]), 1)
+
+        tag.name = "Goulash"
+        tag.save()
+        recipe.ingredients.remove(ingredient)
+
+        self.assertEqual(len(self._search("paprika").data["results"]), 0)
+        self.assertEqual(len(self._search("hungarian").data["results"]), 0)
+        self.assertEqual(len(self._search("goulash").data["results"]), 1)
+
+    def test_search_limited_to_user(self):
+        """Test search only returns the authenticated user's recipes"""
+        other_user = create_user(email="other@example.com", password="pass123")
+        create_recipe(user=other_user, title="Tomato soup")
+
+        res = self._search("tomato")
+
+        self.assertEqual(res.data["results"], [])
+
+    def test_search_results_paginated_by_rank(self):
+        """Test ranked search results can be walked page by page"""
+        recipes = [
+            create_recipe(user=self.user, title=f"Tomato dish {i}", description="")
+            for i in range(3)
+        ]
+        recipes.append(create_recipe(user=self.user, title="Pasta", description="tomato"))
+
+        first = self._search("tomato", page_size=2)
+        second = self.client.get(first.data["next"])
+
+        ids = [r["id"] for r in first.data["results"] + second.data["results"]]
+        self.assertEqual(ids, [recipes[2].id, recipes[1].id, recipes[0].id, recipes[3].id])
+
+    def test_search_index_scoped_to_user(self):
+        """Test the GIN index on search_vector leads with the user"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexdef FROM pg_indexes WHERE tablename = 'db_connection_recipe' AND indexdef LIKE %s",
+                ["%USING gin%"],
+            )
+            definitions = [row[0] for row in cursor.fetchall()]
+
+        self.assertEqual(len(definitions), 1)
+        self.assertTrue(definitions[0].endswith("USING gin (user_id, search_vector)"), definitions[0])
+
 
 class ImageUploadTests(TestCase):
     """Tests for the image upload api."""
@@ -436,7 +658,7 @@ class ImageUploadTests(TestCase):
             res = self.client.post(url, payload, format="multipart")
 
         self.recipe.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn("image", res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
@@ -447,3 +669,374 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, payload, format="multipart")
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeQueryBudgetTests(TestCase):
+    """Test the recipe API runs a fixed number of queries per action."""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="budget@example.com", password="pass123")
+        self.client.force_authenticate(self.user)
+
+    def _create_recipes(self, count):
+        """Create recipes that each carry a tag and an ingredient."""
+        tag, _ = Tag.objects.get_or_create(user=self.user, name="Dinner")
+        ingredient, _ = Ingredient.objects.get_or_create(user=self.user, name="Salt")
+        for i in range(count):
+            recipe = create_recipe(user=self.user, title=f"Recipe {i}")
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+        return recipe
+
+    def test_list_query_budget(self):
+        """Test listing recipes does not scale queries with rows."""
+        self._create_recipes(1)
+        with self.assertNumQueries(LIST_QUERY_BUDGET):
+            self.client.get(RECIPES_URL)
+
+        self._create_recipes(10)
+        with self.assertNumQueries(LIST_QUERY_BUDGET):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data["results"]), 11)
+
+    def test_retrieve_query_budget(self):
+        """Test retrieving a recipe stays within its query budget."""
+        recipe = self._create_recipes(1)
+
+        with self.assertNumQueries(RETRIEVE_QUERY_BUDGET):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_create_query_budget(self):
+        """Test creating a recipe stays within budget however many tags and ingredients it has."""
+        Tag.objects.create(user=self.user, name="Dinner")
+        for size in (1, 20):
+            payload = {
+                "title": "Budget curry",
+                "time_minutes": 20,
+                "price": Decimal("3.50"),
+                "tags": [{"name": "Dinner"}] + [{"name": f"Tag {i}"} for i in range(size)],
+                "ingredients": [{"name": f"Ingredient {i}"} for i in range(size)],
+            }
+
+            with self.assertNumQueries(CREATE_QUERY_BUDGET):
+                res = self.client.post(RECIPES_URL, payload, format="json")
+
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_create_collapses_duplicate_names(self):
+        """Test a name repeated in the payload is only created and linked once."""
+        payload = {
+            "title": "Budget curry",
+            "time_minutes": 20,
+            "price": Decimal("3.50"),
+            "tags": [{"name": "Thai"}, {"name": "Thai"}],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user, name="Thai").count(), 1)
+        self.assertEqual(len(res.data["tags"]), 1)
+
+    def test_update_query_budget(self):
+        """Test updating a recipe's tags and ingredients stays within budget."""
+        recipe = self._create_recipes(1)
+        payload = {
+            "tags": [{"name": "Dinner"}] + [{"name": f"Tag {i}"} for i in range(20)],
+            "ingredients": [{"name": "Salt"}],
+        }
+
+        with self.assertNumQueries(UPDATE_QUERY_BUDGET):
+            res = self.client.patch(detail_url(recipe.id), payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_noop_update_leaves_through_tables_alone(self):
+        """Test resending the current tags and ingredients writes no through rows."""
+        recipe = self._create_recipes(1)
+        payload = {"tags": [{"name": "Dinner"}], "ingredients": [{"name": "Salt"}]}
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(recipe.id), payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = [
+            q["sql"] for q in queries
+            if q["sql"].startswith(("INSERT", "DELETE")) and "_recipe_" in q["sql"]
+        ]
+        self.assertEqual(writes, [])
+
+    def test_update_only_writes_changed_links(self):
+        """Test an update deletes and inserts only the links that changed."""
+        recipe = self._create_recipes(1)
+        kept = Tag.objects.get(user=self.user, name="Dinner")
+        payload = {"tags": [{"name": "Dinner"}, {"name": "Lunch"}]}
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(recipe.id), payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        through_writes = [
+            q["sql"] for q in queries
+            if q["sql"].startswith(("INSERT", "DELETE")) and "recipe_tags" in q["sql"]
+        ]
+        self.assertEqual(len(through_writes), 1)
+        self.assertNotIn(f"({recipe.id}, {kept.id})", through_writes[0])
+        self.assertEqual(
+            sorted(recipe.tags.values_list("name", flat=True)), ["Dinner", "Lunch"],
+        )
+
+
+
+class RecipeSparseFieldsTests(TestCase):
+    """Test ?fields= and ?expand= limit the response and the queries behind it."""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="sparse@example.com", password="pass123")
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name="Dinner"))
+        self.recipe.ingredients.add(Ingredient.objects.create(user=self.user, name="Salt"))
+
+    def test_list_fields(self):
+        """Test only the named fields are returned and loaded, without prefetching relations."""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {"fields": "id,title,price"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"], [
+            {"id": self.recipe.id, "title": self.recipe.title, "price": "6.25"},
+        ])
+        self.assertEqual(len(queries), LIST_QUERY_BUDGET - 2)
+        list_sql = queries[1]["sql"]
+        self.assertNotIn("description", list_sql)
+        self.assertNotIn("search_vector", list_sql)
+
+    def test_list_expand(self):
+        """Test expanded relations are added to the fields and only they are prefetched."""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {"fields": "id", "expand": "tags"})
+
+        self.assertEqual(res.data["results"], [
+            {"id": self.recipe.id, "tags": [{"id": self.recipe.tags.get().id, "name": "Dinner"}]},
+        ])
+        self.assertEqual(len(queries), LIST_QUERY_BUDGET - 1)
+        self.assertFalse(any("ingredient" in q["sql"] for q in queries))
+
+    def test_list_without_fields_skips_unrendered_columns(self):
+        """Test a full list still leaves out the columns only the detail view shows."""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertIn("ingredients", res.data["results"][0])
+        self.assertNotIn("description", queries[1]["sql"])
+
+    def test_retrieve_fields(self):
+        """Test the detail view takes the same parameters."""
+        res = self.client.get(detail_url(self.recipe.id), {"fields": "title,description"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {"title": self.recipe.title, "description": "Sample description"})
+
+    def test_unknown_fields_bad_request(self):
+        """Test unknown fields and relations that can't be expanded are rejected."""
+        res = self.client.get(RECIPES_URL, {"fields": "id,secret"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("fields", res.data)
+
+        res = self.client.get(RECIPES_URL, {"fields": "id", "expand": "title"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("expand", res.data)
+
+    def test_writes_return_all_fields(self):
+        """Test the parameters don't apply to updates."""
+        res = self.client.patch(
+            detail_url(self.recipe.id) + "?fields=id", {"title": "New"}, format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["title"], "New")
+        self.assertIn("tags", res.data)
+
+BULK_URL = reverse("recipe:recipe-bulk")
+
+
+class RecipeBulkTests(TestCase):
+    """Test the NDJSON bulk endpoint"""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="user@example.com", password="pass123")
+        self.client.force_authenticate(self.user)
+
+    def _bulk(self, lines):
+        body = "\n".join(
+            line if isinstance(line, str) else json.dumps(line) for line in lines
+        )
+        res = self.client.post(BULK_URL, body, content_type="application/x-ndjson")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        content = b"".join(res.streaming_content).decode()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def _create_line(self, title, **data):
+        data.update(title=title, time_minutes=5, price="2.50")
+        return {"op": "create", "data": data}
+
+    def test_bulk_create_update_delete(self):
+        """Test one stream can create, update and delete recipes."""
+        updated = create_recipe(self.user, title="Old title")
+        updated.tags.add(Tag.objects.create(user=self.user, name="Stale"))
+        deleted = create_recipe(self.user)
+
+        results = self._bulk([
+            self._create_line("Soup", tags=[{"name": "Dinner"}], ingredients=[{"name": "Leek"}]),
+            {"op": "update", "id": updated.id, "ref": "u1",
+             "data": {"title": "New title", "tags": [{"name": "dinner"}]}},
+            {"op": "delete", "id": deleted.id},
+        ])
+
+        self.assertEqual([r["status"] for r in results], [201, 200, 204])
+        self.assertEqual(results[1]["ref"], "u1")
+        soup = Recipe.objects.get(id=results[0]["id"])
+        self.assertEqual(soup.title, "Soup")
+        self.assertEqual([t.name for t in soup.tags.all()], ["Dinner"])
+        self.assertEqual([i.name for i in soup.ingredients.all()], ["Leek"])
+        updated.refresh_from_db()
+        self.assertEqual(updated.title, "New title")
+        self.assertEqual([t.name for t in updated.tags.all()], ["Dinner"])
+        self.assertFalse(Recipe.objects.filter(id=deleted.id).exists())
+
+    def test_bulk_same_recipe_updated_twice(self):
+        """Test a later update of the same recipe wins, as if the lines ran in order."""
+        recipe = create_recipe(self.user, title="Old title")
+
+        results = self._bulk([
+            {"op": "update", "id": recipe.id, "data": {"title": "First", "tags": [{"name": "A"}, {"name": "B"}]}},
+            {"op": "update", "id": recipe.id, "data": {"time_minutes": 7, "tags": [{"name": "C"}]}},
+        ])
+
+        self.assertEqual([r["status"] for r in results], [200, 200])
+        recipe.refresh_from_db()
+        self.assertEqual((recipe.title, recipe.time_minutes), ("First", 7))
+        self.assertEqual([t.name for t in recipe.tags.all()], ["C"])
+
+    def test_bulk_reports_errors_per_line(self):
+        """Test bad lines get their own error and the rest are still applied."""
+        other = create_recipe(create_user(email="other@example.com", password="pass123"))
+
+        results = self._bulk([
+            "{not json",
+            {"op": "rename"},
+            {"op": "create", "data": {"title": "No price"}},
+            {"op": "delete", "id": other.id},
+            {"op": "update", "id": "1"},
+            self._create_line("Good"),
+        ])
+
+        self.assertEqual([r["status"] for r in results], [400, 400, 400, 404, 400, 201])
+        self.assertEqual([r["index"] for r in results], list(range(6)))
+        self.assertIn("price", results[2]["errors"])
+        self.assertTrue(Recipe.objects.filter(id=other.id).exists())
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_queries_do_not_grow_with_items(self):
+        """Test a chunk runs the same statements whatever its size."""
+        def count_queries(items):
+            lines = [
+                self._create_line(f"Recipe {n}", tags=[{"name": f"Tag {n}"}])
+                for n in range(items)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                self._bulk(lines)
+            return len(queries)
+
+        self.assertEqual(count_queries(2), count_queries(40))
+
+    def test_bulk_applies_chunks_separately(self):
+        """Test each chunk commits on its own."""
+        with patch("recipe.bulk.CHUNK_SIZE", 2):
+            results = self._bulk([self._create_line(f"Recipe {n}") for n in range(5)])
+
+        self.assertEqual([r["status"] for r in results], [201] * 5)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+
+    def test_bulk_requires_ndjson(self):
+        """Test other content types are rejected."""
+        res = self.client.post(BULK_URL, [self._create_line("Soup")], format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+
+EXPORT_URL = reverse("recipe:recipe-export")
+
+
+class RecipeExportTests(TestCase):
+    """Test the streaming export"""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="user@example.com", password="pass123")
+        self.client.force_authenticate(self.user)
+
+    def _export(self, **params):
+        res = self.client.get(EXPORT_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return b"".join(res.streaming_content).decode()
+
+    def test_export_ndjson_matches_detail(self):
+        """Test exported lines carry the same data as the detail endpoint."""
+        recipe = create_recipe(self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Dinner"))
+        recipe.ingredients.add(Ingredient.objects.create(user=self.user, name="Salt"))
+        create_recipe(create_user(email="other@example.com", password="pass123"))
+
+        lines = [json.loads(line) for line in self._export().splitlines()]
+
+        detail = self.client.get(detail_url(recipe.id)).json()
+        self.assertEqual(lines, [detail])
+
+    def test_export_csv(self):
+        """Test recipes export as CSV with names joined in one cell."""
+        recipe = create_recipe(self.user, title="Soup")
+        recipe.tags.add(
+            Tag.objects.create(user=self.user, name="Dinner"),
+            Tag.objects.create(user=self.user, name="Lunch"),
+        )
+
+        rows = list(csv.DictReader(io.StringIO(self._export(output="csv"))))
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["title"], "Soup")
+        self.assertEqual(rows[0]["tags"], "Dinner|Lunch")
+        self.assertEqual(rows[0]["ingredients"], "")
+
+    def test_export_applies_list_filters(self):
+        """Test the export honours the same filters as the list."""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        kept = create_recipe(self.user)
+        kept.tags.add(tag)
+        create_recipe(self.user)
+
+        lines = self._export(tags=str(tag.id)).splitlines()
+
+        self.assertEqual([json.loads(line)["id"] for line in lines], [kept.id])
+
+    def test_export_queries_per_chunk(self):
+        """Test relations are fetched once per chunk, not once per recipe."""
+        tag = Tag.objects.create(user=self.user, name="Dinner")
+        for n in range(6):
+            create_recipe(self.user, title=f"Recipe {n}").tags.add(tag)
+
+        with patch("recipe.export.CHUNK_SIZE", 3), CaptureQueriesContext(connection) as queries:
+            lines = self._export().splitlines()
+
+        self.assertEqual(len(lines), 6)
+        relation_queries = [q for q in queries if "recipe_tags" in q["sql"]]
+        self.assertEqual(len(relation_queries), 2)
+
+    def test_export_unknown_output_bad_request(self):
+        """Test an unknown export format is rejected."""
+        res = self.client.get(EXPORT_URL, {"output": "xml"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
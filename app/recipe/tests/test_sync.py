@@ -0,0 +1,171 @@
+"""
+Tests for the delta sync change feed.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from db_connection.models import Recipe, Tag, Ingredient
+from recipe.sync import encode_cursor
+
+CHANGES_URL = reverse("recipe:change-list")
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        "title": "Sample recipe",
+        "time_minutes": 10,
+        "price": Decimal("5.00"),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+# without a settle window the cursor moves past everything already read.
+@patch("recipe.sync.SETTLE_TIME", timedelta(0))
+class ChangeFeedTests(TestCase):
+    """Test the change feed."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@example.com", "pass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.dinner = Tag.objects.create(user=self.user, name="Dinner")
+        self.salt = Ingredient.objects.create(user=self.user, name="Salt")
+        self.soup = create_recipe(self.user, title="Soup")
+        self.soup.tags.add(self.dinner)
+        self.cake = create_recipe(self.user, title="Cake")
+
+    def _sync(self, since=None):
+        res = self.client.get(CHANGES_URL, {"since": since} if since else {})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def _ids(self, rows):
+        return sorted(row["id"] for row in rows)
+
+    def test_first_sync_returns_everything(self):
+        """Test a sync without a cursor returns all of the user's rows"""
+        other = get_user_model().objects.create_user("other@example.com", "pass123")
+        create_recipe(other)
+
+        data = self._sync()
+
+        self.assertEqual(self._ids(data["recipes"]), sorted([self.soup.id, self.cake.id]))
+        self.assertEqual([tag["name"] for tag in data["tags"]], ["Dinner"])
+        self.assertEqual([i["name"] for i in data["ingredients"]], ["Salt"])
+        self.assertEqual(data["deleted"], {"recipes": [], "tags": [], "ingredients": []})
+        self.assertFalse(data["has_more"])
+
+    def test_sync_returns_only_changes(self):
+        """Test a sync with a cursor returns the rows changed or deleted since"""
+        cursor = self._sync()["cursor"]
+        self.client.patch(
+            reverse("recipe:recipe-detail", args=[self.cake.id]),
+            {"ingredients": [{"name": "Sugar"}]},
+            format="json",
+        )
+        salt_id = self.salt.id
+        self.salt.delete()
+
+        data = self._sync(cursor)
+
+        self.assertEqual(self._ids(data["recipes"]), [self.cake.id])
+        self.assertEqual(data["tags"], [])
+        self.assertEqual([i["name"] for i in data["ingredients"]], ["Sugar"])
+        self.assertEqual(data["deleted"]["ingredients"], [salt_id])
+        self.assertEqual(self._sync(data["cursor"])["recipes"], [])
+
+    def test_writes_outside_the_orm_are_tracked(self):
+        """Test queryset updates, link changes and renames bump updated_at"""
+        cursor = self._sync()["cursor"]
+        Recipe.objects.filter(id=self.cake.id).update(title="Cheesecake")
+        Tag.objects.filter(id=self.dinner.id).update(name="Supper")
+
+        data = self._sync(cursor)
+
+        # the rename touches the recipes the tag is linked to.
+        self.assertEqual(self._ids(data["recipes"]), sorted([self.soup.id, self.cake.id]))
+        self.assertEqual([tag["name"] for tag in data["tags"]], ["Supper"])
+
+    def test_reused_names_are_not_changes(self):
+        """Test the name upsert leaves existing tags unchanged"""
+        cursor = self._sync()["cursor"]
+        Tag.objects._upsert(self.user, ["dinner"])
+
+        self.assertEqual(self._sync(cursor)["tags"], [])
+
+    def test_deleting_a_tag_touches_its_recipes(self):
+        """Test recipes that lose a tag are sent along with the tombstone"""
+        cursor = self._sync()["cursor"]
+        dinner_id = self.dinner.id
+        self.dinner.delete()
+
+        data = self._sync(cursor)
+
+        self.assertEqual(self._ids(data["recipes"]), [self.soup.id])
+        self.assertEqual(data["recipes"][0]["tags"], [])
+        self.assertEqual(data["deleted"]["tags"], [dinner_id])
+
+    def test_deleting_a_bigint_id(self):
+        """Test ids past the 32 bit range are tombstoned like any other"""
+        cursor = self._sync()["cursor"]
+        big = create_recipe(self.user, id=2 ** 31 + 5)
+        big.delete()
+
+        self.assertEqual(self._sync(cursor)["deleted"]["recipes"], [2 ** 31 + 5])
+
+    def test_sync_pages(self):
+        """Test changes beyond the page size are left for the next call"""
+        with patch("recipe.sync.PAGE_SIZE", 1):
+            first = self._sync()
+            second = self._sync(first["cursor"])
+            third = self._sync(second["cursor"])
+
+        self.assertTrue(first["has_more"])
+        self.assertEqual(
+            [r["id"] for r in first["recipes"] + second["recipes"]], [self.soup.id, self.cake.id],
+        )
+        self.assertFalse(third["has_more"])
+        self.assertEqual(third["recipes"], [])
+
+    def test_invalid_cursor_bad_request(self):
+        """Test a malformed cursor is rejected"""
+        res = self.client.get(CHANGES_URL, {"since": "not-a-cursor"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_cursor_gone(self):
+        """Test a cursor older than the kept tombstones asks for a full sync"""
+        old = (timezone.now() - timedelta(days=365), 0)
+        cursor = encode_cursor({"recipes": old, "tags": old, "ingredients": old, "deleted": old})
+
+        res = self.client.get(CHANGES_URL, {"since": cursor})
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+
+
+class ChangeFeedSettleTests(TestCase):
+    """Test the settle window of the change feed."""
+
+    def test_recent_changes_sent_again(self):
+        """Test the cursor stays behind changes that may still have late commits around them"""
+        user = get_user_model().objects.create_user("user@example.com", "pass123")
+        recipe = create_recipe(user)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        cursor = client.get(CHANGES_URL).data["cursor"]
+        res = client.get(CHANGES_URL, {"since": cursor})
+
+        self.assertEqual([r["id"] for r in res.data["recipes"]], [recipe.id])
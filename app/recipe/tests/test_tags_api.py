@@ -15,6 +15,7 @@ from db_connection.models import (Tag, Recipe)
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse("recipe:tag-list")
+AUTOCOMPLETE_URL = reverse("recipe:tag-autocomplete")
 
 def create_user(email="user@example.com", password="testpass123"):
     """ Helper function to help create users"""
@@ -56,7 +57,7 @@ class PrivateTagsApiTests(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
 
     def test_tags_limited_to_user(self):
@@ -68,9 +69,9 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]["name"], tag.name)
-        self.assertEqual(res.data[0]["id"], tag.id)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"][0]["name"], tag.name)
+        self.assertEqual(res.data["results"][0]["id"], tag.id)
 
     def test_update_tag(self):
         """Test updating a tag"""
@@ -86,6 +87,15 @@ class PrivateTagsApiTests(TestCase):
 
         self.assertEqual(payload["name"],tag.name)
 
+    def test_update_tag_to_existing_name_rejected(self):
+        """Test renaming a tag to a name the user already has is a bad request"""
+        Tag.objects.create(user=self.user, name="Dessert")
+        tag = Tag.objects.create(user=self.user, name="After dinner")
+
+        res = self.client.patch(detail_url(tag.id), {"name": "dessert "})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_delete_tag(self):
         """Test updating a tag"""
         tag = Tag.objects.create(user=self.user, name="After dinner")
@@ -114,8 +124,8 @@ class PrivateTagsApiTests(TestCase):
 
         s1 = TagSerializer(tag1)
         s2 = TagSerializer(tag2)
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data["results"])
+        self.assertNotIn(s2.data, res.data["results"])
 
     def test_filtered_tags_unique(self):
         """Test filtered ingredients returns a unique list."""
@@ -139,4 +149,52 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL, {"assigned_only": 1})
 
-        self.assertEqual(len(res.data), 1) 
\ No newline at end of file
+        self.assertEqual(len(res.data["results"]), 1) 
+
+    def test_tags_paginated_by_name(self):
+        """Test tags are paged by name, last name first."""
+        Tag.objects.create(user=self.user, name="Breakfast")
+        Tag.objects.create(user=self.user, name="Lunch")
+        Tag.objects.create(user=self.user, name="Dinner")
+
+        res = self.client.get(TAGS_URL, {"page_size": 2})
+
+        self.assertEqual([t["name"] for t in res.data["results"]], ["Lunch", "Dinner"])
+        res = self.client.get(res.data["next"])
+        self.assertEqual([t["name"] for t in res.data["results"]], ["Breakfast"])
+
+    def test_autocomplete_prefix_then_fuzzy(self):
+        """Test autocomplete lists prefix matches first, then close misspellings"""
+        Tag.objects.create(user=self.user, name="Tomato season")
+        Tag.objects.create(user=self.user, name="tomatillo")
+        Tag.objects.create(user=self.user, name="Potato")
+        Tag.objects.create(user=self.user, name="Fish")
+        Tag.objects.create(user=create_user(email="user2@example.com"), name="Tomato")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "tomat"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [t["name"] for t in res.data],
+            ["tomatillo", "Tomato season"],
+        )
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "tomatoe"})
+        self.assertEqual(res.data[0]["name"], "Tomato season")
+        self.assertNotIn("Fish", [t["name"] for t in res.data])
+
+    def test_autocomplete_limit(self):
+        """Test autocomplete returns at most limit suggestions"""
+        for i in range(5):
+            Tag.objects.create(user=self.user, name=f"Dinner {i}")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "din", "limit": 2})
+
+        self.assertEqual([t["name"] for t in res.data], ["Dinner 0", "Dinner 1"])
+
+    def test_autocomplete_bad_request(self):
+        """Test autocomplete rejects a missing query or a bad limit"""
+        for params in [{}, {"q": " "}, {"q": "a", "limit": "x"}, {"q": "a", "limit": 0}]:
+            res = self.client.get(AUTOCOMPLETE_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
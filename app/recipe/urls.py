@@ -13,10 +13,12 @@ router = DefaultRouter()  #using this Default router provided by django, the url
 router.register("recipes", views.RecipeViewSet)
 router.register("tags", views.TagViewSet)
 router.register("ingredients", views.IngredientViewSet)
+router.register("changes", views.ChangeFeedViewSet, basename="change")
 
 app_name = "recipe"
 
 urlpatterns = [
     path("",include(router.urls)),
+    path("cache-stats/", views.ResponseCacheStatsView.as_view(), name="cache-stats"),
 ]
 #Instead of writing 6-7 URL patterns for recipes, I’m letting DRF’s router create them automatically from my RecipeViewSet.
\ No newline at end of file
@@ -1,7 +1,18 @@
 """
 Views for the recipe API
 """
-from django.db.models import query
+import json
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import transaction
+from django.db.models import F
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.translation import gettext as _
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -12,12 +23,70 @@ from rest_framework import (
     mixins,
     status)
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response 
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import BasePermission, IsAuthenticated
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.views import APIView
 
+from core.conditional import ConditionalMixin, stamp_version
 from db_connection.models import Recipe, Tag, Ingredient  
 from recipe import serializers
+from recipe.autocomplete import autocomplete
+from recipe.bulk import bulk_apply
+from recipe.cache import CachedResponseMixin, response_cache
+from recipe.compiled import CompiledListMixin
+from recipe.export import export_rows, ndjson_lines, csv_lines
+from recipe.fieldsets import EXPAND_PARAM, FIELDS_PARAM, SparseFieldsMixin
+from recipe.filters import relation_filter
+from recipe.images import enqueue_image
+from recipe.index import recipe_index
+from recipe.media import is_safe_name, media_allowed
+from recipe.pagination import RecipePagination, RecipeAttrPagination
+from recipe.parsers import CBORParser, MessagePackParser, NDJSONParser
+from recipe.renderers import CBORRenderer, CompiledJSONRenderer, MessagePackRenderer
+from recipe.resize import FORMATS as RESIZE_FORMATS, disk_cache, open_resized, resized
+from recipe.sync import changes
+from user.authentication import CachedTokenAuthentication, SignedTokenAuthentication
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 25
+EXPORT_FORMATS = {
+    "ndjson": (ndjson_lines, NDJSONParser.media_type),
+    "csv": (csv_lines, "text/csv"),
+}
+# JSON by default, MessagePack and CBOR for clients that send or accept them.
+RENDERER_CLASSES = [CompiledJSONRenderer, BrowsableAPIRenderer, MessagePackRenderer, CBORRenderer]
+PARSER_CLASSES = [JSONParser, FormParser, MultiPartParser, MessagePackParser, CBORParser]
+
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(
+        FIELDS_PARAM,
+        OpenApiTypes.STR,
+        description="Comma separated fields to return, e.g. id,title,price. All of them by default.",
+    ),
+    OpenApiParameter(
+        EXPAND_PARAM,
+        OpenApiTypes.STR,
+        description="Comma separated nested relations to add to the fields, e.g. tags,ingredients.",
+    ),
+]
+
+class UserContentConditionalMixin(ConditionalMixin):
+    """Version lists by the user's content stamp and single rows by their updated_at"""
+
+    def get_version(self):
+        if self.action == "list":
+            return stamp_version(
+                get_user_model().objects, "content_updated_at", pk=self.request.user.pk,
+            )
+        if self.detail:
+            return stamp_version(
+                self.queryset, "updated_at", lock=self.lock_version,
+                user=self.request.user, pk=self.kwargs["pk"],
+            )
+        return None
 
 @extend_schema_view(
     list=extend_schema(
@@ -28,15 +97,36 @@ from recipe import serializers
                 description="filter by items assigned to recipe."
             )
         ]
-    )
+    ),
+    autocomplete=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "q",
+                OpenApiTypes.STR,
+                required=True,
+                description="Start of the name being typed, close misspellings also match.",
+            ),
+            OpenApiParameter(
+                "limit",
+                OpenApiTypes.INT,
+                description=f"Number of suggestions, at most {AUTOCOMPLETE_MAX_LIMIT}.",
+            ),
+        ]
+    ),
 )
-class BaseRecipeAttr(mixins.DestroyModelMixin,
+class BaseRecipeAttr(CachedResponseMixin,
+    UserContentConditionalMixin,
+    CompiledListMixin,
+    mixins.DestroyModelMixin,
     mixins.UpdateModelMixin,
     mixins.ListModelMixin,
     viewsets.GenericViewSet):
     """Base class for inheritance for the TagViewSet and RecipeViewset"""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    renderer_classes = RENDERER_CLASSES
+    parser_classes = PARSER_CLASSES
+    pagination_class = RecipeAttrPagination
 
     def get_queryset(self):
         """filter the queryset to only include that of the authenticated user making the request"""
@@ -51,50 +141,141 @@ class BaseRecipeAttr(mixins.DestroyModelMixin,
             user=self.request.user
             ).order_by("-name").distinct()
 
+    @action(methods=["GET"], detail=False, pagination_class=None)
+    def autocomplete(self, request):
+        """Suggest names matching what the user is typing"""
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": _("This parameter is required.")})
+        try:
+            limit = min(int(request.query_params.get("limit", AUTOCOMPLETE_LIMIT)), AUTOCOMPLETE_MAX_LIMIT)
+        except ValueError:
+            raise ValidationError({"limit": _("A valid integer is required.")})
+        if limit < 1:
+            raise ValidationError({"limit": _("Ensure this value is greater than or equal to 1.")})
+
+        matches = autocomplete(self.queryset.filter(user=request.user), query, limit)
+        serializer = self.get_serializer(matches, many=True)
+        return Response(serializer.data)
+
 @extend_schema_view(
     list=extend_schema(
         parameters=[
             OpenApiParameter(
                 "tags",
                 OpenApiTypes.STR,
-                description="Comma separated list of tag IDs to filter",
+                description="Comma separated tag IDs to filter by, any of them matches. "
+                "Join IDs with + to require all of them and prefix an ID with - to exclude it, "
+                "e.g. 1+2,3,-5",
             ), 
             OpenApiParameter(
                 "ingredients", 
                 OpenApiTypes.STR,
-                description="Comma separated list of ingredient IDs to filter"
-            )
+                description="Comma separated ingredient IDs, using the same syntax as tags"
+            ),
+            OpenApiParameter(
+                "search",
+                OpenApiTypes.STR,
+                description="Full text search over title, ingredients, tags and description. "
+                "Results are ordered by relevance.",
+            ),
+            *SPARSE_FIELDS_PARAMETERS,
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
+    bulk=extend_schema(
+        request={NDJSONParser.media_type: OpenApiTypes.OBJECT},
+        responses={(200, NDJSONParser.media_type): OpenApiTypes.OBJECT},
+        description="Create, update and delete recipes from a newline delimited JSON stream, "
+        'one operation per line: {"op": "create", "data": {...}}, '
+        '{"op": "update", "id": 1, "data": {...}} or {"op": "delete", "id": 1}. '
+        "Operations are applied in chunks, each in its own transaction, and one result "
+        "line with the index, id, status and any errors is streamed back per input line.",
+    ),
+    export=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "output",
+                OpenApiTypes.STR,
+                enum=list(EXPORT_FORMATS),
+                description="Export format, ndjson by default. Accepts the same filters as the list.",
+            ),
+        ],
+        responses={
+            (200, media_type): OpenApiTypes.STR for render, media_type in EXPORT_FORMATS.values()
+        },
+    ),
+    resized_image=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "w", OpenApiTypes.INT, required=True,
+                enum=list(settings.IMAGE_RESIZE_WIDTHS),
+                description="Width in pixels, images are never enlarged.",
+            ),
+            OpenApiParameter("fmt", OpenApiTypes.STR, enum=list(RESIZE_FORMATS)),
+        ],
+        responses={(200, "image/*"): OpenApiTypes.BINARY},
+    ),
+    upload_image=extend_schema(
+        responses={202: serializers.RecipeImageSerializer},
+        description="Store an image for the recipe. Resized variants are made in the background, "
+        "image_status and image_variants on the recipe show when they are ready.",
+    ),
 ) # with this decorator, we are extending the list view schema functionality to support filtering by tags or ingredients 
 # it really does not have any effect on the backend, it ony does to the OpenAPI schema
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SparseFieldsMixin, CachedResponseMixin, UserContentConditionalMixin, CompiledListMixin,
+                    viewsets.ModelViewSet):
     """View for managing recipe APIs"""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
     permission_classes = [IsAuthenticated]
-
-    def _params_to_ints(self, qs):
-        """Convert a list of string to integers."""
-        return [int(str_id) for str_id in qs.split(",")]
+    renderer_classes = RENDERER_CLASSES
+    parser_classes = PARSER_CLASSES
+    pagination_class = RecipePagination
 
     def get_queryset(self):
         """Retrieve recipe for authenticated user"""
         tags = self.request.query_params.get("tags")
         ingredients = self.request.query_params.get("ingredients")
+        search = self.request.query_params.get("search")
         queryset = self.queryset
+        if search:
+            # matches use the GIN index on (user, search_vector), the rank then orders the page.
+            query = SearchQuery(search, config="english", search_type="websearch")
+            queryset = queryset.filter(search_vector=query).annotate(
+                rank=SearchRank(F("search_vector"), query)
+            )
+
+        if (tags or ingredients) and self.action == "list" and settings.RECIPE_FILTER_INDEX and not search:
+            queryset = self._filter_with_index(queryset, tags, ingredients)
+        else:
+            if tags:
+                queryset = queryset.filter(relation_filter(Recipe.tags, tags, "tags"))
+            if ingredients:
+                queryset = queryset.filter(
+                    relation_filter(Recipe.ingredients, ingredients, "ingredients")
+                )
+
+        # the filters are EXISTS subqueries, so recipes are never duplicated and no distinct() is needed.
+        # prefetching loads the nested tags and ingredients in one query each, instead of two per recipe,
+        # and reads only load the columns and relations the requested fields need.
+        ordering = ("-rank", "-id") if search else ("-id",)
+        return self.prune_queryset(queryset.filter(user=self.request.user)).order_by(*ordering)
+
+    def _filter_with_index(self, queryset, tags, ingredients):
+        """Match the filters against the in-memory index and only query the page of ids we need"""
+        index = recipe_index.get(self.request.user.id)
+        matches = index.universe
         if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            matches &= index.match("tags", tags, "tags")
         if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
-              
+            matches &= index.match("ingredients", ingredients, "ingredients")
+
+        ids = index.ids(matches)
+        self.filtered_count = len(ids)
+        return queryset.filter(id__in=self.paginator.id_window(ids, self.request))
 
-# returning distinct values because one recipe can be assigned to more than one tag or ingredient.
-        return queryset.filter(user=self.request.user).order_by("-id").distinct()
-       
     def get_serializer_class(self): # the way is that image uploads would be separate from uploading other fields. so as a post request
         """Return the serializer class for request """
         if self.action == "list":
@@ -124,16 +305,80 @@ class RecipeViewSet(viewsets.ModelViewSet):
             data=request.data,
         )
         if serializer.is_valid():
-            serializer.save()
+            # only the original is stored here, the variants are made by the worker pool.
+            serializer.save(image_status=Recipe.ImageStatus.PENDING, image_variants={})
+            transaction.on_commit(lambda: enqueue_image(recipe.id))
             return Response(
                 serializer.data,
-                status=status.HTTP_200_OK,
+                status=status.HTTP_202_ACCEPTED,
             )
         return Response(
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    @action(methods=["GET"], detail=True, url_path="image")
+    def resized_image(self, request, pk=None):
+        """Return the recipe image resized to an allowed width"""
+        try:
+            width = int(request.query_params.get("w", ""))
+        except ValueError:
+            raise ValidationError({"w": _("A valid integer is required.")})
+        if width not in settings.IMAGE_RESIZE_WIDTHS:
+            raise ValidationError({"w": [_("Expected one of %(widths)s.") % {
+                "widths": ", ".join(map(str, settings.IMAGE_RESIZE_WIDTHS)),
+            }]})
+        fmt = request.query_params.get("fmt", "webp")
+        if fmt not in RESIZE_FORMATS:
+            raise ValidationError({"fmt": [_("Expected one of %(formats)s.") % {
+                "formats": ", ".join(RESIZE_FORMATS),
+            }]})
+
+        # no prefetching, only the image name is needed.
+        recipe = get_object_or_404(Recipe.objects.only("id", "image"), pk=pk, user=request.user)
+        if not recipe.image:
+            raise NotFound(_("This recipe has no image."))
+        content_type = RESIZE_FORMATS[fmt][1]
+        if settings.IMAGE_RESIZE_ACCEL_PREFIX:
+            path, hit = resized(recipe.image, width, fmt)
+            # nginx sends the file, the worker is free as soon as this returns.
+            response = HttpResponse(content_type=content_type)
+            response["X-Accel-Redirect"] = settings.IMAGE_RESIZE_ACCEL_PREFIX + os.path.relpath(
+                path, disk_cache.root,
+            )
+        else:
+            f, hit = open_resized(recipe.image, width, fmt)
+            response = FileResponse(f, content_type=content_type)
+        response["X-Cache"] = "HIT" if hit else "MISS"
+        response["Cache-Control"] = "private, max-age=86400"
+        return response
+
+    @action(methods=["POST"], detail=False, parser_classes=[NDJSONParser])
+    def bulk(self, request):
+        """Apply a stream of recipe operations"""
+        # request.data is a lazy generator of lines, results are written as they are produced.
+        results = bulk_apply(request.data, request)
+        return StreamingHttpResponse(
+            (json.dumps(result) + "\n" for result in results),
+            content_type=NDJSONParser.media_type,
+        )
+
+    @action(methods=["GET"], detail=False, pagination_class=None)
+    def export(self, request):
+        """Stream every recipe matching the list filters"""
+        output = request.query_params.get("output", "ndjson")
+        if output not in EXPORT_FORMATS:
+            raise ValidationError({"output": [_("Expected one of %(formats)s.") % {
+                "formats": ", ".join(EXPORT_FORMATS),
+            }]})
+
+        render, content_type = EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(
+            render(export_rows(self.get_queryset(), request)), content_type=content_type,
+        )
+        response["Content-Disposition"] = f'attachment; filename="recipes.{output}"'
+        return response
+
 class TagViewSet(BaseRecipeAttr):
     """Manage tags in the database"""
     serializer_class = serializers.TagSerializer
@@ -142,4 +387,72 @@ class IngredientViewSet(BaseRecipeAttr):
     """Manage ingredients in the database"""
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
-    
\ No newline at end of file
+    
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "since",
+                OpenApiTypes.STR,
+                description="Cursor returned by the previous sync. Leave it out for a first, full sync.",
+            ),
+        ],
+        description="Recipes, tags and ingredients changed or deleted since the cursor. "
+        "Keep calling with the returned cursor while has_more is true. Rows changed in the "
+        "last few seconds may be sent twice, and a 410 response means the cursor is too old "
+        "and the client has to sync from scratch.",
+    ),
+)
+class ChangeFeedViewSet(viewsets.GenericViewSet):
+    """Delta sync of a user's recipes, tags and ingredients"""
+    serializer_class = serializers.ChangeFeedSerializer
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        page = changes(request.user, request.query_params.get("since"))
+        return Response(self.get_serializer(page).data)
+
+
+@extend_schema(exclude=True)
+class MediaView(APIView):
+    """Serve a recipe image or variant to the user owning it"""
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, name):
+        if not is_safe_name(name) or not media_allowed(request.user, name):
+            raise NotFound()
+
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if settings.MEDIA_ACCEL_PREFIX:
+            # nginx sends the file with sendfile and answers ranges and revalidation itself.
+            response = HttpResponse(content_type=content_type)
+            response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + name
+        else:
+            storage = Recipe._meta.get_field("image").storage
+            try:
+                response = FileResponse(storage.open(name, "rb"), content_type=content_type)
+            except FileNotFoundError:
+                raise NotFound()
+        # names change with the content, but only the owner may keep a copy.
+        response["Cache-Control"] = "private, max-age=31536000, immutable"
+        return response
+
+
+class IsSuperuser(BasePermission):
+    """Allows superusers only, every user is staff by default"""
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_superuser)
+
+
+@extend_schema(exclude=True)
+class ResponseCacheStatsView(APIView):
+    """Hits and misses of the response cache across all processes"""
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated, IsSuperuser]
+
+    def get(self, request):
+        return Response(response_cache.stats())
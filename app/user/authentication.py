@@ -0,0 +1,142 @@
+"""
+Authentication classes for the API
+
+CachedTokenAuthentication checks DRF database tokens through an in-process
+cache, SignedTokenAuthentication checks the signed access tokens of
+user.tokens without touching the database.
+
+TokenAuthentication looks the token and its user up on every request. The
+cached version keeps the answer for AUTH_TOKEN_CACHE_TTL seconds in a least recently used
+map of at most AUTH_TOKEN_CACHE_SIZE tokens. The handlers in user.signals drop
+a user's entries when one of their tokens is saved or deleted, or the user is
+saved, which covers regenerated tokens and deactivated users. Those handlers
+only run in the process making the change, other processes notice within the
+TTL.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.utils.translation import gettext as _
+from drf_spectacular.extensions import OpenApiAuthenticationExtension
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.exceptions import AuthenticationFailed
+
+from user.tokens import is_revoked, read_access_token
+
+
+class TokenCache:
+    """LRU of token key -> (user, token, expiry) with a TTL"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, token, expires = entry
+            if expires <= time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+        # each request gets its own copy, so changes to request.user stay local to it.
+        return copy.copy(user), token
+
+    def set(self, key, user, token):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (user, token, time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL)
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._keys_by_user.get(entry[0].pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[entry[0].pk]
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that skips the database for recently seen tokens"""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Bearer access tokens checked by their signature alone.
+
+    request.user is an unsaved User carrying only the id, which is all the
+    recipe views need, and no staff or superuser rights. Views showing the
+    user's own fields load the row. Revoked tokens are refused from the cache.
+    """
+    keyword = "Bearer"
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed(_("Invalid bearer header."))
+
+        try:
+            claims = read_access_token(auth[1].decode())
+        except signing.SignatureExpired:
+            raise AuthenticationFailed(_("Access token expired."))
+        except (signing.BadSignature, UnicodeError):
+            raise AuthenticationFailed(_("Invalid access token."))
+        if is_revoked(claims):
+            raise AuthenticationFailed(_("Access token revoked."))
+        user = get_user_model()(
+            pk=claims["uid"], token_version=claims["ver"], is_staff=False, is_superuser=False,
+        )
+        return user, claims
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+class SignedTokenScheme(OpenApiAuthenticationExtension):
+    target_class = "user.authentication.SignedTokenAuthentication"
+    name = "signedTokenAuth"
+
+    def get_security_definition(self, auto_schema):
+        return {"type": "http", "scheme": "bearer", "bearerFormat": "signed"}
@@ -6,6 +6,8 @@ from django.utils.translation import gettext as _
 
 from rest_framework import serializers
 
+from user.tokens import refresh_tokens
+
 class UserSerializer(serializers.ModelSerializer):
     "Serializer for User object"
 
@@ -19,7 +21,7 @@ class UserSerializer(serializers.ModelSerializer):
         return get_user_model().objects.create_user(**validated_data)
 
     #have to override the already existing update method, so that we can hash the password while updating
-    def update(self, validated_data):
+    def update(self, instance, validated_data):
         """Update and return user"""
         # pops out the password so that it does not get saved the normal way as other fields if password was not updated, default is None
         #then proceeds to store other fields, by calling the actual initial update method in the parent class
@@ -59,4 +61,25 @@ class AuthTokenSerializer(serializers.Serializer):
         
         attrs["user"] = user # this adds the already validated user to the attrs dictionary.
         return attrs
-        
\ No newline at end of file
+        
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer exchanging a refresh token for a new pair"""
+    refresh = serializers.CharField(trim_whitespace=False)
+
+    def validate(self, attrs):
+        """Check the refresh token and issue new tokens"""
+        tokens = refresh_tokens(attrs["refresh"])
+        if tokens is None:
+            msg = _("Refresh token is invalid, expired or revoked.")
+            raise serializers.ValidationError(msg, code="authorization")
+        attrs["tokens"] = tokens
+        return attrs
+
+
+class SignedTokensSerializer(serializers.Serializer):
+    """Tokens returned at login and on refresh"""
+    token = serializers.CharField(required=False)
+    access = serializers.CharField()
+    refresh = serializers.CharField()
+    access_expires_in = serializers.IntegerField()
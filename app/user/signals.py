@@ -0,0 +1,24 @@
+"""
+Signal handlers for the user app
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user.authentication import token_cache
+from user.tokens import user_active_changed
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    """Forget cached logins of a token that was regenerated or deleted"""
+    token_cache.invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, **kwargs):
+    """Forget cached logins of a user that changed, e.g. was deactivated"""
+    token_cache.invalidate_user(instance.pk)
+    user_active_changed(instance)
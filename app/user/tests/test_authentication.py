@@ -0,0 +1,97 @@
+"""
+Tests for cached token authentication.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import token_cache
+
+ME_URL = reverse("user:me")
+
+
+def create_user(email="test@example.com"):
+    return get_user_model().objects.create_user(email=email, password="testpass123", name="Test")
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test the cached token authentication class"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def _token_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(ME_URL)
+        return res, [q for q in queries if "authtoken_token" in q["sql"]]
+
+    def test_token_looked_up_once(self):
+        """Test a repeated request authenticates without querying the token"""
+        res, queries = self._token_queries()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+
+        res, queries = self._token_queries()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(queries, [])
+
+    def test_deleted_token_rejected(self):
+        """Test deleting a token drops it from the cache"""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+
+        self.assertNotIn(self.token.key, token_cache)
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_regenerated_token_replaces_old(self):
+        """Test a regenerated token works and the old one stops working"""
+        self.client.get(ME_URL)
+        old_key = self.token.key
+
+        self.token.delete()
+        new_token = Token.objects.create(user=self.user)
+
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {new_token.key}")
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_200_OK)
+        self.assertNotEqual(new_token.key, old_key)
+
+    def test_deactivated_user_rejected(self):
+        """Test deactivating a user drops their cached tokens"""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(AUTH_TOKEN_CACHE_TTL=0)
+    def test_expired_entries_looked_up_again(self):
+        """Test entries older than the TTL are not used"""
+        self.client.get(ME_URL)
+
+        res, queries = self._token_queries()
+
+        self.assertEqual(len(queries), 1)
+
+    @override_settings(AUTH_TOKEN_CACHE_SIZE=1)
+    def test_least_recently_used_evicted(self):
+        """Test the cache keeps at most AUTH_TOKEN_CACHE_SIZE tokens"""
+        self.client.get(ME_URL)
+        other_token = Token.objects.create(user=create_user("other@example.com"))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {other_token.key}")
+        self.client.get(ME_URL)
+
+        self.assertNotIn(self.token.key, token_cache)
+        self.assertIn(other_token.key, token_cache)
@@ -0,0 +1,143 @@
+"""
+Tests for signed access and refresh tokens.
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient, APIRequestFactory
+
+from user.authentication import SignedTokenAuthentication
+
+TOKEN_URL = reverse("user:token")
+REFRESH_URL = reverse("user:token-refresh")
+REVOKE_URL = reverse("user:token-revoke")
+ME_URL = reverse("user:me")
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+class SignedTokenTests(TestCase):
+    """Test logging in, refreshing and revoking signed tokens"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="test@example.com", password="testpass123", name="Test",
+        )
+        self.client = APIClient()
+        res = self.client.post(TOKEN_URL, {"email": "test@example.com", "password": "testpass123"})
+        self.tokens = res.data
+
+    def _bearer(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_login_returns_signed_tokens(self):
+        """Test the token endpoint hands out the database token and a signed pair"""
+        self.assertIn("token", self.tokens)
+        self.assertIn("access", self.tokens)
+        self.assertIn("refresh", self.tokens)
+        self.assertEqual(self.tokens["access_expires_in"], 300)
+
+    def test_access_token_needs_no_lookup(self):
+        """Test a bearer request costs no more queries than a pre-authenticated one"""
+        self._bearer(self.tokens["access"])
+        with CaptureQueriesContext(connection) as bearer:
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as forced:
+            client.get(RECIPES_URL)
+
+        self.assertEqual(len(bearer), len(forced))
+        self.assertFalse([q for q in bearer if "authtoken_token" in q["sql"]])
+
+    def test_me_with_access_token(self):
+        """Test the profile is read from the database for bearer requests"""
+        self._bearer(self.tokens["access"])
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {"email": "test@example.com", "name": "Test"})
+
+    def test_expired_access_token(self):
+        """Test an access token past its lifetime is refused"""
+        self._bearer(self.tokens["access"])
+        with override_settings(SIGNED_ACCESS_TOKEN_TTL=-1):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_tampered_and_refresh_tokens_refused(self):
+        """Test a modified token, or a refresh token used for access, is refused"""
+        for token in (self.tokens["access"][:-1] + "x", self.tokens["refresh"]):
+            self._bearer(token)
+            res = self.client.get(RECIPES_URL)
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_issues_new_tokens(self):
+        """Test a refresh token is exchanged for a working access token"""
+        res = self.client.post(REFRESH_URL, {"refresh": self.tokens["refresh"]})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("token", res.data)
+
+        self._bearer(res.data["access"])
+        self.assertEqual(self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK)
+
+    def test_revoke_ends_refresh(self):
+        """Test revoking moves the version on so old refresh tokens stop working"""
+        self._bearer(self.tokens["access"])
+        res = self.client.post(REVOKE_URL)
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+
+        res = self.client.post(REFRESH_URL, {"refresh": self.tokens["refresh"]})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_revoke_ends_access_at_once(self):
+        """Test access tokens issued before a revocation are refused straight away"""
+        self._bearer(self.tokens["access"])
+        self.client.post(REVOKE_URL)
+
+        self.assertEqual(self.client.get(RECIPES_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        res = self.client.post(TOKEN_URL, {"email": "test@example.com", "password": "testpass123"})
+        self._bearer(res.data["access"])
+        self.assertEqual(self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK)
+
+    def test_deactivation_ends_access(self):
+        """Test a deactivated user's access token is refused until they are active again"""
+        self._bearer(self.tokens["access"])
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(RECIPES_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK)
+
+    def test_access_grants_no_staff_rights(self):
+        """Test the user built from an access token is neither staff nor superuser"""
+        request = APIRequestFactory().get(RECIPES_URL, HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+
+        user, _ = SignedTokenAuthentication().authenticate(request)
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertFalse(user.is_staff)
+        self.assertFalse(user.is_superuser)
+
+    def test_inactive_user_cannot_refresh(self):
+        """Test a deactivated user's refresh token is refused"""
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.post(REFRESH_URL, {"refresh": self.tokens["refresh"]})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -143,3 +143,45 @@ class PublicUserApiTests(TestCase):
             self.assertEqual(self.user.email, payload["email"])
             self.assertTrue(self.user.check_password(payload["password"]))
             self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class ManageUserConditionalTests(TestCase):
+    """Test conditional requests on the me endpoint"""
+    def setUp(self):
+        self.user = create_user(
+            email="test@example.com",
+            password="testpass123",
+            name="Test Name",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_profile_not_modified(self):
+        """Test a matching If-None-Match gets a 304"""
+        etag = self.client.get(ME_URL)["ETag"]
+
+        res = self.client.get(ME_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_profile_update_if_match(self):
+        """Test updates need the current ETag and hand back the new one"""
+        etag = self.client.get(ME_URL)["ETag"]
+
+        res = self.client.patch(ME_URL, {"name": "New Name"}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        new_etag = res["ETag"]
+        self.assertNotEqual(new_etag, etag)
+
+        res = self.client.patch(ME_URL, {"name": "Other Name"}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(self.client.get(ME_URL, HTTP_IF_NONE_MATCH=new_etag).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+
+    def test_profile_matches_etag_with_stale_user(self):
+        """Test the profile is read fresh, so its body and ETag describe the same row"""
+        get_user_model().objects.filter(pk=self.user.pk).update(name="Renamed")  # self.user is now stale
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data["name"], "Renamed")
@@ -0,0 +1,79 @@
+"""
+Signed access and refresh tokens
+
+Both are django.core.signing values: the user id and the user's token_version,
+timestamped and signed with HMAC-SHA256 under SECRET_KEY, so any node holding
+the key can check them without storage. Access tokens are good for
+SIGNED_ACCESS_TOKEN_TTL seconds and never looked up in the database. Refresh
+tokens are checked against the user row when exchanged.
+
+Moving token_version on, or deactivating the user, also leaves a note in the
+Django cache for as long as an access token lives: the lowest version still
+accepted, or that the user is inactive. Access tokens are checked against it
+with one cache read, so revocation is immediate in every process sharing the
+cache (see CACHE_LOCATION). With the default per-process cache, other
+processes only stop a revoked access token when it expires.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+
+# different salts keep a refresh token from passing as an access token and back.
+ACCESS_SALT = "user.tokens.access"
+REFRESH_SALT = "user.tokens.refresh"
+MIN_VERSION_KEY = "user-tokens:min-version:{}"
+INACTIVE_KEY = "user-tokens:inactive:{}"
+
+
+def issue_tokens(user):
+    """Return a fresh access and refresh token for a user."""
+    claims = {"uid": user.pk, "ver": user.token_version}
+    return {
+        "access": signing.dumps(claims, salt=ACCESS_SALT),
+        "refresh": signing.dumps(claims, salt=REFRESH_SALT),
+        "access_expires_in": settings.SIGNED_ACCESS_TOKEN_TTL,
+    }
+
+
+def read_access_token(token):
+    """Return the claims of an access token, raising signing.BadSignature if it is invalid or expired."""
+    return signing.loads(token, salt=ACCESS_SALT, max_age=settings.SIGNED_ACCESS_TOKEN_TTL)
+
+
+def is_revoked(claims):
+    """Return whether the claims of a valid access token were revoked since it was issued."""
+    keys = MIN_VERSION_KEY.format(claims["uid"]), INACTIVE_KEY.format(claims["uid"])
+    found = cache.get_many(keys)
+    return keys[1] in found or claims["ver"] < found.get(keys[0], 0)
+
+
+def refresh_tokens(token):
+    """Exchange a refresh token for new tokens, or return None if it is no longer valid."""
+    try:
+        claims = signing.loads(token, salt=REFRESH_SALT, max_age=settings.SIGNED_REFRESH_TOKEN_TTL)
+    except signing.BadSignature:  # includes SignatureExpired
+        return None
+    user = get_user_model().objects.filter(pk=claims["uid"], is_active=True).first()
+    if user is None or user.token_version != claims["ver"]:
+        return None
+    return issue_tokens(user)
+
+
+def revoke_tokens(user):
+    """End every signed session of a user by moving their token version on."""
+    users = get_user_model().objects.filter(pk=user.pk)
+    with transaction.atomic():
+        version = users.select_for_update().values_list("token_version", flat=True).get() + 1
+        users.update(token_version=version)
+        # set under the row lock, so concurrent revocations reach the cache in order.
+        cache.set(MIN_VERSION_KEY.format(user.pk), version, settings.SIGNED_ACCESS_TOKEN_TTL)
+
+
+def user_active_changed(user):
+    """Refuse, or accept again, the access tokens of a user saved as inactive or active."""
+    if user.is_active:
+        cache.delete(INACTIVE_KEY.format(user.pk))
+    else:
+        cache.set(INACTIVE_KEY.format(user.pk), True, settings.SIGNED_ACCESS_TOKEN_TTL)
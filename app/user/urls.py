@@ -9,6 +9,8 @@ app_name = "user" #this would be used by the reverse, mapping in the test script
 urlpatterns = [
     path("create/",CreateUserView.as_view(), name="create"),
     path("token/", CreateTokenView.as_view(), name="token"),
+    path("token/refresh/", RefreshTokenView.as_view(), name="token-refresh"),
+    path("token/revoke/", RevokeTokenView.as_view(), name="token-revoke"),
     path("me/", ManageUserView.as_view(), name="me"),
     
 ]
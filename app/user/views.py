@@ -2,11 +2,24 @@
 Views for the user API
 """
 
-from rest_framework import generics,authentication,permissions
+from django.contrib.auth import get_user_model
+from drf_spectacular.utils import extend_schema
+from rest_framework import generics,permissions, status
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings 
+from rest_framework.views import APIView
 
-from user.serializers import UserSerializer, AuthTokenSerializer
+from core.conditional import ConditionalMixin
+from user.authentication import CachedTokenAuthentication, SignedTokenAuthentication
+from user.serializers import (
+    UserSerializer,
+    AuthTokenSerializer,
+    RefreshTokenSerializer,
+    SignedTokensSerializer,
+)
+from user.tokens import issue_tokens, revoke_tokens
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -20,12 +33,53 @@ class CreateTokenView(ObtainAuthToken):
     # this is to tell it to render to our browsable web api endpoint
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+    @extend_schema(responses=SignedTokensSerializer)
+    def post(self, request, *args, **kwargs):
+        """Return the database token along with a signed access and refresh token"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data["user"]
+        token, created = Token.objects.get_or_create(user=user)
+        return Response({"token": token.key, **issue_tokens(user)})
+
+class RefreshTokenView(generics.GenericAPIView):
+    """Exchange a refresh token for a new access and refresh token"""
+    serializer_class = RefreshTokenSerializer
+    authentication_classes = []
+    permission_classes = []
+
+    @extend_schema(responses=SignedTokensSerializer)
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.validated_data["tokens"])
+
+class RevokeTokenView(APIView):
+    """Revoke every signed token of the authenticated user"""
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(request=None, responses={204: None})
+    def post(self, request):
+        revoke_tokens(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class ManageUserView(ConditionalMixin, generics.RetrieveUpdateAPIView):
     """Manage the authenticated user."""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
         """Retrieve and return the authenticated user"""
-        return self.request.user # returns it back to the api
\ No newline at end of file
+        # request.user may come from the token cache or only carry the id of a signed token,
+        # the profile is read fresh like its version.
+        return get_user_model().objects.get(pk=self.request.user.pk)
+
+    def get_version(self):
+        """Version the profile by the fields it shows"""
+        users = get_user_model().objects
+        if self.lock_version:
+            users = users.select_for_update()
+        shown = users.filter(pk=self.request.user.pk).values_list("email", "name").first()
+        return repr(shown) if shown else None
\ No newline at end of file
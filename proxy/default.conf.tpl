@@ -5,6 +5,31 @@ server{
         alias /vol/static;
     }
 
+    # media is private, the app checks ownership and answers with X-Accel-Redirect.
+    location /static/media/ {
+        uwsgi_pass      ${APP_HOST}:${APP_PORT};
+        include         /etc/nginx/uwsgi_params;
+    }
+
+    # recipe media, only reachable through X-Accel-Redirect from the app. nginx
+    # answers Range and If-None-Match/If-Modified-Since for these itself, and keeps
+    # the Cache-Control the app sent.
+    location /internal/media/ {
+        internal;
+        alias /vol/web/media/;
+        sendfile on;
+        tcp_nopush on;
+        etag on;
+    }
+
+    # resized recipe images, only reachable through X-Accel-Redirect from the app.
+    location /internal/resized/ {
+        internal;
+        alias /vol/web/resized/;
+        sendfile on;
+        tcp_nopush on;
+    }
+
     location / {
         uwsgi_pass      ${APP_HOST}:${APP_PORT};
         include         /etc/nginx/uwsgi_params;
@@ -4,6 +4,7 @@ set -e
 
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
+python manage.py build_schema
 python manage.py migrate
 
 uwsgi --socket :9000 --workers 4 --master --enable-threads --module core.wsgi
\ No newline at end of file